@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# Shared plumbing for the benchmark suite. Each bench_*.py module defines
+# benchmarks(quick=False), returning a list of Benchmark objects, and can be
+# run on its own, or with the rest of the suite, by run.py.
+import sys
+import timeit
+import logging
+import warnings
+
+DEFAULT_REPEAT = 5
+MIN_TIME = 0.2  # Seconds per timing run (see timeit.Timer.autorange)
+
+
+class Benchmark(object):
+    """
+    A named operation to time. func() performs 'ops' operations; results are
+    reported per operation. setup() is called once before timing, and its
+    result (if not None) is passed to func(). teardown(state) is called after.
+    """
+
+    def __init__(self, name, func, ops=1, setup=None, teardown=None):
+        self.name = name
+        self.func = func
+        self.ops = ops
+        self.setup = setup
+        self.teardown = teardown
+
+    def run(self, repeat=DEFAULT_REPEAT):
+        """
+        Return the best time (in seconds) per operation, over several runs.
+        """
+        state = self.setup() if self.setup is not None else None
+        try:
+            if state is None:
+                timer = timeit.Timer(self.func)
+            else:
+                timer = timeit.Timer(lambda: self.func(state))
+
+            # Enough calls to take at least MIN_TIME per run
+            number = 1
+            while True:
+                elapsed = timer.timeit(number)
+                if elapsed >= MIN_TIME or number >= 1000000:
+                    break
+                number = max(number * 2, int(number * MIN_TIME / max(elapsed, 1e-9)))
+            best = min([elapsed] + timer.repeat(repeat=repeat - 1, number=number))
+            return best / (number * self.ops)
+        finally:
+            if self.teardown is not None:
+                self.teardown(state)
+
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.3f} us"
+
+
+def quiet():
+    """
+    Silence logging and warnings (e.g., truncate() warns about every long message).
+    """
+    logging.basicConfig(level=logging.CRITICAL)
+    warnings.simplefilter("ignore")
+
+
+def main(benchmarks):
+    """
+    Run a module's benchmarks, and print the results. (For running one module on its own.)
+    """
+    quiet()
+    quick = "--quick" in sys.argv[1:]
+    for benchmark in benchmarks(quick=quick):
+        print(f"{benchmark.name:<48} {format_time(benchmark.run()):>12}/op")
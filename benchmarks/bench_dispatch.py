@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# Measure the per-message cost of routing mesh text messages to their handlers:
+# the original if-chain (re-normalizing the message, and using inline patterns)
+# vs. the CommandRouter (normalize once, precompiled patterns, token lookup).
+#
+# Usage: python benchmarks/bench_dispatch.py [NUM_MESSAGES]
+import re
+import sys
+import timeit
+
+from aprstastic._commands import CommandRouter, REGISTER_RE, DEST_PREFIX_RE
+
+DEFAULT_NUM_MESSAGES = 100000
+
+MESSAGES = [
+    "?",
+    "!id",
+    "!register N0CALL-1 MV",
+    "!unregister",
+    "WLNK-1: hello there",
+    "K1ABC-7: how are you?",
+    "a reply without a prefix",
+]
+
+
+def dispatch_legacy(message_string):
+    # Mirrors the original if-chain in Gateway._process_meshtastic_packet
+    if message_string.strip() == "?":
+        return "help"
+    if message_string.strip() == "!id" or message_string.strip() == "!version":
+        return "id"
+    if message_string.lower().strip().startswith("!register"):
+        re.search(
+            r"^!register:?\s+([a-z0-9]{4,7}\-[0-9]{1,2})(\s+(\$\$|[a-zA-Z0-9]{2,3}))?$",
+            message_string.lower().strip(),
+        )
+        return "register"
+    if message_string.lower().strip().startswith("!unregister"):
+        return "unregister"
+    m = re.search(r"^([A-Za-z0-9]+(\-[A-Za-z0-9]+)?):(.*)$", message_string)
+    if m:
+        return "send"
+    return "reply"
+
+
+def make_router():
+    router = CommandRouter(
+        fallback=lambda f, m: DEST_PREFIX_RE.search(m.text) and "send" or "reply"
+    )
+    router.register("?", lambda f, m: "help", exact=True)
+    router.register("!id", lambda f, m: "id", exact=True)
+    router.register("!version", lambda f, m: "id", exact=True)
+    router.register("!register", lambda f, m: REGISTER_RE.search(m.lowered))
+    router.register("!unregister", lambda f, m: "unregister")
+    return router
+
+
+def main(num_messages):
+    messages = [MESSAGES[i % len(MESSAGES)] for i in range(num_messages)]
+    router = make_router()
+
+    def run_legacy():
+        for m in messages:
+            dispatch_legacy(m)
+
+    def run_router():
+        for m in messages:
+            router.dispatch("!00000001", m)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=5))
+    routed = min(timeit.repeat(run_router, number=1, repeat=5))
+
+    print(f"messages: {num_messages}")
+    print(f"if-chain: {legacy / num_messages * 1e6:.3f} us/message")
+    print(f"router:   {routed / num_messages * 1e6:.3f} us/message")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUM_MESSAGES)
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# End-to-end packet handling by a running Gateway (against the simulated
+# Meshtastic interface and APRS-IS server): Meshtastic text messages, commands
+# and positions, and APRS messages routed to a registered device.
+#
+# Usage: python benchmarks/bench_gateway.py [--quick]
+import os
+import atexit
+import shutil
+import tempfile
+
+from aprslib.parsing import parse
+from aprslib.passcode import passcode
+from _bench import Benchmark, main
+from aprstastic._gateway import Gateway
+from aprstastic.sim import FakeAPRSISServer, FakeMeshInterface, node_num
+
+DEVICE_ID = "!5a5a1001"
+CALL_SIGN = "N0CALL-1"
+GATEWAY_CALL_SIGN = "N0CALL-10"
+NUM_POSITIONS = 100
+
+_gateway = None
+
+
+def get_gateway():
+    """
+    Start one gateway, shared by all of the benchmarks in this module.
+    """
+    global _gateway
+    if _gateway is not None:
+        return _gateway
+
+    temp_dir = tempfile.mkdtemp(prefix="aprstastic-bench-")
+    server = FakeAPRSISServer().start()
+    interface = FakeMeshInterface()
+    gateway = Gateway(
+        {
+            "call_sign": GATEWAY_CALL_SIGN,
+            "aprsis_passcode": str(passcode(GATEWAY_CALL_SIGN)),
+            "aprsis_servers": [server.address],
+            "aprsis_hot_standby": False,
+            "gateway_beacon": {"enabled": False},
+            "registry_compaction": {"enabled": False},
+            "data_dir": temp_dir,
+            "logs_dir": temp_dir,
+            "tracing": {"sample_rate": 0},
+            "position_governor": {"enabled": True},
+        }
+    )
+    gateway.start(interface)
+    gateway._registry.add_registration(DEVICE_ID, CALL_SIGN, "MV", True)
+
+    def close():
+        gateway.close()
+        server.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    atexit.register(close)
+    _gateway = gateway
+    return gateway
+
+
+def _text_packet(gateway, text):
+    return {
+        "from": node_num(DEVICE_ID),
+        "fromId": DEVICE_ID,
+        "toId": gateway._gateway_id,
+        "decoded": {"portnum": "TEXT_MESSAGE_APP", "payload": text.encode("utf-8")},
+    }
+
+
+def benchmarks(quick=False):
+    def text_to_aprs(gateway):
+        gateway._process_meshtastic_packet(gateway.bench_text)
+
+    def command(gateway):
+        gateway._process_meshtastic_packet(gateway.bench_command)
+
+    def positions(gateway):
+        for packet in gateway.bench_positions:
+            gateway._process_meshtastic_packet(packet)
+
+    def aprs_message(gateway):
+        gateway._process_aprs_packet(gateway.bench_aprs_message)
+
+    def setup():
+        gateway = get_gateway()
+        gateway.bench_text = _text_packet(gateway, "K1ABC-7: hello there")
+        gateway.bench_command = _text_packet(gateway, "?")
+        gateway.bench_positions = [
+            {
+                "from": node_num(DEVICE_ID),
+                "fromId": DEVICE_ID,
+                "toId": "^all",
+                "decoded": {
+                    "portnum": "POSITION_APP",
+                    "position": {
+                        "latitude": 47.6 + 0.001 * i,
+                        "longitude": -122.3,
+                        "groundSpeed": 10,
+                        "groundTrack": 0,
+                    },
+                },
+            }
+            for i in range(0, NUM_POSITIONS)
+        ]
+        gateway.bench_aprs_message = parse(
+            f"K1ABC-7>APRS,TCPIP*,qAC,T2TEST::{CALL_SIGN:<9}:hello there{{12"
+        )
+        return gateway
+
+    return [
+        Benchmark("gateway.mesh[text to APRS]", text_to_aprs, setup=setup),
+        Benchmark("gateway.mesh[command]", command, setup=setup),
+        Benchmark(
+            "gateway.mesh[position, governed]",
+            positions,
+            ops=NUM_POSITIONS,
+            setup=setup,
+        ),
+        Benchmark("gateway.aprs[message to device]", aprs_message, setup=setup),
+    ]
+
+
+if __name__ == "__main__":
+    main(benchmarks)
@@ -0,0 +1,91 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# Registry hot paths, at 1k, 10k and 100k registrations: rebuilding the merged
+# view, adding a registration (which rebuilds it), and the call sign -> device
+# lookup used to route APRS messages to the mesh.
+#
+# Usage: python benchmarks/bench_registry.py [--quick]
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+
+from _bench import Benchmark, main
+from aprstastic._registry import CallSignRegistry, DATABASE_FILE
+
+SIZES = [1000, 10000, 100000]
+QUICK_SIZES = [1000, 10000]
+
+
+def make_registry(n):
+    """
+    Return a registry (in a temporary directory) with n local registrations.
+    Rows are inserted directly, since adding them one at a time rebuilds each time.
+    """
+    data_dir = tempfile.mkdtemp(prefix="aprstastic-bench-")
+    registry = CallSignRegistry(data_dir)
+    now = int(time.time())
+    conn = sqlite3.connect(os.path.join(data_dir, DATABASE_FILE))
+    conn.executemany(
+        "INSERT INTO LocalRegistrations (device_id, call_sign, settings_json, timestamp) VALUES (?, ?, ?, ?);",
+        [(f"!{i + 1:08x}", f"B{i}CALL-{i % 16}", "MV", now - n + i) for i in range(n)],
+    )
+    conn.commit()
+    conn.close()
+    registry._rebuild()
+    registry.bench_dir = data_dir
+    registry.bench_size = n
+    return registry
+
+
+def remove_registry(registry):
+    shutil.rmtree(registry.bench_dir, ignore_errors=True)
+
+
+def add_registration(registry):
+    i = registry.bench_size // 2
+    registry.add_registration(f"!{i + 1:08x}", f"B{i}CALL-{i % 16}", "MV", True)
+
+
+def lookups(registry):
+    n = registry.bench_size
+    for i in range(0, n, max(1, n // 100)):
+        registry.get_device_id(f"B{i}CALL-{i % 16}")
+
+
+def benchmarks(quick=False):
+    result = list()
+    for n in QUICK_SIZES if quick else SIZES:
+        setup = lambda n=n: make_registry(n)
+        label = f"{n // 1000}k"
+        result.extend(
+            [
+                Benchmark(
+                    f"registry.rebuild[{label}]",
+                    CallSignRegistry._rebuild,
+                    setup=setup,
+                    teardown=remove_registry,
+                ),
+                Benchmark(
+                    f"registry.add_registration[{label}]",
+                    add_registration,
+                    setup=setup,
+                    teardown=remove_registry,
+                ),
+                Benchmark(
+                    f"registry.get_device_id[{label}]",
+                    lookups,
+                    ops=len(range(0, n, max(1, n // 100))),
+                    setup=setup,
+                    teardown=remove_registry,
+                ),
+            ]
+        )
+    return result
+
+
+if __name__ == "__main__":
+    main(benchmarks)
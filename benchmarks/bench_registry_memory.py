@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# Compare the memory used by the merged registry at scale: the original
+# one-dictionary-per-device representation vs. the compact representation.
+#
+# Usage: python benchmarks/bench_registry_memory.py [NUM_ENTRIES]
+import sys
+import random
+import tracemalloc
+
+from aprstastic._registry import _MergedRegistrations
+
+DEFAULT_NUM_ENTRIES = 100000
+ICONS = [None, "MV", "HS", "OGM", "$$"]
+
+
+def make_records(n, seed=0):
+    """
+    Return n synthetic (device_id -> (call_sign, icon, timestamp)) records.
+    """
+    rng = random.Random(seed)
+    records = dict()
+    node_nums = rng.sample(range(1, 2**32), n)
+    for i, node_num in enumerate(node_nums):
+        # Build the strings at runtime, as they would be when read from sqlite
+        device_id = "".join(["!", "%08x" % node_num])
+        call_sign = "".join(["N", str(i), "CALL-", str(i % 16)])
+        icon = ICONS[i % len(ICONS)]
+        if icon is not None:
+            icon = "".join([icon[0:1], icon[1:]])
+        records[device_id] = (call_sign, icon, 1728880000 + i)
+    return records
+
+
+def measure(build, records):
+    """
+    Return the number of bytes retained by the structure returned by build(records).
+    """
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = build(records)
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def build_legacy(records):
+    merged = dict()
+    for device_id, record in records.items():
+        # Copy the key, since the original representation held its own strings
+        key = "".join([device_id[0:1], device_id[1:]])
+        merged[key] = {
+            "call_sign": record[0],
+            "icon": record[1],
+            "timestamp": record[2],
+        }
+    return merged
+
+
+def build_compact(records):
+    return _MergedRegistrations(records)
+
+
+def main(n):
+    records = make_records(n)
+    legacy = measure(build_legacy, records)
+    compact = measure(build_compact, records)
+    print(f"entries:  {n}")
+    print(f"legacy:   {legacy / 1e6:8.2f} MB ({legacy / n:6.1f} bytes/entry)")
+    print(f"compact:  {compact / 1e6:8.2f} MB ({compact / n:6.1f} bytes/entry)")
+    print(f"savings:  {100.0 * (1 - compact / legacy):5.1f}%")
+    return legacy, compact
+
+
+##########################
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUM_ENTRIES)
@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# Per-packet text handling: splitting and truncating long messages, parsing
+# APRS-IS lines (aprslib, vs. the message_addressee fast path used to discard
+# over-matched packets without parsing), and icon -> symbol lookups.
+#
+# Usage: python benchmarks/bench_text.py [--quick]
+import random
+
+from aprslib.parsing import parse
+from _bench import Benchmark, main
+from aprstastic._aprs_client import message_addressee
+from aprstastic._aprs_symbols import get_symbol_code, APRS_SYMBOLS
+from aprstastic._segmenter import (
+    segment,
+    truncate,
+    MAX_APRS_TEXT_MESSAGE_LENGTH,
+    MAX_MESH_MESSAGE_LENGTH,
+)
+
+# A typical mix of APRS-IS traffic
+LINES = [
+    "K1ABC-7>APZMAG,TCPIP*,qAC,T2TEST::N0CALL-1 :hello there{12",
+    "K1ABC-7>APZMAG,TCPIP*,qAC,T2TEST::N0CALL-1 :ack12",
+    "N0CALL-9>APDR16,TCPIP*,qAC,T2TEST:=4736.93N/12218.13W[/A=000100 moving",
+    "W1AW>APRS,TCPIP*,qAC,T2TEST:@092345z4903.50N/07201.75W_220/004g005t077r000p000P000h50b09900",
+    "N0CALL-10>APZMAG,TCPIP*,qAC,T2TEST:!/5L!!<*e7>7P[",
+    "K1ABC>APRS,TCPIP*,qAC,T2TEST:>Status text",
+]
+
+
+def _words(n, seed=0):
+    rng = random.Random(seed)
+    words = ["hello", "there", "APRS", "mesh", "gateway", "73", "QSL", "naïve", "日本"]
+    return " ".join(rng.choice(words) for _ in range(n))
+
+
+def benchmarks(quick=False):
+    short = _words(40)
+    long = _words(2000)
+    unbroken = "x" * 5000
+    icons = list(APRS_SYMBOLS.keys()) + ["MV", "OGM", "SA1", "??", "", None]
+
+    def run_parse():
+        for line in LINES:
+            try:
+                parse(line)
+            except Exception:
+                pass
+
+    def run_addressee():
+        for line in LINES:
+            message_addressee(line)
+
+    def run_symbols():
+        for icon in icons:
+            get_symbol_code(icon)
+
+    return [
+        Benchmark(
+            "segment[aprs, 40 words]",
+            lambda: segment(short, MAX_APRS_TEXT_MESSAGE_LENGTH),
+        ),
+        Benchmark(
+            "segment[aprs, 2000 words]",
+            lambda: segment(long, MAX_APRS_TEXT_MESSAGE_LENGTH),
+        ),
+        Benchmark(
+            "segment[mesh, markers, 2000 words]",
+            lambda: segment(long, MAX_MESH_MESSAGE_LENGTH, markers=True),
+        ),
+        Benchmark(
+            "segment[aprs, 5000 chars unbroken]",
+            lambda: segment(unbroken, MAX_APRS_TEXT_MESSAGE_LENGTH),
+        ),
+        Benchmark(
+            "truncate[2000 words]",
+            lambda: truncate(long, MAX_APRS_TEXT_MESSAGE_LENGTH),
+        ),
+        Benchmark("aprslib.parse", run_parse, ops=len(LINES)),
+        Benchmark("message_addressee", run_addressee, ops=len(LINES)),
+        Benchmark("get_symbol_code", run_symbols, ops=len(icons)),
+    ]
+
+
+if __name__ == "__main__":
+    main(benchmarks)
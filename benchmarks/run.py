@@ -0,0 +1,138 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# Run the benchmark suite (every bench_*.py module that defines benchmarks()),
+# and check the results for regressions:
+#
+#   - against the absolute limits in thresholds.json (seconds per operation),
+#     which are loose enough to hold on any reasonable machine (including CI), and
+#   - against the previous results from the same machine and Python version,
+#     in results/history.jsonl, which catches smaller slowdowns.
+#
+# Results are appended to the history, so they can be tracked over time. The
+# history is local to each machine, and is not checked in.
+# Exits with status 1 if anything regressed.
+#
+# Usage: python benchmarks/run.py [--quick] [--filter TEXT] [--tolerance 0.25] [--no-save]
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import importlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+THRESHOLDS_FILE = os.path.join(BENCH_DIR, "thresholds.json")
+HISTORY_FILE = os.path.join(BENCH_DIR, "results", "history.jsonl")
+
+DEFAULT_TOLERANCE = 0.25  # Slowdown allowed relative to the previous run
+
+sys.path.insert(0, BENCH_DIR)
+from _bench import format_time, quiet  # noqa: E402
+
+
+def discover(quick=False, name_filter=None):
+    benchmarks = list()
+    for f in sorted(os.listdir(BENCH_DIR)):
+        if not (f.startswith("bench_") and f.endswith(".py")):
+            continue
+        module = importlib.import_module(f[0:-3])
+        if not hasattr(module, "benchmarks"):
+            continue  # A standalone script
+        for benchmark in module.benchmarks(quick=quick):
+            if name_filter is None or name_filter in benchmark.name:
+                benchmarks.append(benchmark)
+    return benchmarks
+
+
+def load_history():
+    if not os.path.isfile(HISTORY_FILE):
+        return []
+    with open(HISTORY_FILE, "rt", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip() != ""]
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "machine": f"{platform.node()} ({platform.machine()}, {os.cpu_count()} cpus)",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the aprstastic benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest sizes")
+    parser.add_argument(
+        "--filter", help="Only run benchmarks whose names contain this text"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Fractional slowdown, relative to the previous run, that counts as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="Don't append the results to the history"
+    )
+    args = parser.parse_args()
+
+    quiet()
+    with open(THRESHOLDS_FILE, "rt", encoding="utf-8") as fh:
+        thresholds = json.load(fh)
+
+    env = environment()
+    previous = dict()
+    for entry in load_history():
+        if entry["machine"] == env["machine"] and entry["python"] == env["python"]:
+            previous.update(entry["results"])
+
+    results = dict()
+    regressions = list()
+    print(f"{'Benchmark':<40} {'Time/op':>12} {'Previous':>12} {'Limit':>12}")
+    for benchmark in discover(quick=args.quick, name_filter=args.filter):
+        seconds = benchmark.run()
+        results[benchmark.name] = seconds
+
+        notes = list()
+        limit = thresholds.get(benchmark.name)
+        if limit is not None and seconds > limit:
+            notes.append("over limit")
+        before = previous.get(benchmark.name)
+        if before is not None and seconds > before * (1 + args.tolerance):
+            notes.append(f"{100 * (seconds / before - 1):.0f}% slower")
+        if len(notes) > 0:
+            regressions.append(benchmark.name)
+
+        print(
+            f"{benchmark.name:<40} {format_time(seconds):>12} "
+            f"{'' if before is None else format_time(before):>12} "
+            f"{'' if limit is None else format_time(limit):>12}"
+            f"  {', '.join(notes)}"
+        )
+
+    if not args.no_save and len(results) > 0:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        entry = dict(time=time.strftime("%Y-%m-%dT%H:%M:%S%z"), **env, results=results)
+        with open(HISTORY_FILE, "at", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry) + "\n")
+
+    if len(regressions) > 0:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
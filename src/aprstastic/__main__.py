@@ -1,38 +1,39 @@
 # SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
 #
 # SPDX-License-Identifier: MIT
+import argparse
+import json
 import logging
-import yaml
 import os
 import sys
 import traceback
-from logging.handlers import TimedRotatingFileHandler
 from ._config import init_config, ConfigError
-from ._gateway import Gateway
+from ._logging import setup_logging, DEFAULT_LOG_LEVEL, LOG_FORMAT_TEXT, LOG_FILE
+from ._gateway import Gateway, REGISTRY_COMPACTION_RETENTION
+from ._registry import CallSignRegistry
+
+# Parse the command line
+########################
+parser = argparse.ArgumentParser(
+    prog="aprstastic", description="A Meshtastic-APRS Gateway"
+)
+parser.add_argument(
+    "--compact-registry",
+    action="store_true",
+    help="Compact the registration database, print statistics, and exit.",
+)
+parser.add_argument(
+    "--retention-days",
+    type=float,
+    default=None,
+    help="When compacting, only consider rows older than this many days.",
+)
+args = parser.parse_args()
 
 # Set up logging
 ################
-LOG_FORMAT = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
 logger = logging.getLogger("aprstastic")
-logging.root.setLevel(logging.DEBUG)
-
-
-class LocalDebugFilter(logging.Filter):
-    """
-    Only show debug messages if they are from arpstastic
-    """
-
-    def filter(self, record):
-        if record.name == "aprstastic":
-            return True
-        else:
-            return record.levelno > logging.DEBUG
-
-
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-stream_handler.addFilter(LocalDebugFilter())
-logging.root.addHandler(stream_handler)
+log_listener = setup_logging()
 logging.captureWarnings(True)
 
 # Load the configuration
@@ -40,22 +41,39 @@ config = None
 try:
     config = init_config()
 except ConfigError as e:
+    log_listener.stop()
     sys.stderr.write(str(e).rstrip() + "\n")
     sys.exit(1)
 
-# Configure file logs
+# Reconfigure logging, now that the level, format, and logs directory are known
+logging_config = config.get("logging") or {}
 logs_dir = config.get("logs_dir")
+log_listener = setup_logging(
+    level=logging_config.get("level", DEFAULT_LOG_LEVEL),
+    log_format=logging_config.get("format", LOG_FORMAT_TEXT),
+    logs_dir=logs_dir,
+)
 if logs_dir is not None:
-    log_file = os.path.join(logs_dir, "aprstastic.log")
-    logger.debug(f"Writing logs to: {log_file}")
-    file_handler = TimedRotatingFileHandler(
-        log_file, when="d", interval=1, backupCount=7
-    )
-    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-    file_handler.addFilter(LocalDebugFilter())
-    logging.root.addHandler(file_handler)
+    logger.debug("Writing logs to: %s", os.path.join(logs_dir, LOG_FILE))
+
+# Compact the registry, rather than running the gateway
+if args.compact_registry:
+    retention_days = args.retention_days
+    if retention_days is None:
+        retention_days = (config.get("registry_compaction") or {}).get(
+            "retention_days", REGISTRY_COMPACTION_RETENTION / 86400
+        )
+    try:
+        registry = CallSignRegistry(config.get("data_dir"))
+        stats = registry.compact(retention_days * 86400)
+        print(json.dumps(stats, indent=4))
+    finally:
+        log_listener.stop()
+        logging.shutdown()
+    sys.exit(0)
 
 # Start the gateway. Log any errors, and exit cleanly
+gateway = None
 try:
     gateway = Gateway(config)
     gateway.run()
@@ -63,4 +81,7 @@ except:
     logger.error(traceback.format_exc())
     raise
 finally:
+    if gateway is not None:
+        gateway.close()
+    log_listener.stop()
     logging.shutdown()
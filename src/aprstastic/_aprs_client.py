@@ -1,119 +1,914 @@
 import time
+import socket
 import threading
 import traceback
-import aprslib
 import logging
 from aprslib.parsing import parse
 from aprslib.exceptions import ParseError, UnknownFormat
+from collections import deque
 from queue import Queue, Empty
+from .__about__ import __version__
+from ._tracing import Tracer, Trace, DOWNLINK
+from ._recorder import TrafficRecorder, APRS_RX, APRS_TX
 
 YIELD_DELAY = 0.001
 POLL_DELAY = 0.1
 
+# APRS-IS servers limit the length of filters. Be conservative.
+MAX_FILTER_LENGTH = 512
+
+# The most APRS-IS connections to open when one filter is not enough
+MAX_CONNECTIONS = 3
+
+# Never merge call signs into wildcard prefixes shorter than this
+MIN_WILDCARD_PREFIX_LENGTH = 3
+
+# Servers
+DEFAULT_APRSIS_SERVER = "rotate.aprs.net:14580"
+DEFAULT_APRSIS_PORT = 14580
+CONNECT_TIMEOUT = 15
+LOGIN_TIMEOUT = 5
+KEEPALIVE_TIMEOUT = 60  # Servers send keepalives every 20 seconds, so this is generous
+MONITOR_INTERVAL = 0.25  # How often to check on connections (i.e., failover time)
+PROBE_TIMEOUT = 5  # How long to wait for the initial latency probes
+PROBE_INTERVAL = 600  # Re-measure idle servers every 10 minutes
+MAX_RETRY_BACKOFF = 60
+RECEIVE_ONLY_PASSCODE = (
+    "-1"  # Logs in unverified: packets can be received, but not sent
+)
+DEDUPE_WINDOW = 30  # Same as the APRS-IS duplicate detection window
+
 logger = logging.getLogger("aprstastic")
 
 
 class APRSClient(object):
     """
-    A thin, thread-safe, client around aprslib.
-    Maybe we will implement our own one day!
+    A thin, thread-safe, client for APRS-IS (using aprslib for parsing).
+
+    Group message filters ("g/CALL1/CALL2/...") are planned before being sent:
+    call signs are compressed into wildcard terms, and, if a single filter would
+    still be too long, sharded across several APRS-IS links. Messages that
+    only matched because of the compression are discarded in recv(), before parsing.
+
+    Connections are drawn from a pool of servers, ranked by their measured connect
+    and login latency. Optionally, each link keeps a hot standby connection to a
+    second server, which takes over as soon as the primary fails. Packets received
+    on both connections are deduplicated. Standbys (and latency probes) log in
+    receive-only, so the gateway's call sign only has one verified session. After
+    a failover, packets are held until a verified login replaces the standby.
+
+    Filter updates, like packets, are sent from the client's transmit thread.
     """
 
-    def __init__(self, login: str, passcode: str, filters: None):
+    def __init__(
+        self,
+        login: str,
+        passcode: str,
+        filters: str | None,
+        max_filter_length: int = MAX_FILTER_LENGTH,
+        max_connections: int = MAX_CONNECTIONS,
+        servers: list[str] | None = None,
+        hot_standby: bool | None = None,
+        tracer: Tracer | None = None,
+        recorder: TrafficRecorder | None = None,
+    ):
         super().__init__()
         self._login = login
         self._passcode = passcode
-        self._filters = filters
-        self._aprs = None
+        self._max_filter_length = max_filter_length
+        self._max_connections = max_connections
+        self._tracer = tracer
+        self._recorder = recorder
         self._rx_queue: Queue = Queue()
         self._tx_queue: Queue = Queue()
 
-        self._rx_thread = threading.Thread(target=self._rx_thread_body)
-        self._tx_thread = threading.Thread(target=self._tx_thread_body)
-        self._rx_thread.start()
+        self._servers = [_ServerHealth(s) for s in (servers or [DEFAULT_APRSIS_SERVER])]
+
+        # A standby needs a second server
+        if hot_standby is None:
+            hot_standby = len(self._servers) > 1
+        self._hot_standby = hot_standby
+        self._dedupe = _Deduplicator(DEDUPE_WINDOW) if hot_standby else None
+        self._duplicate_count = 0
+        self._failover_count = 0
+
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._logged_in = threading.Event()  # Set at the first confirmed login
+        self._links: list[_APRSLink] = list()
+        self._links_enabled = False  # Links are opened once the servers are probed
+        self._next_probe_time = 0.0
+
+        # When filters are compressed, these are the call signs that were actually requested
+        self._exact_call_signs: frozenset[str] | None = None
+        self._overmatched_count = 0
+        self._shards = self._plan(filters)
+
+        self._monitor_thread = threading.Thread(
+            target=self._monitor_thread_body, daemon=True
+        )
+        self._tx_thread = threading.Thread(target=self._tx_thread_body, daemon=True)
+        self._monitor_thread.start()
         self._tx_thread.start()
 
     def recv(self, raw=False) -> str | None:
         """
         Returns one packet from the receive queue, or None if the queue is empty."
         """
+        packet, trace = self.recv_traced(raw)
+        if trace is not None:
+            trace.release()
+        return packet
+
+    def recv_traced(self, raw=False) -> tuple:
+        """
+        Like recv(), but returns a (packet, trace) tuple. The trace is None unless
+        the packet was sampled for tracing, in which case the caller must release() it.
+        """
         try:
-            packet = self._rx_queue.get(block=False)
-            if raw:
-                return packet
-            else:
-                try:
-                    return parse(packet)
-                except ParseError:
-                    logger.error("ParseError: " + packet.strip())
-                    return None
-                except UnknownFormat:
-                    logger.error("UnknownFormat: " + packet.strip())
-                    return None
+            while True:
+                packet, trace = self._rx_queue.get(block=False)
+                if not self._is_overmatched(packet):
+                    break
+                if trace is not None:
+                    trace.release()
         except Empty:
-            return None
+            return None, None
+
+        if raw:
+            return _decode(packet), trace
+
+        try:
+            parsed = parse(packet)
+            if trace is not None:
+                trace.stamp("parse")
+            return parsed, trace
+        except ParseError:
+            logger.error("ParseError: %s", packet.strip())
+        except UnknownFormat:
+            logger.error("UnknownFormat: %s", packet.strip())
+        if trace is not None:
+            trace.release()
+        return None, None
+
+    def send(self, packet: str | bytes, trace: Trace | None = None) -> None:
+        """
+        Enqueue a packet (str, or already-encoded bytes) on the send queue, to be sent ASAP.
+        If a trace is given, it is held until the packet is written to the socket.
+        """
+        if trace is not None:
+            trace.hold()
+            trace.stamp("tx_enqueue")
+        self._tx_queue.put((packet, trace))
+
+    @property
+    def rx_queue_size(self) -> int:
+        return self._rx_queue.qsize()
+
+    @property
+    def tx_queue_size(self) -> int:
+        return self._tx_queue.qsize()
 
-    def send(self, packet: str) -> None:
+    @property
+    def logged_in(self) -> bool:
         """
-        Enqueue a packet on the send queue, to be sent ASAP.
+        True once a connection has logged in, and is receiving packets.
         """
-        self._tx_queue.put(packet)
+        return self._logged_in.is_set()
+
+    def wait_for_login(self, timeout: float | None = None) -> bool:
+        """
+        Block until a connection has logged in, and is receiving packets (or
+        until the timeout). Returns True if logged in.
+        """
+        return self._logged_in.wait(timeout)
 
     def set_filter(self, filters: str | None) -> None:
         """
-        Update the filters controling which packets are received from APRS IS
+        Update the filters controling which packets are received from APRS IS.
+        Never blocks on the network: the update is sent from the transmit thread.
+        """
+        with self._lock:
+            self._shards = self._plan(filters)
+            self._maintain_links()
+
+    def close(self) -> None:
+        """
+        Close all connections, and stop all threads.
+        """
+        self._closed.set()
+        with self._lock:
+            for link in self._links:
+                link.close()
+            self._links = list()
+
+    def stats(self) -> dict:
+        """
+        Return statistics about the links, servers, and filters.
+        """
+        with self._lock:
+            links = [link.to_dict() for link in self._links]
+        return {
+            "connections": sum([len(link.connections()) for link in self._links]),
+            "links": links,
+            "servers": [s.to_dict() for s in self._servers],
+            "failovers": self._failover_count,
+            "duplicates_discarded": self._duplicate_count,
+            "overmatched_discarded": self._overmatched_count,
+        }
+
+    def _plan(self, filters: str | None) -> list[str | None]:
+        """
+        Plan the filters for each link. Group message (g/) terms are compressed
+        and sharded by plan_filters. Other terms are kept as-is, on the first link.
+        """
+        if filters is None:
+            self._exact_call_signs = None
+            return [None]
+
+        call_signs = list()
+        other = list()
+        for term in filters.split():
+            if term.startswith("g/"):
+                call_signs.extend([c for c in term[2:].split("/") if c != ""])
+            else:
+                other.append(term)
+
+        if len(call_signs) == 0:
+            self._exact_call_signs = None
+            return [filters]
+
+        reserved = sum([len(t) + 1 for t in other])
+        shards = plan_filters(
+            call_signs, self._max_filter_length - reserved, self._max_connections
+        )
+        if len(shards) > self._max_connections:
+            logger.error(
+                f"APRS-IS filters need {len(shards)} connections, but at most {self._max_connections} are allowed. Some call signs will not be received."
+            )
+            shards = shards[0 : self._max_connections]
+        shards[0] = " ".join([shards[0]] + other)
+
+        # Remember the exact call signs, if any compression took place
+        exact = frozenset([c.upper() for c in call_signs])
+        if any(["*" in s for s in shards]):
+            self._exact_call_signs = exact
+        else:
+            self._exact_call_signs = None
+        return list(shards)
+
+    def _is_overmatched(self, packet: bytes | str) -> bool:
+        """
+        Cheaply check if a raw packet is a message that matched a compressed (wildcard)
+        filter term, but is not addressed to any of the requested call signs.
+        """
+        exact = self._exact_call_signs
+        if exact is None:
+            return False
+        addressee = message_addressee(packet)
+        if addressee is None or addressee in exact:
+            return False
+        self._overmatched_count += 1
+        return True
+
+    def _on_line(self, connection: "_APRSConnection", line: bytes) -> None:
+        """
+        Called from connection threads with each (non-comment) line received.
+        """
+        if self._dedupe is not None:
+            with self._lock:
+                if self._dedupe.is_duplicate(line, time.monotonic()):
+                    self._duplicate_count += 1
+                    return
+        if self._recorder is not None:
+            self._recorder.record(APRS_RX, line)
+        trace = None
+        if self._tracer is not None:
+            trace = self._tracer.start(DOWNLINK, "socket_read")
+        self._rx_queue.put((line, trace), block=True)
+
+    def _open(
+        self, server: "_ServerHealth", filters: str | None, receive_only: bool = False
+    ) -> "_APRSConnection":
+        return _APRSConnection(
+            server,
+            self._login,
+            RECEIVE_ONLY_PASSCODE if receive_only else self._passcode,
+            filters,
+            self._on_line,
+            on_login=None if receive_only else self._logged_in.set,
+            receive_only=receive_only,
+        )
+
+    def _choose_server(self, exclude: list["_ServerHealth"]) -> "_ServerHealth | None":
+        """
+        Return the fastest available server not in the exclude list, or None.
+        Servers that have never been measured rank after those that have.
+        """
+        now = time.monotonic()
+        candidates = [
+            s for s in self._servers if s not in exclude and s.retry_time <= now
+        ]
+        if len(candidates) == 0:
+            return None
+        return min(
+            candidates,
+            key=lambda s: (s.latency is None, s.latency or 0, self._servers.index(s)),
+        )
+
+    def _maintain_links(self) -> None:
+        """
+        Make sure there is one link per filter shard, and that every link has a
+        working primary connection (and standby, if enabled). Called with the lock held.
+        """
+        if not self._links_enabled or self._closed.is_set():
+            return
+
+        shards = self._shards
+        while len(self._links) > len(shards):
+            self._links.pop().close()
+        while len(self._links) < len(shards):
+            self._links.append(_APRSLink(shards[len(self._links)]))
+
+        for link, shard in zip(self._links, shards):
+            if link.filters != shard:
+                link.set_filter(shard)
+
+            # Fail over, or reconnect, if the primary is gone
+            if link.primary is None or link.primary.failed:
+                failed = link.primary
+                link.primary = None
+                if failed is not None:
+                    failed.close()
+                if link.standby is not None and link.standby.logged_in:
+                    link.primary = link.standby
+                    link.standby = None
+                    self._failover_count += 1
+                    logger.warning(
+                        "APRS-IS failover from %s to %s",
+                        failed.server if failed else None,
+                        link.primary.server,
+                    )
+                else:
+                    exclude = [] if link.standby is None else [link.standby.server]
+                    server = self._choose_server(exclude)
+                    if server is not None:
+                        link.primary = self._open(server, link.filters)
+
+            if self._hot_standby and link.primary is not None:
+                self._maintain_standby(link)
+
+    def _maintain_standby(self, link: "_APRSLink") -> None:
+        """
+        Keep a receive-only standby, on a different server. After a failover, the
+        (receive-only) primary can't send, so log in again, verified, in place of
+        the standby, and swap once it is in. Called with the lock held.
+        """
+        assert link.primary is not None
+        if link.standby is not None and link.standby.failed:
+            link.standby.close()
+            link.standby = None
+
+        # The standby is always of the opposite kind to the primary
+        if (
+            link.standby is not None
+            and link.standby.receive_only == link.primary.receive_only
+        ):
+            link.standby.close()
+            link.standby = None
+
+        if link.standby is None:
+            server = self._choose_server([link.primary.server])
+            if server is None and link.primary.receive_only:
+                server = self._choose_server([])
+            if server is not None:
+                link.standby = self._open(
+                    server, link.filters, receive_only=not link.primary.receive_only
+                )
+        elif link.primary.receive_only and link.standby.logged_in:
+            receive_only = link.primary
+            link.primary = link.standby
+            link.standby = None
+            receive_only.close()
+            logger.info("APRS-IS verified login restored on %s", link.primary.server)
+
+    def _probe_servers(self, servers: list["_ServerHealth"], timeout: float) -> None:
         """
-        self._tx_queue.put(_UpdateFilters(filters))
+        Measure connect and login latency of the given servers, in parallel.
+        """
+        threads = list()
+        for server in servers:
+            probe = _APRSConnection(
+                server, self._login, RECEIVE_ONLY_PASSCODE, None, None, start=False
+            )
+            t = threading.Thread(target=probe.probe, daemon=True)
+            t.start()
+            threads.append(t)
+        deadline = time.monotonic() + timeout
+        for t in threads:
+            t.join(max(0, deadline - time.monotonic()))
+
+    def _monitor_thread_body(self) -> None:
+        # Rank the servers before connecting (there is nothing to rank with one server)
+        if len(self._servers) > 1:
+            self._probe_servers(self._servers, PROBE_TIMEOUT)
+        self._next_probe_time = time.monotonic() + PROBE_INTERVAL
+
+        with self._lock:
+            self._links_enabled = True
+
+        while not self._closed.is_set():
+            try:
+                with self._lock:
+                    self._maintain_links()
+                    in_use = [
+                        c.server for link in self._links for c in link.connections()
+                    ]
+
+                # Periodically re-measure idle servers, in the background
+                if len(self._servers) > 1 and time.monotonic() > self._next_probe_time:
+                    self._next_probe_time = time.monotonic() + PROBE_INTERVAL
+                    idle = [s for s in self._servers if s not in in_use]
+                    threading.Thread(
+                        target=self._probe_servers,
+                        args=(idle, CONNECT_TIMEOUT + LOGIN_TIMEOUT),
+                        daemon=True,
+                    ).start()
+            except:
+                logger.error(traceback.format_exc())
+            self._closed.wait(MONITOR_INTERVAL)
+
+    def _tx_connection(self) -> "_APRSConnection | None":
+        with self._lock:
+            if len(self._links) == 0:
+                return None
+            primary = self._links[0].primary
+            if (
+                primary is None
+                or not primary.logged_in
+                or primary.failed
+                or primary.receive_only
+            ):
+                return None
+            return primary
+
+    def _send_filters(self) -> None:
+        """
+        Send any pending filter updates. (From the transmit thread, without the lock,
+        so that a stalled server can't stall callers of set_filter.)
+        """
+        with self._lock:
+            connections = [c for link in self._links for c in link.connections()]
+        for connection in connections:
+            try:
+                connection.send_filter()
+            except OSError as e:
+                logger.warning("Error sending filter to APRS-IS: %s", e)
 
     def _tx_thread_body(self) -> None:
-        while True:
+        packet = None
+        trace = None
+        while not self._closed.is_set():
             try:
-                # Client has not been created yet
-                if self._aprs is None:
-                    time.sleep(POLL_DELAY)
-                    continue
+                self._send_filters()
+
+                # Read a packet, unless one is still waiting to be sent
+                if packet is None:
+                    packet, trace = self._tx_queue.get(timeout=POLL_DELAY)
 
-                # Client is not yet connected
-                if not self._aprs._connected:
+                # Not yet connected (or failing over)
+                connection = self._tx_connection()
+                if connection is None:
                     time.sleep(POLL_DELAY)
                     continue
 
-                # Read a packet
-                packet = self._tx_queue.get(block=False)
-                if isinstance(packet, _UpdateFilters):
-                    self._filters = packet.filters
-                    if self._filters is None:
-                        self._aprs.set_filter("")  # Default filter?
-                    else:
-                        self._aprs.set_filter(self._filters)
-                else:
-                    self._aprs.sendall(packet)
+                connection.sendall(packet)
+                if self._recorder is not None:
+                    self._recorder.record(APRS_TX, packet)
+                packet = None
+                if trace is not None:
+                    trace.stamp("socket_write")
+                    trace.release()
+                    trace = None
             except Empty:
-                time.sleep(YIELD_DELAY)
+                pass
+            except OSError as e:
+                # The connection is marked as failed, and the packet will be retried
+                logger.warning("Error sending to APRS-IS: %s", e)
             except:
                 logger.error(traceback.format_exc())
                 raise
 
-    def _rx_thread_body(self) -> None:
-        try:
-            self._aprs = aprslib.IS(self._login, passwd=self._passcode, port=14580)
-            assert self._aprs is not None
-            if self._filters is not None:
-                self._aprs.set_filter(self._filters)
-            self._aprs.connect()
-            self._aprs.consumer(
-                lambda x: self._rx_queue.put(x, block=True), raw=True, blocking=True
-            )
-        except:
-            logger.error(traceback.format_exc())
-            raise
 
+class _Deduplicator(object):
+    """
+    Remembers the lines seen in the last 'window' seconds.
+    """
+
+    def __init__(self, window: float):
+        super().__init__()
+        self._window = window
+        self._seen: dict[bytes, float] = dict()
+        self._order: deque = deque()
+
+    def is_duplicate(self, line: bytes, now: float) -> bool:
+        # Forget old lines
+        while len(self._order) > 0 and self._order[0][0] < now - self._window:
+            when, old = self._order.popleft()
+            if self._seen.get(old) == when:
+                del self._seen[old]
+
+        if line in self._seen:
+            return True
+        self._seen[line] = now
+        self._order.append((now, line))
+        return False
 
-class _UpdateFilters(object):
+
+class _APRSLink(object):
     """
-    Class used to update the filters.
+    One filter shard, served by a primary connection, and an optional hot standby.
     """
 
     def __init__(self, filters: str | None):
         super().__init__()
         self.filters = filters
+        self.primary: _APRSConnection | None = None
+        self.standby: _APRSConnection | None = None
+
+    def connections(self) -> list["_APRSConnection"]:
+        return [c for c in [self.primary, self.standby] if c is not None]
+
+    def set_filter(self, filters: str | None) -> None:
+        self.filters = filters
+        for connection in self.connections():
+            connection.set_filter(filters)
+
+    def close(self) -> None:
+        for connection in self.connections():
+            connection.close()
+        self.primary = None
+        self.standby = None
+
+    def to_dict(self) -> dict:
+        return {
+            "filters": self.filters,
+            "primary": None if self.primary is None else str(self.primary.server),
+            "standby": None if self.standby is None else str(self.standby.server),
+        }
+
+
+class _ServerHealth(object):
+    """
+    The address, and health statistics, of one APRS-IS server.
+    """
+
+    def __init__(self, address: str):
+        super().__init__()
+        host, _, port = address.strip().rpartition(":")
+        if host == "":
+            host, port = port, str(DEFAULT_APRSIS_PORT)
+        self.host = host
+        self.port = int(port)
+
+        self.connects = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.connect_latency: float | None = None
+        self.login_latency: float | None = None
+        self.last_error: str | None = None
+        self.last_rx_time: float | None = None
+        self.retry_time = 0.0
+
+    @property
+    def latency(self) -> float | None:
+        if self.connect_latency is None or self.login_latency is None:
+            return None
+        return self.connect_latency + self.login_latency
+
+    def record_connect(self, connect_latency: float, login_latency: float) -> None:
+        self.connects += 1
+        self.consecutive_failures = 0
+        self.connect_latency = connect_latency
+        self.login_latency = login_latency
+
+    def record_failure(self, error: str) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+
+        # Exponential backoff
+        backoff = min(MAX_RETRY_BACKOFF, 2 ** (self.consecutive_failures - 1))
+        self.retry_time = time.monotonic() + backoff
+
+    def to_dict(self) -> dict:
+        return {
+            "server": str(self),
+            "connects": self.connects,
+            "failures": self.failures,
+            "connect_latency": self.connect_latency,
+            "login_latency": self.login_latency,
+            "last_error": self.last_error,
+            "last_rx_time": self.last_rx_time,
+        }
+
+    def __str__(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+class _APRSConnection(object):
+    """
+    A single connection to an APRS-IS server, with its own receive thread.
+    """
+
+    def __init__(
+        self,
+        server: _ServerHealth,
+        login: str,
+        passcode: str,
+        filters: str | None,
+        on_line,
+        start: bool = True,
+        on_login=None,
+        receive_only: bool = False,
+    ):
+        super().__init__()
+        self.server = server
+        self.filters = filters
+        self.receive_only = receive_only
+        self.logged_in = False
+        self.failed = False
+
+        self._login = login
+        self._passcode = passcode
+        self._on_line = on_line
+        self._on_login = on_login
+        self._closed = False
+        self._sock: socket.socket | None = None
+        self._reader = None
+        self._send_lock = threading.Lock()
+        self._filter_pending = False
+
+        if start:
+            self._rx_thread = threading.Thread(target=self._rx_thread_body, daemon=True)
+            self._rx_thread.start()
+
+    def set_filter(self, filters: str | None) -> None:
+        """
+        Change the filters. The change is sent by send_filter(), once logged in.
+        """
+        self.filters = filters
+        self._filter_pending = True
+
+    def send_filter(self) -> None:
+        """
+        Send the filters, if they changed since login (or since they were last sent).
+        """
+        if not self._filter_pending or not self.logged_in or self.failed:
+            return
+        self._filter_pending = False
+        filters = self.filters
+        self.sendall("#filter " + ("" if filters is None else filters))
+
+    def sendall(self, packet: str | bytes) -> None:
+        sock = self._sock
+        if sock is None or self.failed:
+            raise ConnectionError("not connected")
+        if isinstance(packet, str):
+            packet = packet.encode("utf-8")
+        try:
+            with self._send_lock:
+                sock.sendall(packet.rstrip(b"\r\n") + b"\r\n")
+        except OSError:
+            self.failed = True
+            raise
+
+    def close(self) -> None:
+        self._closed = True
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def probe(self) -> None:
+        """
+        Connect and log in (measuring latency), then disconnect.
+        """
+        try:
+            self._connect()
+        except Exception as e:
+            self.server.record_failure(str(e))
+        finally:
+            self.close()
+
+    def _connect(self) -> None:
+        """
+        Connect, read the banner, and log in, recording the latency of each step.
+        """
+        start = time.monotonic()
+        self._sock = socket.create_connection(
+            (self.server.host, self.server.port), CONNECT_TIMEOUT
+        )
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self._sock.settimeout(LOGIN_TIMEOUT)
+        self._reader = self._sock.makefile("rb")
+        banner = self._reader.readline()
+        if not banner.startswith(b"#"):
+            raise ConnectionError("invalid banner from server")
+        connect_latency = time.monotonic() - start
+
+        start = time.monotonic()
+        self._filter_pending = False  # The login sends the current filters
+        login = (
+            f"user {self._login} pass {self._passcode} vers aprstastic {__version__}"
+        )
+        if self.filters is not None and self.filters != "":
+            login += " filter " + self.filters
+        with self._send_lock:
+            self._sock.sendall((login + "\r\n").encode("utf-8"))
+
+        while True:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("connection closed during login")
+            if line.startswith(b"# logresp"):
+                break
+        login_latency = time.monotonic() - start
+
+        # e.g., "# logresp N0CALL verified, server T2TEST"
+        parts = line.decode("latin-1").split()
+        if len(parts) < 4 or parts[2] != self._login:
+            raise ConnectionError(
+                "unexpected login response: " + line.decode("latin-1")
+            )
+        if parts[3].rstrip(",") != "verified" and str(self._passcode) != "-1":
+            raise ConnectionError("passcode is incorrect")
+
+        self.server.record_connect(connect_latency, login_latency)
+        self.logged_in = True
+        logger.info(
+            "Logged in to APRS-IS server %s (connect: %.3fs, login: %.3fs)",
+            self.server,
+            connect_latency,
+            login_latency,
+        )
+
+    def _rx_thread_body(self) -> None:
+        try:
+            self._connect()
+            assert self._sock is not None and self._reader is not None
+            if self._on_login is not None:
+                self._on_login()
+
+            # Silence (not even keepalives) means the connection is dead
+            self._sock.settimeout(KEEPALIVE_TIMEOUT)
+            while not self._closed:
+                line = self._reader.readline()
+                if not line:
+                    raise ConnectionError("connection closed by server")
+                self.server.last_rx_time = time.time()
+                if line.startswith(b"#"):
+                    continue
+                self._on_line(self, line.rstrip(b"\r\n"))
+        except Exception as e:
+            if not self._closed:
+                logger.warning("APRS-IS connection to %s failed: %s", self.server, e)
+                self.server.record_failure(str(e))
+        finally:
+            self.failed = True
+            self.logged_in = False
+            self.close()
+
+
+def _decode(line: bytes | str) -> str:
+    """
+    Decode a raw line, as aprslib does: UTF-8 if possible, otherwise Latin-1.
+    """
+    if isinstance(line, str):
+        return line
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError:
+        return line.decode("latin-1")
+
+
+def message_addressee(packet: bytes | str) -> str | None:
+    """
+    Return the (upper case) addressee of a raw APRS message packet, or None if the
+    packet is not a message. This is much cheaper than parsing the packet.
+    """
+    if isinstance(packet, bytes):
+        packet = packet.decode("utf-8", errors="replace")
+
+    # Messages look like: SRC>DST,PATH::ADDRESSEE:text
+    i = packet.find(":")
+    if i < 0 or packet[i + 1 : i + 2] != ":":
+        return None
+    return packet[i + 2 : i + 11].strip().upper()
+
+
+def plan_filters(
+    call_signs: list[str],
+    max_length: int = MAX_FILTER_LENGTH,
+    max_shards: int = MAX_CONNECTIONS,
+) -> list[str]:
+    """
+    Pack a list of call signs into group message filters ("g/..."), each at most
+    max_length characters long.
+
+    Call signs are kept exact if they fit in max_shards filters. Otherwise, call
+    signs that share a base call (e.g., N0CALL-1 and N0CALL-2) are grouped into
+    a single wildcard term (N0CALL*), and, if that is still not enough, terms
+    sharing ever-shorter prefixes are merged into wildcards, down to
+    MIN_WILDCARD_PREFIX_LENGTH characters. Terms never overlap, so each addressee
+    matches at most one filter.
+    """
+
+    # Deduplicate, preserving order (the first terms are the most important)
+    seen = set()
+    unique = list()
+    for call_sign in call_signs:
+        call_sign = call_sign.strip().upper()
+        if call_sign != "" and call_sign not in seen:
+            seen.add(call_sign)
+            unique.append(call_sign)
+
+    # Wildcards match more than was asked for, so only use them if needed
+    shards = _pack_terms(unique, max_length)
+    if len(shards) <= max_shards:
+        return shards
+
+    # Group by base call
+    by_base: dict[str, list[str]] = dict()
+    for call_sign in unique:
+        by_base.setdefault(call_sign.split("-")[0], list()).append(call_sign)
+    terms = list()
+    for call_sign in unique:
+        base = call_sign.split("-")[0]
+        if len(by_base[base]) > 1:
+            call_sign = base + "*"
+        terms.append(call_sign)
+    terms = _remove_subsumed(terms)
+
+    shards = _pack_terms(terms, max_length)
+    if len(shards) <= max_shards:
+        return shards
+
+    # Merge shared prefixes, starting with the longest
+    longest = max([len(t.rstrip("*")) for t in terms])
+    for prefix_length in range(longest - 1, MIN_WILDCARD_PREFIX_LENGTH - 1, -1):
+        by_prefix: dict[str, int] = dict()
+        for term in terms:
+            if len(term.rstrip("*")) >= prefix_length:
+                prefix = term[0:prefix_length]
+                by_prefix[prefix] = by_prefix.get(prefix, 0) + 1
+        merged = list()
+        for term in terms:
+            prefix = term[0:prefix_length]
+            if len(term.rstrip("*")) >= prefix_length and by_prefix[prefix] > 1:
+                term = prefix + "*"
+            merged.append(term)
+        terms = _remove_subsumed(merged)
+
+        shards = _pack_terms(terms, max_length)
+        if len(shards) <= max_shards:
+            break
+    return shards
+
+
+def _remove_subsumed(terms: list[str]) -> list[str]:
+    """
+    Remove duplicates, and terms that are matched by another wildcard term.
+    """
+    wildcards = set([t[0:-1] for t in terms if t.endswith("*")])
+    result = list()
+    seen = set()
+    for term in terms:
+        if term in seen:
+            continue
+        stem = term[0:-1] if term.endswith("*") else term
+        for i in range(0, len(stem) + (0 if term.endswith("*") else 1)):
+            if stem[0:i] in wildcards:
+                break
+        else:
+            seen.add(term)
+            result.append(term)
+    return result
+
+
+def _pack_terms(terms: list[str], max_length: int) -> list[str]:
+    """
+    Pack terms, in order, into as few "g/..." filters of at most max_length as possible.
+    """
+    shards = list()
+    current = "g"
+    for term in terms:
+        if len(current) > 1 and len(current) + 1 + len(term) > max_length:
+            shards.append(current)
+            current = "g"
+        current += "/" + term
+    shards.append(current)
+    return shards
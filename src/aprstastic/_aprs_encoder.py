@@ -0,0 +1,203 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import math
+import time
+
+APRS_SOFTWARE_ID = "APZMAG"  # Experimental Meshtastic-APRS Gateway
+
+# Position formats
+POSITION_FORMAT_UNCOMPRESSED = "uncompressed"  # DDMM.mmN/DDDMM.mmW
+POSITION_FORMAT_COMPRESSED = "compressed"  # Base91, with course/speed or altitude
+POSITION_FORMATS = [POSITION_FORMAT_UNCOMPRESSED, POSITION_FORMAT_COMPRESSED]
+
+# The compression type (T) byte: current GPS fix, software origin, and the NMEA source
+# that tells receivers how to read the cs bytes (GGA: altitude, RMC: course/speed)
+_COMPRESSION_TYPE_ALTITUDE = chr(33 + 0b110010)
+_COMPRESSION_TYPE_COURSE_SPEED = chr(33 + 0b111010)
+_COMPRESSION_TYPE_NONE = chr(33 + 0b100010)
+
+# Bound the path prefix cache. (It holds one entry per call sign the gateway sends as.)
+MAX_CACHED_PREFIXES = 4096
+
+
+class APRSEncoder(object):
+    """
+    Builds the APRS packets sent by the gateway.
+
+    Packets gated from the mesh share a path (CALL>APZMAG,WIDE1-1,qAR,GATEWAY), so
+    the prefix is built once per source call sign and cached. If as_bytes is True,
+    packets are returned as bytes, ready for the socket. Positions are encoded
+    in the given position_format (one of POSITION_FORMATS).
+    """
+
+    def __init__(
+        self,
+        gateway_call_sign,
+        software_id=APRS_SOFTWARE_ID,
+        as_bytes=False,
+        position_format=POSITION_FORMAT_UNCOMPRESSED,
+    ):
+        super().__init__()
+        if position_format not in POSITION_FORMATS:
+            raise ValueError(
+                f"Unknown position format '{position_format}'. Expected one of: {POSITION_FORMATS}"
+            )
+        self._compressed = position_format == POSITION_FORMAT_COMPRESSED
+        self._gateway_call_sign = gateway_call_sign
+        self._software_id = software_id
+        self._as_bytes = as_bytes
+        self._prefixes = dict()
+
+        # The gateway's own beacons are sent directly to APRS-IS
+        self._beacon_prefix = f"{gateway_call_sign}>{software_id},TCPIP*:"
+
+    def prefix(self, fromcall):
+        """
+        Return the header for packets gated on behalf of fromcall, up to and including the ':'
+        """
+        prefix = self._prefixes.get(fromcall)
+        if prefix is None:
+            if len(self._prefixes) >= MAX_CACHED_PREFIXES:
+                self._prefixes.clear()
+            prefix = (
+                f"{fromcall}>{self._software_id},WIDE1-1,qAR,{self._gateway_call_sign}:"
+            )
+            self._prefixes[fromcall] = prefix
+        return prefix
+
+    def message(self, fromcall, tocall, text, msg_no=None):
+        """
+        A text message, with an optional message number (to request an ack).
+        """
+        if msg_no is None:
+            return self._out(f"{self.prefix(fromcall)}:{tocall:<9}:{text}")
+        return self._out(f"{self.prefix(fromcall)}:{tocall:<9}:{text}{{{msg_no}")
+
+    def ack(self, fromcall, tocall, msg_no):
+        return self._out(f"{self.prefix(fromcall)}:{tocall:<9}:ack{msg_no}")
+
+    def position(
+        self,
+        fromcall,
+        lat,
+        lon,
+        symbol,
+        comment,
+        timestamp=None,
+        course=None,
+        speed=None,
+        altitude=None,
+    ):
+        """
+        A position report, timestamped (in UTC) if a timestamp is given. Course
+        (degrees), speed (km/h) and altitude (meters) are only included in
+        compressed positions.
+        """
+        if timestamp is None:
+            data_type = "="
+        else:
+            data_type = "@" + format_timestamp(timestamp)
+        position = self._position(lat, lon, symbol, course, speed, altitude)
+        return self._out(f"{self.prefix(fromcall)}{data_type}{position}{comment}")
+
+    def gateway_beacon(self, lat, lon, symbol, comment):
+        """
+        The gateway's own position beacon.
+        """
+        position = self._position(lat, lon, symbol)
+        return self._out(f"{self._beacon_prefix}!{position}{comment}")
+
+    def _position(self, lat, lon, symbol, course=None, speed=None, altitude=None):
+        if self._compressed:
+            return format_compressed_position(lat, lon, symbol, course, speed, altitude)
+        return f"{format_latitude(lat)}{symbol[0]}{format_longitude(lon)}{symbol[1]}"
+
+    def _out(self, packet):
+        if self._as_bytes:
+            return packet.encode("utf-8")
+        return packet
+
+
+def format_latitude(lat):
+    """
+    Format a latitude as DDMM.mmN (or S).
+    """
+    hemisphere = "N" if lat >= 0 else "S"
+    degrees, hundredths = divmod(round(abs(lat) * 6000), 6000)
+    return "%02d%02d.%02d%s" % (
+        degrees,
+        hundredths // 100,
+        hundredths % 100,
+        hemisphere,
+    )
+
+
+def format_longitude(lon):
+    """
+    Format a longitude as DDDMM.mmE (or W).
+    """
+    hemisphere = "E" if lon >= 0 else "W"
+    degrees, hundredths = divmod(round(abs(lon) * 6000), 6000)
+    return "%03d%02d.%02d%s" % (
+        degrees,
+        hundredths // 100,
+        hundredths % 100,
+        hemisphere,
+    )
+
+
+def format_timestamp(t):
+    """
+    Format a Unix timestamp as an APRS DHM (zulu) timestamp: DDHHMMz
+    """
+    tm = time.gmtime(t)
+    return "%02d%02d%02dz" % (tm.tm_mday, tm.tm_hour, tm.tm_min)
+
+
+def format_compressed_position(
+    lat, lon, symbol, course=None, speed=None, altitude=None
+):
+    """
+    Format a base91 compressed position: /YYYYXXXX$csT
+
+    The cs bytes carry either course and speed, or altitude. If both are known,
+    course and speed are used, and the altitude is appended as /A=nnnnnn.
+    """
+    # Compressed positions use letters a-j for numeric overlays
+    table = symbol[0]
+    if table.isdigit():
+        table = chr(ord("a") + int(table))
+
+    y = _clamp(round(380926 * (90 - lat)), 0, 91**4 - 1)
+    x = _clamp(round(190463 * (180 + lon)), 0, 91**4 - 1)
+    position = f"{table}{_base91(y, 4)}{_base91(x, 4)}{symbol[1]}"
+
+    altitude_feet = None if altitude is None else altitude / 0.3048
+
+    if course is not None and speed is not None and speed >= 0:
+        # Course in 4 degree steps (0 is north), speed in knots on a log scale
+        c = round((course % 360) / 4) % 90
+        s = _clamp(round(math.log(speed / 1.852 + 1) / math.log(1.08)), 0, 90)
+        position += f"{chr(33 + c)}{chr(33 + s)}{_COMPRESSION_TYPE_COURSE_SPEED}"
+        if altitude_feet is not None:
+            position += "/A=%06d" % _clamp(round(altitude_feet), 0, 999999)
+    elif altitude_feet is not None and altitude_feet >= 1:
+        # Altitude in feet, on a log scale
+        cs = _clamp(round(math.log(altitude_feet) / math.log(1.002)), 0, 91**2 - 1)
+        position += f"{_base91(cs, 2)}{_COMPRESSION_TYPE_ALTITUDE}"
+    else:
+        position += "  " + _COMPRESSION_TYPE_NONE
+    return position
+
+
+def _base91(value, width):
+    chars = list()
+    for _ in range(0, width):
+        value, digit = divmod(value, 91)
+        chars.append(chr(33 + digit))
+    return "".join(reversed(chars))
+
+
+def _clamp(value, lo, hi):
+    return max(lo, min(hi, value))
@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import re
+import logging
+
+logger = logging.getLogger("aprstastic")
+
+# Patterns are compiled once, here, rather than on every message.
+
+# !register CALLSIGN-SSID [ICON] (matched against the lower-cased message)
+REGISTER_RE = re.compile(
+    r"^!register:?\s+([a-z0-9]{4,7}\-[0-9]{1,2})(\s+(\$\$|[a-zA-Z0-9]{2,3}))?$"
+)
+
+# CALLSIGN[-SSID]: message
+DEST_PREFIX_RE = re.compile(r"^([A-Za-z0-9]+(\-[A-Za-z0-9]+)?):(.*)$")
+
+# The text of a registration beacon: !deviceid[:ICON] (matched against the lower-cased text)
+BEACON_RE = re.compile(r"^(![a-f0-9]{8})(:(\$\$|[A-Za-z0-9]{2,3}))?$")
+
+
+class CommandMessage(object):
+    """
+    A text message, normalized once: stripped, lower-cased, and with its command
+    token (the first word, up to any ':') split out.
+    """
+
+    __slots__ = ("text", "stripped", "lowered", "token")
+
+    def __init__(self, text):
+        self.text = text
+        self.stripped = stripped = text.strip()
+        self.lowered = lowered = stripped.lower()
+        self.token = lowered.split(None, 1)[0].partition(":")[0] if lowered else ""
+
+
+class CommandRouter(object):
+    """
+    Dispatches text messages to handlers by their first token (e.g., "!register").
+
+    Handlers are called as handler(from_id, message), where message is a CommandMessage.
+    Exact commands (e.g., "?") only match when they are the whole message. Messages
+    that match no command go to the fallback handler, if any.
+    """
+
+    def __init__(self, fallback=None):
+        super().__init__()
+        self._handlers = dict()
+        self._fallback = fallback
+
+    def register(self, token, handler, exact=False):
+        """
+        Register a handler for a command token. Replaces any existing handler.
+        """
+        token = token.lower()
+        if token in self._handlers:
+            logger.debug(f"Replacing handler for command '{token}'")
+        self._handlers[token] = (handler, exact)
+
+    def unregister(self, token):
+        self._handlers.pop(token.lower(), None)
+
+    def set_fallback(self, handler):
+        self._fallback = handler
+
+    def dispatch(self, from_id, message):
+        """
+        Route a message (str or CommandMessage) to its handler. Returns True if
+        any handler (including the fallback) was called.
+        """
+        if not isinstance(message, CommandMessage):
+            message = CommandMessage(message)
+
+        entry = self._handlers.get(message.token)
+        if entry is not None:
+            handler, exact = entry
+            if not exact or message.lowered == message.token:
+                handler(from_id, message)
+                return True
+
+        if self._fallback is not None:
+            self._fallback(from_id, message)
+            return True
+        return False
+
+    def __contains__(self, token):
+        return token.lower() in self._handlers
@@ -17,6 +17,85 @@ aprsis_passcode: 12345
 # max_aprs_message_length: 128
 
 
+# How positions are encoded on APRS. 'compressed' (base91) positions are
+# shorter, more precise, and include course and speed, or altitude, when
+# the device reports them. If null, or commented out, default to 'uncompressed'.
+#aprs_position_format: compressed
+
+
+# Only forward a node's position to APRS when it has moved, turned a corner,
+# or not been reported in a while (SmartBeaconing). Off by default, in which
+# case every position is forwarded. Speeds are in km/h and times in seconds.
+#position_governor:
+#  enabled: false
+#  slow_speed: 5
+#  slow_rate: 1800
+#  fast_speed: 90
+#  fast_rate: 180
+#  min_turn_angle: 30
+#  turn_slope: 240
+#  min_turn_time: 15
+#  min_distance: 100
+#  min_interval: 30
+
+
+# Relay a digest of APRS stations, objects and weather stations within
+# 'range_km' of the gateway to a mesh channel, at most every
+# 'interval_minutes'. Off by default. The position defaults to the gateway's.
+#nearby_relay:
+#  enabled: false
+#  range_km: 50
+#  channel_index: 0
+#  interval_minutes: 30
+#  max_stations: 5
+#  ttl_minutes: 60
+#  latitude: 47.6205063
+#  longitude: -122.3518523
+
+
+# Serve metrics over HTTP, in the Prometheus text format at /metrics, and as
+# JSON at /metrics.json. Off by default. Only listens locally, unless 'host'
+# is changed.
+#metrics:
+#  enabled: false
+#  host: 127.0.0.1
+#  port: 9464
+
+
+# Trace a sample of messages through each stage of the gateway, to measure
+# mesh -> APRS-IS and APRS-IS -> mesh latency. Percentiles are served at
+# /traces.json when metrics are enabled. Set to 0 to disable.
+#tracing:
+#  sample_rate: 0.1
+
+
+# Profile the gateway on demand, with 'kill -USR1 <pid>' (to start and stop), or
+# by sending '!profile start [SECONDS]' or '!profile stop' from one of the 'admins'
+# devices. Results are written to the logs directory. 'sample' mode samples all
+# threads, 'cprofile' mode profiles the main loop in detail. Main loop
+# iterations taking longer than 'slow_tick_seconds' are logged, with a stack.
+#profiler:
+#  mode: sample
+#  admins: []               # E.g., ["!abcd1234"]
+#  slow_tick_seconds: 1.0
+
+
+# APRS-IS servers limit the length of filters. If the call signs the gateway
+# listens for don't fit, they are compressed into wildcards, and then split
+# across up to 'aprsis_max_connections' connections.
+#aprsis_max_filter_length: 512
+#aprsis_max_connections: 3
+
+# The APRS-IS servers to use, in order of preference. Servers are ranked by
+# their measured login latency. With more than one server, each connection
+# keeps a hot standby on a second server, to fail over to immediately. (The
+# standby logs in receive-only, so only one session is verified at a time.)
+#aprsis_servers:
+#  - rotate.aprs.net:14580
+#  - noam.aprs2.net:14580
+#aprsis_hot_standby: true
+
+
 # Only serial devices are supported right now. 
 # If 'device' is null (or commented out), an attempt will be made to 
 # detected it automatically.
@@ -37,6 +116,45 @@ gateway_beacon:
 #  longitude: -122.3518523    # Leave commented to read position from Meshtastic device
 
 
+# Only listen on APRS-IS for registered devices heard in this many hours.
+# If null, or commented out, default to 24 hours.
+#filter_ttl_hours: 24
+
+
+# Once a day, remove registration database rows that no longer affect
+# any registrations. Only rows older than 'retention_days' are considered.
+# The same can be done offline with: python -m aprstastic --compact-registry
+#registry_compaction:
+#  enabled: true
+#  retention_days: 30
+
+
+# Devices can reply to the last station they talked to without a call sign
+# prefix. The gateway remembers up to 'max_size' conversations, for up to
+# 'ttl_days' days, and saves them in the data directory across restarts.
+#reply_to:
+#  max_size: 10000
+#  ttl_days: 7
+
+
+# Record raw APRS-IS lines and Meshtastic packets, for debugging and capacity
+# planning, to gzipped JSON lines files (traffic-*.jsonl.gz) in the logs directory.
+# Files are rotated after 'max_megabytes' (uncompressed) or 'max_age_minutes',
+# and only the newest 'backup_count' are kept. Off by default.
+#recorder:
+#  enabled: false
+#  max_megabytes: 64
+#  max_age_minutes: 60
+#  backup_count: 48
+
+
+# Logging. 'level' is one of DEBUG, INFO, WARNING, or ERROR. 'format' is 'text',
+# or 'json' (one JSON object per line, for log aggregators).
+#logging:
+#  level: DEBUG
+#  format: text
+
+
 # Where should logs be stored?
 # If null, (or commented out), store logs in the `logs` dir, sibling to this file. 
 #logs_dir: null
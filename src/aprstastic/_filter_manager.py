@@ -0,0 +1,168 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import threading
+import logging
+
+from collections import deque
+
+logger = logging.getLogger("aprstastic")
+
+FILTER_DEBOUNCE_INTERVAL = 5  # At most one filter update every 5 seconds
+FILTER_RATE_WINDOW = 3600  # Report the update rate over the last hour
+
+
+class FilterManager(object):
+    """
+    Maintains the set of call signs that the gateway listens for on APRS-IS, and
+    decides when the server-side "g/" filter needs to be updated.
+
+    Changes are coalesced: the first change after a quiet period is released
+    immediately, after which at most one update is released per debounce window.
+    Updates that would not change the filter are skipped altogether.
+
+    This class does not talk to APRS-IS itself. Call poll() periodically, and send
+    whatever filter it returns (if any).
+    """
+
+    def __init__(
+        self, static_call_signs=None, debounce_interval=FILTER_DEBOUNCE_INTERVAL
+    ):
+        super().__init__()
+        self._lock = threading.Lock()
+
+        # Static call signs (e.g., the gateway itself) always come first, and are never removed
+        self._static = list()
+        for call_sign in static_call_signs or []:
+            if call_sign not in self._static:
+                self._static.append(call_sign)
+
+        self._call_signs = set()
+        self._extra_terms = list()
+        self._debounce_interval = debounce_interval
+        self._dirty = True
+        self._current_filter = None
+        self._next_update_time = 0
+        self._update_times = deque()
+        self._total_updates = 0
+
+    def add(self, call_sign):
+        """
+        Start listening for a call sign. Returns True if it was not already present.
+        """
+        with self._lock:
+            if call_sign in self._call_signs or call_sign in self._static:
+                return False
+            self._call_signs.add(call_sign)
+            self._dirty = True
+            return True
+
+    def discard(self, call_sign):
+        """
+        Stop listening for a call sign. Returns True if it was present.
+        Static call signs are never removed.
+        """
+        with self._lock:
+            if call_sign not in self._call_signs:
+                return False
+            self._call_signs.remove(call_sign)
+            self._dirty = True
+            return True
+
+    def set_extra_terms(self, terms):
+        """
+        Set other (non "g/") filter terms to send along with the call signs, e.g.,
+        a range filter "r/lat/lon/dist".
+        """
+        with self._lock:
+            terms = list(terms)
+            if terms != self._extra_terms:
+                self._extra_terms = terms
+                self._dirty = True
+
+    def is_static(self, call_sign):
+        return call_sign in self._static
+
+    def build_filter(self):
+        """
+        Return the filter string for the current set of call signs.
+        """
+        with self._lock:
+            return self._build_filter()
+
+    def _build_filter(self):
+        # Sorting makes the string a pure function of the set, so no-op changes are detected
+        return " ".join(
+            ["g/" + "/".join(self._static + sorted(self._call_signs))]
+            + self._extra_terms
+        )
+
+    def poll(self, now=None):
+        """
+        Return a new filter string if one should be sent to APRS-IS now, otherwise None.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            if not self._dirty or now < self._next_update_time:
+                return None
+            self._dirty = False
+
+            new_filter = self._build_filter()
+            if new_filter == self._current_filter:
+                return None
+
+            self._current_filter = new_filter
+            self._next_update_time = now + self._debounce_interval
+            self._total_updates += 1
+            self._update_times.append(now)
+            self._expire_update_times(now)
+            return new_filter
+
+    def _expire_update_times(self, now):
+        while (
+            len(self._update_times) > 0
+            and self._update_times[0] < now - FILTER_RATE_WINDOW
+        ):
+            self._update_times.popleft()
+
+    @property
+    def current_filter(self):
+        """
+        The filter string most recently released by poll(), or None.
+        """
+        return self._current_filter
+
+    def update_rate(self, now=None):
+        """
+        Return the number of filter updates released in the last hour.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._expire_update_times(now)
+            return len(self._update_times)
+
+    def stats(self, now=None):
+        return {
+            "call_signs": len(self),
+            "filter": self._current_filter,
+            "filter_length": 0
+            if self._current_filter is None
+            else len(self._current_filter),
+            "total_updates": self._total_updates,
+            "updates_last_hour": self.update_rate(now),
+        }
+
+    def __contains__(self, call_sign):
+        return call_sign in self._call_signs or call_sign in self._static
+
+    def __len__(self):
+        return len(self._static) + len(self._call_signs)
+
+    def __iter__(self):
+        with self._lock:
+            call_signs = self._static + sorted(self._call_signs)
+        return iter(call_signs)
@@ -1,44 +1,95 @@
-import aprslib
 from aprslib.parsing import parse
-import pubsub
+import pubsub.pub
 import time
 import sys
 import json
 import time
 import logging
-import warnings
 import random
 import threading
-import re
 import os
+import signal
 import traceback
-import meshtastic.stream_interface
-import meshtastic.serial_interface
-from datetime import datetime
-from meshtastic.util import findPorts
 
+from concurrent.futures import ThreadPoolExecutor
 from queue import Queue, Empty
 from .__about__ import __version__
-from ._aprs_client import APRSClient
+from ._aprs_client import APRSClient, MAX_FILTER_LENGTH, MAX_CONNECTIONS
+from ._aprs_encoder import APRSEncoder, POSITION_FORMAT_UNCOMPRESSED
 from ._aprs_symbols import get_symbol_code
+from ._commands import (
+    CommandRouter,
+    CommandMessage,
+    REGISTER_RE,
+    DEST_PREFIX_RE,
+    BEACON_RE,
+)
+from ._filter_manager import FilterManager
+from ._heard_index import HeardIndex
+from ._position_governor import PositionGovernor
+from ._metrics import (
+    MetricsRegistry,
+    MetricsServer,
+    DEFAULT_METRICS_HOST,
+    DEFAULT_METRICS_PORT,
+)
+from ._tracing import Tracer, DEFAULT_TRACE_SAMPLE_RATE, UPLINK
+from ._profiler import (
+    Profiler,
+    SlowTickDetector,
+    PROFILE_MODE_SAMPLE,
+    DEFAULT_PROFILE_DURATION,
+    DEFAULT_SLOW_TICK_THRESHOLD,
+)
+from ._nearby import (
+    NearbyStations,
+    format_digest,
+    DEFAULT_NEARBY_TTL,
+    OBJECT,
+    WEATHER,
+    STATION,
+)
+from ._recorder import (
+    TrafficRecorder,
+    MESH_RX,
+    MESH_TX,
+    DEFAULT_RECORDER_MAX_BYTES,
+    DEFAULT_RECORDER_MAX_AGE,
+    DEFAULT_RECORDER_BACKUP_COUNT,
+)
 from ._registry import CallSignRegistry
+from ._segmenter import (
+    segment,
+    truncate,
+    MAX_APRS_TEXT_MESSAGE_LENGTH,
+    MAX_MESH_MESSAGE_LENGTH,
+)
+from ._reply_to import ReplyToTable, DEFAULT_REPLY_TO_MAX_SIZE, DEFAULT_REPLY_TO_TTL
 
 logger = logging.getLogger("aprstastic")
 
-from aprslib.parsing import parse
-
-MAX_APRS_TEXT_MESSAGE_LENGTH = 67
 MAX_APRS_POSITION_MESSAGE_LENGTH = 43
 
-APRS_SOFTWARE_ID = "APZMAG"  # Experimental Meshtastic-APRS Gateway
 MQTT_TOPIC = "meshtastic.receive"
 REGISTRATION_BEACON = "MESHID-01"
 GATEWAY_BEACON_INTERVAL = 3600  # Station beacons once an hour
 
 SERIAL_WATCHDOG_INTERVAL = 60  # Check the serial state every minute
+FILTER_SWEEP_INTERVAL = 300  # Prune the APRS filter every 5 minutes
+DEFAULT_FILTER_TTL = 3600 * 24  # Stop listening for devices not heard in a day
+REGISTRY_COMPACTION_INTERVAL = 3600 * 24  # Compact the registry database once a day
+REGISTRY_COMPACTION_RETENTION = 3600 * 24 * 30  # Only compact rows older than 30 days
+REPLY_TO_CHECKPOINT_INTERVAL = 60  # Save the reply-to table (if changed) every minute
+DEFAULT_NEARBY_RANGE = 50  # km
+DEFAULT_NEARBY_DIGEST_INTERVAL = (
+    60 * 30
+)  # Relay a digest of nearby stations every 30 minutes
+DEFAULT_NEARBY_DIGEST_SIZE = 5  # Stations
 MESHTASTIC_WATCHDOG_INTERVAL = (
     60 * 15
 )  # After how long should we become worried the Meshtastic device is quiet?
+APRSIS_LOGIN_TIMEOUT = 30  # At startup, wait this long for an APRS-IS login
+NODE_INFO_TIMEOUT = 30  # At startup, wait this long for the device's node info
 
 # Beacons that mean unregister
 APRS_TOMBSTONE = "N0NE-01"
@@ -71,181 +122,471 @@ class Gateway(object):
         self._interface = None
         self._mesh_rx_queue = Queue()
 
+        # Sampled, per-message, latency tracing
+        tracing = config.get("tracing") or {}
+        self._tracer = Tracer(
+            sample_rate=tracing.get("sample_rate", DEFAULT_TRACE_SAMPLE_RATE)
+        )
+        self._current_trace = None  # The trace of the packet being processed, if any
+
+        # On-demand profiling (SIGUSR1, or the !profile command), and slow tick detection
+        profiler = config.get("profiler") or {}
+        self._profiler = Profiler(
+            config.get("logs_dir") or ".",
+            mode=profiler.get("mode", PROFILE_MODE_SAMPLE),
+        )
+        self._profiler_admins = set(a.lower() for a in profiler.get("admins", []))
+        self._profile_requester = None
+        self._slow_ticks = SlowTickDetector(
+            profiler.get("slow_tick_seconds", DEFAULT_SLOW_TICK_THRESHOLD)
+        )
+
+        # Record raw traffic (opt-in)
+        recorder = config.get("recorder") or {}
+        if recorder.get("enabled", False):
+            self._recorder = TrafficRecorder(
+                config.get("logs_dir") or ".",
+                max_bytes=recorder.get(
+                    "max_megabytes", DEFAULT_RECORDER_MAX_BYTES / 1048576
+                )
+                * 1048576,
+                max_age=recorder.get("max_age_minutes", DEFAULT_RECORDER_MAX_AGE / 60)
+                * 60,
+                backup_count=recorder.get(
+                    "backup_count", DEFAULT_RECORDER_BACKUP_COUNT
+                ),
+            )
+        else:
+            self._recorder = None
+
         self._aprs_client = None
+        self._aprs_encoder = None
         self._max_aprs_message_length = config.get("max_aprs_message_length")
         if self._max_aprs_message_length is None:
             self._max_aprs_message_length = MAX_APRS_TEXT_MESSAGE_LENGTH
 
-        self._reply_to = {}
-        self._filtered_call_signs = []
+        reply_to = config.get("reply_to") or {}
+        self._reply_to = ReplyToTable(
+            config.get("data_dir"),
+            max_size=reply_to.get("max_size", DEFAULT_REPLY_TO_MAX_SIZE),
+            ttl=reply_to.get("ttl_days", DEFAULT_REPLY_TO_TTL / 86400) * 86400,
+        )
+        self._filter_manager = None
+        self._heard_index = HeardIndex()
+        self._filter_ttl = config.get("filter_ttl_hours")
+        if self._filter_ttl is None:
+            self._filter_ttl = DEFAULT_FILTER_TTL
+        else:
+            self._filter_ttl = self._filter_ttl * 3600
         self._beacon_registrations = False
 
+        # Govern position uplinks with SmartBeaconing (opt-in)
+        position_governor = dict(config.get("position_governor") or {})
+        if position_governor.pop("enabled", False):
+            self._position_governor = PositionGovernor(**position_governor)
+        else:
+            self._position_governor = None
+
+        # Relay nearby APRS stations to the mesh (opt-in)
+        self._nearby_relay = config.get("nearby_relay") or {}
+        if self._nearby_relay.get("enabled", False):
+            self._nearby = NearbyStations(
+                ttl=self._nearby_relay.get("ttl_minutes", DEFAULT_NEARBY_TTL / 60) * 60
+            )
+        else:
+            self._nearby = None
+        self._nearby_center = None
+        self._next_nearby_digest_time = 0
+        self._last_nearby_digest = None
+
         self._next_beacon_time = 0
         self._next_serial_check_time = 0
+        self._next_compaction_time = 0
+        self._next_filter_sweep_time = 0
+        self._next_reply_to_checkpoint_time = 0
         self._last_meshtastic_packet_time = 0
 
-        self._registry = CallSignRegistry(config.get("data_dir"))
+        self._commands = CommandRouter()
+        self._register_commands()
 
-    def run(self):
-        # For measuring uptime
-        self._start_time = time.time()
+        # Loaded at startup, in parallel with connecting
+        self._registry = None
+        self._startup_timings = dict()
 
-        # Connect to the Meshtastic device
-        device = self._config.get("meshtastic_interface", {}).get("device")
+        self._metrics = MetricsRegistry()
+        self._metrics_server = None
+        self._register_metrics()
 
-        self._interface = self._get_interface(device)
-        if self._interface is None:
-            raise ValueError("No meshtastic device detected or specified.")
+    def run(self):
+        """
+        Start the gateway, and run the main loop forever.
+        """
+        self.start()
+        logger.debug("Starting main loop.")
+        while True:
+            self.tick()
 
-        def on_recv(packet, interface=None):
-            self._mesh_rx_queue.put(packet)
+            # Yield
+            time.sleep(0.001)
 
-        pubsub.pub.subscribe(on_recv, MQTT_TOPIC)
-        node_info = self._interface.getMyNodeInfo()
-        self._gateway_id = node_info.get("user", {}).get("id")
-        logger.debug(f"Gateway device id: {self._gateway_id}")
+    def start(self, interface=None):
+        """
+        Load the registry, connect to the Meshtastic device, and log in to
+        APRS-IS, in parallel. If an interface is given (e.g., a simulated one),
+        it is used instead of a serial device. Returns once the device's node
+        info is known, and the APRS-IS login is confirmed (or has timed out, in
+        which case the client keeps retrying). Afterwards, the caller drives the
+        gateway by calling tick().
+        """
+        # For measuring uptime
+        self._start_time = time.time()
+        startup_start = time.perf_counter()
+
+        # Serve metrics, if enabled
+        metrics = self._config.get("metrics") or {}
+        if metrics.get("enabled", False) and self._metrics_server is None:
+            self._metrics_server = MetricsServer(
+                self._metrics,
+                metrics.get("host", DEFAULT_METRICS_HOST),
+                metrics.get("port", DEFAULT_METRICS_PORT),
+                routes={"/traces.json": self._tracer.summary},
+            ).start()
+
+        # Toggle profiling with: kill -USR1 <pid>
+        if hasattr(signal, "SIGUSR1"):
+            try:
+                signal.signal(
+                    signal.SIGUSR1,
+                    lambda signum, frame: self._profiler.request_toggle(),
+                )
+            except ValueError:
+                logger.debug("Not on the main thread. Profiling signal not installed.")
 
-        # Create an initial list of known call signs based on the device node database
+        self._device = self._config.get("meshtastic_interface", {}).get("device")
 
         # Myself
         self._gateway_call_sign = self._config.get("call_sign", "").upper().strip()
-        self._filtered_call_signs.append(self._gateway_call_sign)
+        self._aprs_encoder = APRSEncoder(
+            self._gateway_call_sign,
+            position_format=self._config.get("aprs_position_format")
+            or POSITION_FORMAT_UNCOMPRESSED,
+        )
+        static_call_signs = [self._gateway_call_sign]
 
         # The registraion beacon
         self._beacon_registrations = self._config.get("beacon_registrations", True)
         if self._beacon_registrations:
-            self._filtered_call_signs.append(REGISTRATION_BEACON)
+            static_call_signs.append(REGISTRATION_BEACON)
 
-        # Recently seen nodes
-        for node in self._interface.nodesByNum.values():
-            presumptive_id = f"!{node['num']:08x}"
-
-            if presumptive_id not in self._registry:
-                continue
+        self._filter_manager = FilterManager(static_call_signs)
 
-            # Heard more than a day ago
-            last_heard = node.get("lastHeard")
-            if last_heard is None or last_heard + 3600 * 24 < time.time():
-                continue
+        # Packets received while starting up wait in the queue
+        pubsub.pub.subscribe(self._on_recv, MQTT_TOPIC)
 
-            self._filtered_call_signs.append(
-                self._registry[presumptive_id]["call_sign"]
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as pool:
+            registry = pool.submit(
+                self._timed, "registry", CallSignRegistry, self._config.get("data_dir")
             )
+            aprs_login = pool.submit(self._timed, "aprs_is", self._connect_aprs)
+            if interface is None:
+                device = pool.submit(self._timed, "serial", self._connect_device)
+                interface = device.result()
+            self._interface = interface
+
+            node_info = self._timed("node_info", self._wait_for_node_info)
+            self._gateway_id = node_info["user"]["id"]
+            logger.debug("Gateway device id: %s", self._gateway_id)
+
+            self._registry = registry.result()
+            self._registry.subscribe(self._on_registry_event)
+
+            # Create an initial list of known call signs based on the device node
+            # database. (The filter is updated from the main loop.)
+            self._add_heard_nodes()
+
+            if not aprs_login.result():
+                logger.warning(
+                    "APRS-IS login not confirmed after %ds. Continuing, while the client retries.",
+                    APRSIS_LOGIN_TIMEOUT,
+                )
+
+        self._gateway_beacon = self._config.get("gateway_beacon", {})
+        self._registry_compaction = self._config.get("registry_compaction") or {}
+
+        self._last_meshtastic_packet_time = self._start_time
+        self._slow_ticks.start()
 
-        # Connect to APRS IS
+        self._startup_timings["total"] = time.perf_counter() - startup_start
+        logger.info(
+            "Started in %.2fs (%s)",
+            self._startup_timings["total"],
+            ", ".join(
+                f"{phase}: {seconds:.2f}s"
+                for phase, seconds in self._startup_timings.items()
+                if phase != "total"
+            ),
+        )
+
+    def _timed(self, phase, func, *args):
+        """
+        Call func(*args), recording how long the startup phase took.
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._startup_timings[phase] = time.perf_counter() - start
+
+    def _connect_device(self):
+        interface = self._get_interface(self._device)
+        if interface is None:
+            raise ValueError("No meshtastic device detected or specified.")
+        return interface
+
+    def _wait_for_node_info(self):
+        """
+        Wait for the device to report its own node info (which includes its id).
+        """
+        deadline = time.monotonic() + NODE_INFO_TIMEOUT
+        while True:
+            node_info = self._interface.getMyNodeInfo()
+            if node_info is not None and node_info.get("user", {}).get("id"):
+                return node_info
+            if time.monotonic() > deadline:
+                raise TimeoutError("No node info received from the Meshtastic device.")
+            time.sleep(0.05)
+
+    def _connect_aprs(self):
+        """
+        Connect to APRS IS, and wait for the login to be confirmed. Returns True
+        if it was, or False if it timed out.
+        """
         aprsis_passcode = self._config.get("aprsis_passcode")
         self._aprs_client = APRSClient(
             self._gateway_call_sign,
             aprsis_passcode,
-            "g/" + "/".join(self._filtered_call_signs),
+            self._filter_manager.build_filter(),
+            max_filter_length=self._config.get(
+                "aprsis_max_filter_length", MAX_FILTER_LENGTH
+            ),
+            max_connections=self._config.get("aprsis_max_connections", MAX_CONNECTIONS),
+            servers=self._config.get("aprsis_servers"),
+            hot_standby=self._config.get("aprsis_hot_standby"),
+            tracer=self._tracer,
+            recorder=self._recorder,
         )
+        return self._aprs_client.wait_for_login(APRSIS_LOGIN_TIMEOUT)
 
-        logger.debug("Pausing for 2 seconds...")
-        time.sleep(2.0)
-        logger.debug("Starting main loop.")
+    def _add_heard_nodes(self):
+        """
+        Listen for the registered devices that the device has heard recently.
+        """
+        # Recently seen nodes (oldest first, to keep the heard index in order)
+        nodes = [n for n in self._interface.nodesByNum.values() if n.get("lastHeard")]
+        nodes.sort(key=lambda n: n["lastHeard"])
+        for node in nodes:
+            presumptive_id = f"!{node['num']:08x}"
+            last_heard = node["lastHeard"]
 
-        gateway_beacon = self._config.get("gateway_beacon", {})
+            # Heard too long ago
+            if last_heard + self._filter_ttl < time.time():
+                continue
 
-        self._last_meshtastic_packet_time = self._start_time
+            self._heard_index.heard(presumptive_id, last_heard)
+            if presumptive_id in self._registry:
+                self._filter_manager.add(self._registry[presumptive_id]["call_sign"])
 
-        while True:
-            # There are four independent steps performed by this loop: servicing watchdogs,
-            # beaconing, reading from Meshtastic, and reading from APRS.
-            # Make sure that errors in one don't stop the others.
-            now = time.time()
-
-            # 1. Service the watchdogs
-            ############################
-            reconnect = False
-
-            # Periodically check on the state of the device serial connection
-            if now > self._next_serial_check_time:
-                self._next_serial_check_time = now + SERIAL_WATCHDOG_INTERVAL
-                if self._interface.stream is None or not self._interface.stream.is_open:
-                    logger.warn("Serial connection is not open.")
-                    reconnect = True
-
-            # Check if the Meshtastic device has gone silent a while
-            if (
-                reconnect == False
-                and now - self._last_meshtastic_packet_time
-                > MESHTASTIC_WATCHDOG_INTERVAL
-            ):
-                self._last_meshtastic_packet_time = now
-                logger.warn("No message from Meshtastic device for 15 minutes.")
+    def _on_recv(self, packet, interface=None):
+        """
+        Called (by pubsub) from the Meshtastic reader thread, with each packet received.
+        """
+        if self._recorder is not None:
+            # (The raw protobuf duplicates the rest of the packet)
+            self._recorder.record(
+                MESH_RX, {k: v for k, v in packet.items() if k != "raw"}
+            )
+        self._mesh_rx_queue.put((packet, self._tracer.start(UPLINK, "pubsub")))
+
+    def tick(self):
+        """
+        One pass of the main loop: service the watchdogs, beacon, process (at
+        most) one packet from each side, and do any housekeeping that is due.
+        """
+        self._slow_ticks.begin()
+
+        # There are five independent steps performed by this loop: servicing watchdogs,
+        # beaconing, reading from Meshtastic, reading from APRS, and housekeeping.
+        # Make sure that errors in one don't stop the others.
+        now = time.time()
+
+        # 1. Service the watchdogs
+        ############################
+        reconnect = False
+
+        # Periodically check on the state of the device serial connection
+        if now > self._next_serial_check_time:
+            self._next_serial_check_time = now + SERIAL_WATCHDOG_INTERVAL
+            if self._interface.stream is None or not self._interface.stream.is_open:
+                logger.warn("Serial connection is not open.")
                 reconnect = True
-                # This might be a frozen device. It may not be recoverable.
-
-            # Reconnect if needed
-            if reconnect:
-                logger.warn("Attempting to reconnect in 30 seconds.")
-                time.sleep(30)
-                try:
-                    if pubsub.pub.isSubscribed(on_recv, MQTT_TOPIC):
-                        pubsub.pub.unsubscribe(on_recv, MQTT_TOPIC)
-                    self._interface = self._get_interface(device)
-                    if self._interface is not None:
-                        pubsub.pub.subscribe(on_recv, MQTT_TOPIC)
-                except Exception as e:
-                    logger.error(traceback.format_exc())
-
-            # 2. Beacon the gateway position
-            ################################
-            try:
-                if now > self._next_beacon_time and gateway_beacon.get("enabled"):
-                    # If the latitude and longitude are not set in the config, then read it from the radio
-                    gate_lat = gateway_beacon.get("latitude")
-                    gate_lon = gateway_beacon.get("longitude")
-                    if gate_lat is None or gate_lon is None:
-                        gate_position = self._interface.getMyNodeInfo().get(
-                            "position", {}
-                        )
-                        gate_lat = gate_position.get("latitude")
-                        gate_lon = gate_position.get("longitude")
-
-                    # If we still don't have a position, check again in one minute
-                    if gate_lat is None or gate_lon is None:
-                        self._next_beacon_time = now + 60
-                    else:
-                        self._send_aprs_gateway_beacon(
-                            gate_lat,
-                            gate_lon,
-                            gateway_beacon.get("icon", DEFAULT_GATEWAY_ICON),
-                            "aprstastic: " + self._gateway_id,
-                        )
-                        self._next_beacon_time = now + GATEWAY_BEACON_INTERVAL
-            except Exception as e:
-                logger.error(traceback.format_exc())
 
-            # 3. Read a Meshastic packet
-            ############################
+        # Check if the Meshtastic device has gone silent a while
+        if (
+            reconnect == False
+            and now - self._last_meshtastic_packet_time > MESHTASTIC_WATCHDOG_INTERVAL
+        ):
+            self._last_meshtastic_packet_time = now
+            logger.warn("No message from Meshtastic device for 15 minutes.")
+            reconnect = True
+            # This might be a frozen device. It may not be recoverable.
+
+        # Reconnect if needed
+        if reconnect:
+            logger.warn("Attempting to reconnect in 30 seconds.")
+            self._slow_ticks.end()  # (Not a slow tick)
+            time.sleep(30)
+            self._slow_ticks.begin()
             try:
-                mesh_packet = None
-                try:
-                    mesh_packet = self._mesh_rx_queue.get(block=False)
-                except Empty:
-                    pass
-
-                if mesh_packet is not None:
-                    self._process_meshtastic_packet(mesh_packet)
+                if pubsub.pub.isSubscribed(self._on_recv, MQTT_TOPIC):
+                    pubsub.pub.unsubscribe(self._on_recv, MQTT_TOPIC)
+                self._interface = self._get_interface(self._device)
+                if self._interface is not None:
+                    pubsub.pub.subscribe(self._on_recv, MQTT_TOPIC)
             except Exception as e:
                 logger.error(traceback.format_exc())
 
-            # 4. Read an APRS packet
-            ########################
+        # 2. Beacon the gateway position
+        ################################
+        try:
+            if now > self._next_beacon_time and self._gateway_beacon.get("enabled"):
+                gate_lat, gate_lon = self._gateway_position()
+
+                # If we still don't have a position, check again in one minute
+                if gate_lat is None or gate_lon is None:
+                    self._next_beacon_time = now + 60
+                else:
+                    self._send_aprs_gateway_beacon(
+                        gate_lat,
+                        gate_lon,
+                        self._gateway_beacon.get("icon", DEFAULT_GATEWAY_ICON),
+                        "aprstastic: " + self._gateway_id,
+                    )
+                    self._next_beacon_time = now + GATEWAY_BEACON_INTERVAL
+        except Exception as e:
+            logger.error(traceback.format_exc())
+
+        # 3. Read a Meshastic packet
+        ############################
+        trace = None
+        try:
+            mesh_packet = None
             try:
-                aprs_packet = self._aprs_client.recv()
-                if aprs_packet is not None:
-                    self._process_aprs_packet(aprs_packet)
-            except Exception as e:
-                logger.error(traceback.format_exc())
+                mesh_packet, trace = self._mesh_rx_queue.get(block=False)
+            except Empty:
+                pass
+
+            if mesh_packet is not None:
+                start = time.perf_counter()
+                if trace is not None:
+                    trace.stamp("dequeue")
+                self._current_trace = trace
+                self._process_meshtastic_packet(mesh_packet)
+                elapsed = time.perf_counter() - start
+                self._mesh_processing_time.observe(elapsed)
+                self._slow_ticks.check("meshtastic packet", elapsed)
+                if trace is not None:
+                    trace.stamp("processed")
+        except Exception as e:
+            logger.error(traceback.format_exc())
+        finally:
+            self._current_trace = None
+            if trace is not None:
+                trace.release()
+
+        # 4. Read an APRS packet
+        ########################
+        trace = None
+        try:
+            aprs_packet, trace = self._aprs_client.recv_traced()
+            if aprs_packet is not None:
+                start = time.perf_counter()
+                self._aprs_packets_in.inc(aprs_packet.get("format"))
+                self._current_trace = trace
+                self._process_aprs_packet(aprs_packet)
+                elapsed = time.perf_counter() - start
+                self._aprs_processing_time.observe(elapsed)
+                self._slow_ticks.check("aprs packet", elapsed)
+        except Exception as e:
+            logger.error(traceback.format_exc())
+        finally:
+            self._current_trace = None
+            if trace is not None:
+                trace.release()
+
+        # 5. Housekeeping
+        ##################
+        try:
+            # Stop listening for devices that have not been heard in a while
+            if now > self._next_filter_sweep_time:
+                self._next_filter_sweep_time = now + FILTER_SWEEP_INTERVAL
+                self._sweep_filter(now)
+
+            # Send any pending (debounced) filter updates
+            new_filter = self._filter_manager.poll(now)
+            if new_filter is not None:
+                self._aprs_client.set_filter(new_filter)
+        except Exception as e:
+            logger.error(traceback.format_exc())
+
+        try:
+            if now > self._next_compaction_time and self._registry_compaction.get(
+                "enabled", True
+            ):
+                self._registry.compact(
+                    self._registry_compaction.get(
+                        "retention_days", REGISTRY_COMPACTION_RETENTION / 86400
+                    )
+                    * 86400
+                )
+                self._next_compaction_time = now + REGISTRY_COMPACTION_INTERVAL
+        except Exception as e:
+            self._next_compaction_time = now + REGISTRY_COMPACTION_INTERVAL
+            logger.error(traceback.format_exc())
+
+        try:
+            if self._nearby is not None and now > self._next_nearby_digest_time:
+                self._relay_nearby(now)
+        except Exception as e:
+            self._next_nearby_digest_time = now + DEFAULT_NEARBY_DIGEST_INTERVAL
+            logger.error(traceback.format_exc())
+
+        try:
+            if now > self._next_reply_to_checkpoint_time:
+                self._next_reply_to_checkpoint_time = now + REPLY_TO_CHECKPOINT_INTERVAL
+                self._reply_to.checkpoint()
+        except Exception as e:
+            logger.error(traceback.format_exc())
+
+        try:
+            profile = self._profiler.tick()
+            if profile is not None and self._profile_requester is not None:
+                self._send_mesh_message(
+                    self._profile_requester,
+                    f"Profile written to {os.path.basename(profile)}",
+                )
+                self._profile_requester = None
+        except Exception as e:
+            logger.error(traceback.format_exc())
 
-            # Yield
-            time.sleep(0.001)
+        self._slow_ticks.end()
 
     def _get_interface(
         self, device=None
-    ) -> meshtastic.stream_interface.StreamInterface:
+    ) -> "meshtastic.stream_interface.StreamInterface":
+        # Only needed with a real device (imports are slow)
+        import meshtastic.serial_interface
+        import meshtastic.util
+
         if device is None:
             ports = meshtastic.util.findPorts(True)
             if len(ports) == 1:
@@ -258,7 +599,7 @@ class Gateway(object):
                 return None
         if device is not None:
             dev = meshtastic.serial_interface.SerialInterface(device)
-            logger.info(f"Connected to: {device}")
+            logger.info("Connected to: %s", device)
             return dev
         else:
             return None
@@ -267,39 +608,69 @@ class Gateway(object):
         self._last_meshtastic_packet_time = time.time()
 
         fromId = packet.get("fromId", None)
+        if fromId is not None:
+            self._heard_index.heard(fromId, self._last_meshtastic_packet_time)
         toId = packet.get("toId", None)
         portnum = packet.get("decoded", {}).get("portnum")
+        self._mesh_packets_in.inc(portnum)
 
         # Don't bother logging my telemetry
         if portnum != "TELEMETRY_APP" or fromId != self._gateway_id:
-            logger.info(f"{fromId} -> {toId}: {portnum}")
+            logger.info("%s -> %s: %s", fromId, toId, portnum)
 
         # Record that we have spotted the ID
         should_announce = self._spotted(fromId)
 
         if portnum == "POSITION_APP":
-            if fromId not in self._registry:
+            registration = self._registry.get(fromId)
+            if registration is None:
                 return
 
             # Special icon disables position sharing
-            if self._registry[fromId]["icon"] == "$$":
-                logger.info(f"{fromId} has disabled position reporting")
+            if registration["icon"] == "$$":
+                logger.info("%s has disabled position reporting", fromId)
             else:
                 position = packet.get("decoded", {}).get("position")
+
+                # Speed is in m/s, and track is in 1e-5 degrees
+                speed = position.get("groundSpeed")
+                if speed is not None:
+                    speed = speed * 3.6
+                course = position.get("groundTrack")
+                if course is not None:
+                    course = course * 1e-5
+
+                # Don't flood APRS-IS with positions of nodes that aren't going anywhere
+                if (
+                    self._position_governor is not None
+                    and not self._position_governor.should_forward(
+                        fromId,
+                        position.get("latitude"),
+                        position.get("longitude"),
+                        course=course,
+                        speed=speed,
+                    )
+                ):
+                    logger.debug("Suppressed position update from %s", fromId)
+                    return
+
                 self._send_aprs_position(
-                    self._registry[fromId]["call_sign"],
+                    registration["call_sign"],
                     position.get("latitude"),
                     position.get("longitude"),
                     position.get("time"),
-                    self._registry[fromId]["icon"],
+                    registration["icon"],
                     "aprstastic: " + fromId,
+                    course=course,
+                    speed=speed,
+                    altitude=position.get("altitude"),
                 )
 
         if portnum == "TEXT_MESSAGE_APP":
             message_bytes = packet["decoded"]["payload"]
-            message_string = message_bytes.decode("utf-8")
+            message = CommandMessage(message_bytes.decode("utf-8"))
 
-            if toId == "^all" and message_string.lower().strip().startswith("aprs?"):
+            if toId == "^all" and message.lowered.startswith("aprs?"):
                 self._send_mesh_message(
                     fromId,
                     "APRS-tastic Gateway available here. Welcome. Reply '?' for more info.",
@@ -310,145 +681,178 @@ class Gateway(object):
                 # Not for me
                 return
 
-            if message_string.strip() == "?":
-                # Different call signs for registered and non-registered devices
-                if fromId not in self._registry:
-                    self._send_mesh_message(
-                        fromId,
-                        "Send and receive APRS messages by registering your call sign. HAM license required.\n\nReply with:\n!register [CALLSIGN]-[SSID]\nE.g.,\n!register N0CALL-1\n\nSee https://github.com/afourney/aprstastic for more.",
-                    )
-                    return
-                else:
-                    self._send_mesh_message(
-                        fromId,
-                        "Send APRS messages by replying here, and prefixing your message with the dest callsign. E.g., 'WLNK-1: hello'\n\nSee https://github.com/afourney/aprstastic for more.",
-                    )
-                    return
+            self._commands.dispatch(fromId, message)
+            return
 
-            if message_string.strip() == "!id" or message_string.strip() == "!version":
-                # Let clients query the gateway call sign and version number
-                self._send_mesh_message(
-                    fromId,
-                    f"Gateway call sign: {self._gateway_call_sign}, Uptime: {self._uptime()}, Version: {__version__}",
-                )
-                return
-
-            if message_string.lower().strip().startswith("!register"):
-                # Allow operatores to join
-                m = re.search(
-                    r"^!register:?\s+([a-z0-9]{4,7}\-[0-9]{1,2})(\s+(\$\$|[a-zA-Z0-9]{2,3}))?$",
-                    message_string.lower().strip(),
-                )
-                if m:
-                    # Extract the call sign
-                    call_sign = m.group(1)
-                    if call_sign is None:
-                        call_sign = ""
-                    else:
-                        call_sign = call_sign.upper()
-
-                    # Extract and validate the icon
-                    icon = m.group(3)
-                    if icon is None:
-                        pass
-                    elif icon == "":
-                        icon = None
-                    elif icon == "$$":
-                        pass
-                    else:
-                        icon = icon.upper()
-                        symbol = get_symbol_code(icon)
-                        if symbol is None:
-                            self._send_mesh_message(
-                                fromId,
-                                "Invalid icon. See: https://github.com/afourney/aprstastic/blob/main/APRS_SYMBOLS.md",
-                            )
-                            return
-
-                    # Update the database
-                    if fromId in self._registry:
-                        # Update
-                        self._registry.add_registration(fromId, call_sign, icon, True)
-                        self._send_mesh_message(fromId, "Registration updated.")
-                    else:
-                        # New
-                        self._registry.add_registration(fromId, call_sign, icon, True)
-                        self._spotted(fromId)
-                        self._send_mesh_message(
-                            fromId,
-                            "Registered. Send APRS messages by replying here, and prefixing your message with the dest callsign. E.g., 'WLNK-1: hello' ",
-                        )
-                    self._spotted(fromId)  # Run this again to update subscriptions
-
-                    # Beacon the registration to APRS-IS to facilitate building a shared roaming mapping
-                    if self._beacon_registrations:
-                        self._send_registration_beacon(fromId, call_sign, icon)
-                else:
-                    self._send_mesh_message(
-                        fromId,
-                        "Invalid call sign + ssid.\nSYNTAX: !register [CALLSIGN]-[SSID]\nE.g.,\n!register N0CALL-1",
-                    )
-                return
+        # At this point the message was not handled yet. Announce yourself
+        if should_announce:
+            self._send_mesh_message(
+                fromId,
+                "APRS-tastic Gateway available here. Welcome. Reply '?' for more info.",
+            )
 
-            if message_string.lower().strip().startswith("!unregister"):
-                if fromId not in self._registry:
-                    self._send_mesh_message(
-                        fromId, "Device is not registered. Nothing to do."
-                    )
-                    return
-                call_sign = self._registry[fromId]["call_sign"]
-                self._registry.add_registration(fromId, None, None, True)
-                self._registry.add_registration(None, call_sign, None, True)
+    def _register_commands(self):
+        """
+        Register the built-in mesh commands. Messages that are not commands are
+        forwarded to APRS by _handle_aprs_message.
+        """
+        self._commands.register("?", self._handle_help, exact=True)
+        self._commands.register("!id", self._handle_id, exact=True)
+        self._commands.register("!version", self._handle_id, exact=True)
+        self._commands.register("!register", self._handle_register)
+        self._commands.register("!unregister", self._handle_unregister)
+        self._commands.register("!profile", self._handle_profile)
+        self._commands.set_fallback(self._handle_aprs_message)
+
+    def _handle_help(self, fromId, message):
+        # Different call signs for registered and non-registered devices
+        if fromId not in self._registry:
+            self._send_mesh_message(
+                fromId,
+                "Send and receive APRS messages by registering your call sign. HAM license required.\n\nReply with:\n!register [CALLSIGN]-[SSID]\nE.g.,\n!register N0CALL-1\n\nSee https://github.com/afourney/aprstastic for more.",
+            )
+        else:
+            self._send_mesh_message(
+                fromId,
+                "Send APRS messages by replying here, and prefixing your message with the dest callsign. E.g., 'WLNK-1: hello'\n\nSee https://github.com/afourney/aprstastic for more.",
+            )
 
-                if self._beacon_registrations:
-                    self._send_registration_beacon(fromId, APRS_TOMBSTONE, None)
-                    self._send_registration_beacon(MESH_TOMBSTONE, call_sign, None)
+    def _handle_id(self, fromId, message):
+        # Let clients query the gateway call sign and version number
+        self._send_mesh_message(
+            fromId,
+            f"Gateway call sign: {self._gateway_call_sign}, Uptime: {self._uptime()}, Version: {__version__}",
+        )
 
-                if call_sign in self._filtered_call_signs:
-                    self._filtered_call_signs.remove(call_sign)
+    def _handle_register(self, fromId, message):
+        # Allow operatores to join
+        m = REGISTER_RE.search(message.lowered)
+        if not m:
+            self._send_mesh_message(
+                fromId,
+                "Invalid call sign + ssid.\nSYNTAX: !register [CALLSIGN]-[SSID]\nE.g.,\n!register N0CALL-1",
+            )
+            return
 
-                self._aprs_client.set_filter("g/" + "/".join(self._filtered_call_signs))
-                self._send_mesh_message(fromId, "Device unregistered.")
-                return
+        # Extract the call sign
+        call_sign = m.group(1)
+        if call_sign is None:
+            call_sign = ""
+        else:
+            call_sign = call_sign.upper()
 
-            if fromId not in self._registry:
+        # Extract and validate the icon
+        icon = m.group(3)
+        if icon is None:
+            pass
+        elif icon == "":
+            icon = None
+        elif icon == "$$":
+            pass
+        else:
+            icon = icon.upper()
+            symbol = get_symbol_code(icon)
+            if symbol is None:
                 self._send_mesh_message(
                     fromId,
-                    "Unknown device. HAM license required!\nRegister by replying with:\n!register [CALLSIGN]-[SSID]\nE.g.,\n!register N0CALL-1",
+                    "Invalid icon. See: https://github.com/afourney/aprstastic/blob/main/APRS_SYMBOLS.md",
                 )
                 return
 
-            m = re.search(r"^([A-Za-z0-9]+(\-[A-Za-z0-9]+)?):(.*)$", message_string)
-            if m:
-                tocall = m.group(1)
-                self._reply_to[fromId] = tocall
-                message = m.group(3).strip()
-                self._send_aprs_message(
-                    self._registry[fromId]["call_sign"], tocall, message
-                )
-                return
-            elif fromId in self._reply_to:
-                self._send_aprs_message(
-                    self._registry[fromId]["call_sign"],
-                    self._reply_to[fromId],
-                    message_string,
-                )
-                return
-            else:
-                self._send_mesh_message(
-                    fromId,
-                    "Please prefix your message with the dest callsign. E.g., 'WLNK-1: hello'",
-                )
-                return
+        # Update the database
+        if fromId in self._registry:
+            # Update
+            self._registry.add_registration(fromId, call_sign, icon, True)
+            self._send_mesh_message(fromId, "Registration updated.")
+        else:
+            # New
+            self._registry.add_registration(fromId, call_sign, icon, True)
+            self._spotted(fromId)
+            self._send_mesh_message(
+                fromId,
+                "Registered. Send APRS messages by replying here, and prefixing your message with the dest callsign. E.g., 'WLNK-1: hello' ",
+            )
+        self._spotted(fromId)  # Run this again to update subscriptions
 
-        # At this point the message was not handled yet. Announce yourself
-        if should_announce:
+        # Beacon the registration to APRS-IS to facilitate building a shared roaming mapping
+        if self._beacon_registrations:
+            self._send_registration_beacon(fromId, call_sign, icon)
+
+    def _handle_unregister(self, fromId, message):
+        if fromId not in self._registry:
+            self._send_mesh_message(fromId, "Device is not registered. Nothing to do.")
+            return
+        call_sign = self._registry[fromId]["call_sign"]
+        self._registry.add_registration(fromId, None, None, True)
+        self._registry.add_registration(None, call_sign, None, True)
+
+        if self._beacon_registrations:
+            self._send_registration_beacon(fromId, APRS_TOMBSTONE, None)
+            self._send_registration_beacon(MESH_TOMBSTONE, call_sign, None)
+
+        # (The APRS filters are updated by _on_registry_event)
+        self._send_mesh_message(fromId, "Device unregistered.")
+
+    def _handle_profile(self, fromId, message):
+        # Only administrators can profile. For everyone else, this is just a message.
+        if fromId.lower() not in self._profiler_admins:
+            self._handle_aprs_message(fromId, message)
+            return
+
+        # !profile [start [SECONDS] | stop]
+        args = message.lowered.split()[1:]
+        if len(args) == 0:
+            state = "running" if self._profiler.running else "stopped"
+            self._send_mesh_message(
+                fromId, f"Profiler ({self._profiler.mode}) is {state}."
+            )
+        elif args[0] == "start":
+            duration = DEFAULT_PROFILE_DURATION
+            if len(args) > 1 and args[1].isdigit():
+                duration = int(args[1])
+            self._profile_requester = fromId
+            self._profiler.start(duration)
+            self._send_mesh_message(fromId, f"Profiling for up to {duration}s.")
+        elif args[0] == "stop":
+            self._profile_requester = fromId
+            self._profiler.stop()
+        else:
+            self._send_mesh_message(fromId, "SYNTAX: !profile [start [SECONDS]|stop]")
+
+    def _handle_aprs_message(self, fromId, message):
+        if fromId not in self._registry:
             self._send_mesh_message(
                 fromId,
-                "APRS-tastic Gateway available here. Welcome. Reply '?' for more info.",
+                "Unknown device. HAM license required!\nRegister by replying with:\n!register [CALLSIGN]-[SSID]\nE.g.,\n!register N0CALL-1",
+            )
+            return
+
+        m = DEST_PREFIX_RE.search(message.text)
+        if m:
+            tocall = m.group(1)
+            self._reply_to.set(fromId, tocall)
+            self._send_aprs_message(
+                self._registry[fromId]["call_sign"], tocall, m.group(3).strip()
+            )
+            return
+
+        reply_to = self._reply_to.get(fromId)
+        if reply_to is not None:
+            self._send_aprs_message(
+                self._registry[fromId]["call_sign"],
+                reply_to,
+                message.text,
+            )
+        else:
+            self._send_mesh_message(
+                fromId,
+                "Please prefix your message with the dest callsign. E.g., 'WLNK-1: hello'",
             )
 
     def _process_aprs_packet(self, packet):
+        if self._nearby is not None and packet.get("latitude") is not None:
+            self._record_nearby(packet)
+
         if packet.get("format") == "message":
             fromcall = packet.get("from", "N0CALL").strip().upper()
             tocall = packet.get("addresse", "").strip().upper()
@@ -456,14 +860,14 @@ class Gateway(object):
             # Is this an ack?
             if packet.get("response") == "ack":
                 logger.debug(
-                    f"Received ACK to {tocall}'s message #" + packet.get("msgNo", "")
+                    "Received ACK to %s's message #%s", tocall, packet.get("msgNo", "")
                 )
                 return
 
             # Is this a registration beacon?
             if tocall == REGISTRATION_BEACON:
                 mesh_id = packet.get("message_text", "").lower().strip()
-                m = re.search(r"^(![a-f0-9]{8})(:(\$\$|[A-Za-z0-9]{2,3}))?$", mesh_id)
+                m = BEACON_RE.search(mesh_id)
                 if m:
                     mesh_id = m.group(1)
                     icon = m.group(3)
@@ -486,21 +890,20 @@ class Gateway(object):
                         fromcall = None
 
                     logger.info(
-                        f"Observed registration beacon: {mesh_id}: {fromcall}, icon: {icon}",
+                        "Observed registration beacon: %s: %s, icon: %s",
+                        mesh_id,
+                        fromcall,
+                        icon,
                     )
                     self._registry.add_registration(mesh_id, fromcall, icon, False)
                 else:
                     # Not necessarily and error. Could be from a future version
-                    logger.debug(
-                        f"Unknown registration beacon: {packet.get('raw')}",
-                    )
+                    logger.debug("Unknown registration beacon: %s", packet.get("raw"))
                 return
 
-            # Ack all remaining messages (which aren't themselves acks, and aren't beacons)
-            self._send_aprs_ack(tocall, fromcall, packet.get("msgNo", ""))
-
             # Message was sent to the gateway itself. Respond with station information.
             if tocall == self._gateway_call_sign:
+                self._send_aprs_ack(tocall, fromcall, packet.get("msgNo", ""))
                 self._send_aprs_message(
                     tocall,
                     fromcall,
@@ -508,81 +911,54 @@ class Gateway(object):
                 )
                 return
 
-            # Figure out where the packet is going
-            toId = None
-            for k in self._registry:
-                if tocall == self._registry[k]["call_sign"].strip().upper():
-                    toId = k
-                    break
+            # Figure out where the packet is going. Only ack messages for our own
+            # devices: the range filter (nearby relay) also delivers messages between
+            # other stations, and acking those would spoof the real recipient.
+            toId = self._registry.get_device_id(tocall)
+            if self._current_trace is not None:
+                self._current_trace.stamp("registry_lookup")
             if toId is None:
-                logger.error(f"Unkown recipient: {tocall}")
+                if self._nearby_center is not None:
+                    logger.debug("Ignoring message to nearby station: %s", tocall)
+                else:
+                    logger.error("Unkown recipient: %s", tocall)
                 return
 
-            # Forward the message
+            # Ack the message (it isn't itself an ack, or a beacon), and forward it
+            self._send_aprs_ack(tocall, fromcall, packet.get("msgNo", ""))
             message = packet.get("message_text")
             if message is not None:
-                self._reply_to[toId] = fromcall
+                self._reply_to.set(toId, fromcall)
                 self._send_mesh_message(toId, fromcall + ": " + message)
 
     def _send_aprs_message(self, fromcall, tocall, message):
-        message_chunks = self._chunk_message(message, self._max_aprs_message_length)
-
-        while len(tocall) < 9:
-            tocall += " "
-
-        for chunk in message_chunks:
-            packet = (
-                fromcall
-                + ">"
-                + APRS_SOFTWARE_ID
-                + ",WIDE1-1,qAR,"
-                + self._gateway_call_sign
-                + "::"
-                + tocall
-                + ":"
-                + chunk.strip()
-                + "{"
-                + str(random.randint(0, 999))
+        for chunk in segment(message, self._max_aprs_message_length):
+            packet = self._aprs_encoder.message(
+                fromcall, tocall, chunk, random.randint(0, 999)
             )
-            logger.debug("Sending to APRS: " + packet)
-            self._aprs_client.send(packet)
+            logger.debug("Sending to APRS: %s", packet)
+            self._aprs_client.send(packet, self._current_trace)
+            self._aprs_packets_out.inc("message")
 
     def _send_aprs_ack(self, fromcall, tocall, messageId):
-        while len(tocall) < 9:
-            tocall += " "
-        packet = (
-            fromcall
-            + ">"
-            + APRS_SOFTWARE_ID
-            + ",WIDE1-1,qAR,"
-            + self._gateway_call_sign
-            + "::"
-            + tocall
-            + ":ack"
-            + messageId
-        )
-        logger.debug("Sending to APRS: " + packet)
-        self._aprs_client.send(packet)
-
-    def _aprs_lat(self, lat):
-        aprs_lat_ns = "N" if lat >= 0 else "S"
-        lat = abs(lat)
-        aprs_lat_deg = int(lat)
-        aprs_lat_min = float((lat - aprs_lat_deg) * 60)
-        return f"%02d%05.2f%s" % (aprs_lat_deg, aprs_lat_min, aprs_lat_ns)
-
-    def _aprs_lon(self, lon):
-        aprs_lon_ew = "E" if lon >= 0 else "W"
-        lon = abs(lon)
-        aprs_lon_deg = abs(int(lon))
-        aprs_lon_min = float((lon - aprs_lon_deg) * 60)
-        return f"%03d%05.2f%s" % (aprs_lon_deg, aprs_lon_min, aprs_lon_ew)
-
-    def _send_aprs_position(self, fromcall, lat, lon, t, icon, message):
-        message = self._truncate_message(message, MAX_APRS_POSITION_MESSAGE_LENGTH)
-
-        aprs_lat = self._aprs_lat(lat)
-        aprs_lon = self._aprs_lon(lon)
+        packet = self._aprs_encoder.ack(fromcall, tocall, messageId)
+        logger.debug("Sending to APRS: %s", packet)
+        self._aprs_client.send(packet, self._current_trace)
+        self._aprs_packets_out.inc("ack")
+
+    def _send_aprs_position(
+        self,
+        fromcall,
+        lat,
+        lon,
+        t,
+        icon,
+        message,
+        course=None,
+        speed=None,
+        altitude=None,
+    ):
+        message = truncate(message, MAX_APRS_POSITION_MESSAGE_LENGTH)
 
         # Get the icon
         if icon is None:
@@ -593,53 +969,60 @@ class Gateway(object):
         if symbol is None:
             symbol = DEFAULT_NODE_SYMBOL
 
-        aprs_msg = None
-        if t is None:
-            # No timestamp
-            aprs_msg = "=" + aprs_lat + symbol[0] + aprs_lon + symbol[1] + message
-        else:
-            aprs_ts = datetime.utcfromtimestamp(t).strftime("%d%H%M")
-            if len(aprs_ts) == 5:
-                aprs_ts = "0" + aprs_ts + "z"
-            else:
-                aprs_ts = aprs_ts + "z"
-            aprs_msg = (
-                "@" + aprs_ts + aprs_lat + symbol[0] + aprs_lon + symbol[1] + message
-            )
-
-        packet = (
-            fromcall
-            + ">"
-            + APRS_SOFTWARE_ID
-            + ",WIDE1-1,qAR,"
-            + self._gateway_call_sign
-            + ":"
-            + aprs_msg
+        packet = self._aprs_encoder.position(
+            fromcall,
+            lat,
+            lon,
+            symbol,
+            message,
+            t,
+            course=course,
+            speed=speed,
+            altitude=altitude,
         )
-        logger.debug(f"Sending to APRS: {packet}")
-        self._aprs_client.send(packet)
+        logger.debug("Sending to APRS: %s", packet)
+        self._aprs_client.send(packet, self._current_trace)
+        self._aprs_packets_out.inc("position")
 
     def _send_aprs_gateway_beacon(self, lat, lon, icon, message):
-        aprs_lat = self._aprs_lat(lat)
-        aprs_lon = self._aprs_lon(lon)
-
         # Convert the icon to a symbol
         symbol = get_symbol_code(icon)
         if symbol is None:
             symbol = DEFAULT_GATEWAY_SYMBOL
 
-        aprs_msg = "!" + aprs_lat + symbol[0] + aprs_lon + symbol[1] + message
-        packet = (
-            self._gateway_call_sign + ">" + APRS_SOFTWARE_ID + ",TCPIP*:" + aprs_msg
-        )
-        logger.debug(f"Beaconing to APRS: {packet}")
-        self._aprs_client.send(packet)
+        packet = self._aprs_encoder.gateway_beacon(lat, lon, symbol, message)
+        logger.debug("Beaconing to APRS: %s", packet)
+        self._aprs_client.send(packet, self._current_trace)
+        self._aprs_packets_out.inc("beacon")
+
+    def _send_mesh_channel_message(self, channel_index, message):
+        logger.info("Sending to channel %s: %s", channel_index, message)
+        for part in segment(message, MAX_MESH_MESSAGE_LENGTH):
+            self._interface.sendText(text=part, channelIndex=channel_index)
+            if self._recorder is not None:
+                self._recorder.record(MESH_TX, {"channel": channel_index, "text": part})
+            self._mesh_packets_out.inc("TEXT_MESSAGE_APP")
+            if self._current_trace is not None:
+                self._current_trace.stamp("send_text")
 
     def _send_mesh_message(self, destid, message):
-        logger.info(f"Sending to '{destid}': {message}")
-        self._interface.sendText(
-            text=message, destinationId=destid, wantAck=True, wantResponse=False
-        )
+        logger.info("Sending to '%s': %s", destid, message)
+
+        # Split messages that are too long for one Meshtastic packet
+        if len(message.encode("utf-8")) <= MAX_MESH_MESSAGE_LENGTH:
+            parts = [message]
+        else:
+            parts = segment(message, MAX_MESH_MESSAGE_LENGTH, markers=True)
+
+        for part in parts:
+            self._interface.sendText(
+                text=part, destinationId=destid, wantAck=True, wantResponse=False
+            )
+            if self._recorder is not None:
+                self._recorder.record(MESH_TX, {"to": destid, "text": part})
+            self._mesh_packets_out.inc("TEXT_MESSAGE_APP")
+            if self._current_trace is not None:
+                self._current_trace.stamp("send_text")
 
     def _spotted(self, node_id):
         """
@@ -649,18 +1032,255 @@ class Gateway(object):
         """
 
         # We spotted them, but they aren't registered
-        if node_id not in self._registry:
+        registration = self._registry.get(node_id)
+        if registration is None:
             return False
 
-        call_sign = self._registry[node_id]["call_sign"]
+        # If it's new, update the filters (sent, debounced, from the main loop)
+        return self._filter_manager.add(registration["call_sign"])
 
-        if call_sign in self._filtered_call_signs:
-            return False
+    def _gateway_position(self):
+        """
+        Return the gateway's (latitude, longitude) from the config, or, if not set
+        there, from the radio. Either may be None if the position is unknown.
+        """
+        gateway_beacon = self._config.get("gateway_beacon", {})
+        gate_lat = gateway_beacon.get("latitude")
+        gate_lon = gateway_beacon.get("longitude")
+        if gate_lat is None or gate_lon is None:
+            gate_position = self._interface.getMyNodeInfo().get("position", {})
+            gate_lat = gate_position.get("latitude")
+            gate_lon = gate_position.get("longitude")
+        return gate_lat, gate_lon
+
+    def _record_nearby(self, packet):
+        """
+        Add a position, object, or weather report to the index of nearby stations.
+        """
+        name = packet.get("object_name")
+        if name is not None:
+            name = name.strip()
+            if packet.get("alive") is False:
+                self._nearby.remove(name)
+                return
+            kind = OBJECT
+        else:
+            name = packet.get("from")
+            kind = WEATHER if "weather" in packet else STATION
+        if name:
+            self._nearby.update(name, packet["latitude"], packet["longitude"], kind)
+
+    def _relay_nearby(self, now):
+        """
+        Subscribe to APRS traffic around the gateway (once its position is known),
+        and periodically relay a digest of the nearest stations to a mesh channel.
+        """
+        range_km = self._nearby_relay.get("range_km", DEFAULT_NEARBY_RANGE)
+        interval = self._nearby_relay.get(
+            "interval_minutes", DEFAULT_NEARBY_DIGEST_INTERVAL / 60
+        )
+
+        if self._nearby_center is None:
+            lat = self._nearby_relay.get("latitude")
+            lon = self._nearby_relay.get("longitude")
+            if lat is None or lon is None:
+                lat, lon = self._gateway_position()
+            if lat is None or lon is None:
+                # Check again in a minute
+                self._next_nearby_digest_time = now + 60
+                return
+            self._nearby_center = (lat, lon)
+            self._filter_manager.set_extra_terms(
+                [f"r/{lat:.4f}/{lon:.4f}/{range_km:g}"]
+            )
+
+            # Give the stations time to be heard before the first digest
+            self._next_nearby_digest_time = now + interval * 60
+            return
+
+        self._next_nearby_digest_time = now + interval * 60
+        self._nearby.expire(now)
+        results = self._nearby.query(
+            self._nearby_center[0],
+            self._nearby_center[1],
+            range_km * 1000,
+            limit=self._nearby_relay.get("max_stations", DEFAULT_NEARBY_DIGEST_SIZE),
+            now=now,
+        )
+
+        # Don't repeat the same digest
+        digest = format_digest(results, range_km * 1000)
+        if digest is None or digest == self._last_nearby_digest:
+            return
+        self._last_nearby_digest = digest
+        self._send_mesh_channel_message(
+            self._nearby_relay.get("channel_index", 0), digest
+        )
+
+    def _sweep_filter(self, now):
+        """
+        Removes devices from the heard index if they have not been heard within the
+        filter TTL, and stops listening for their call signs on APRS-IS.
+        """
+        pruned = list()
+        for device_id in self._heard_index.expire(now - self._filter_ttl):
+            if self._position_governor is not None:
+                self._position_governor.forget(device_id)
+            registration = self._registry.get(device_id)
+            if registration is None:
+                continue
+            if self._filter_manager.discard(registration["call_sign"]):
+                pruned.append(registration["call_sign"])
+
+        if len(pruned) > 0:
+            logger.info(
+                "No longer listening for call signs not heard recently: %s", pruned
+            )
 
-        # Ok it's new, update the filters
-        self._filtered_call_signs.append(call_sign)
-        self._aprs_client.set_filter("g/" + "/".join(self._filtered_call_signs))
-        return True
+    def _on_registry_event(self, event):
+        """
+        Keeps the APRS filters in sync with the registry, no matter where the change
+        came from (local registrations, beacons, etc.) If a call sign we are
+        listening for is removed or reassigned, stop listening for it (and start
+        listening for its replacement, if the device is still registered). If a
+        device heard recently registers, start listening for its call sign.
+        """
+        if self._filter_manager is None:
+            return
+
+        # (Filter updates are sent, debounced, from the main loop)
+        if event.old is None:
+            if event.device_id in self._heard_index:
+                self._filter_manager.add(event.new["call_sign"])
+            return
+
+        old_call_sign = event.old["call_sign"]
+        if event.new is not None and event.new["call_sign"] == old_call_sign:
+            return
+
+        if self._filter_manager.discard(old_call_sign) and event.new is not None:
+            self._filter_manager.add(event.new["call_sign"])
+
+    def _register_metrics(self):
+        m = self._metrics
+        self._mesh_packets_in = m.counter(
+            "mesh_packets_received", "Meshtastic packets received", label="portnum"
+        )
+        self._mesh_packets_out = m.counter(
+            "mesh_packets_sent", "Meshtastic packets sent", label="portnum"
+        )
+        self._aprs_packets_in = m.counter(
+            "aprs_packets_received", "APRS-IS packets received", label="format"
+        )
+        self._aprs_packets_out = m.counter(
+            "aprs_packets_sent", "APRS-IS packets sent", label="type"
+        )
+        self._mesh_processing_time = m.histogram(
+            "mesh_packet_processing_seconds", "Time to process a Meshtastic packet"
+        )
+        self._aprs_processing_time = m.histogram(
+            "aprs_packet_processing_seconds", "Time to process an APRS-IS packet"
+        )
+
+        m.gauge(
+            "uptime_seconds",
+            "Seconds since the gateway started",
+            lambda: 0 if self._start_time is None else time.time() - self._start_time,
+        )
+        m.gauge(
+            "mesh_rx_queue_depth",
+            "Meshtastic packets waiting to be processed",
+            self._mesh_rx_queue.qsize,
+        )
+        m.gauge(
+            "aprs_rx_queue_depth",
+            "APRS-IS packets waiting to be processed",
+            lambda: 0 if self._aprs_client is None else self._aprs_client.rx_queue_size,
+        )
+        m.gauge(
+            "aprs_tx_queue_depth",
+            "APRS-IS packets waiting to be sent",
+            lambda: 0 if self._aprs_client is None else self._aprs_client.tx_queue_size,
+        )
+        m.gauge(
+            "registry_size",
+            "Registered devices",
+            lambda: 0 if self._registry is None else len(self._registry),
+        )
+        m.gauge(
+            "filter_call_signs",
+            "Call signs in the APRS-IS filter",
+            lambda: 0 if self._filter_manager is None else len(self._filter_manager),
+        )
+        m.gauge(
+            "filter_length",
+            "Length of the APRS-IS filter",
+            lambda: (
+                0
+                if self._filter_manager is None
+                or self._filter_manager.current_filter is None
+                else len(self._filter_manager.current_filter)
+            ),
+        )
+        m.gauge(
+            "reply_to_size",
+            "Entries in the reply-to table",
+            lambda: len(self._reply_to),
+        )
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def backlog(self):
+        """
+        Return the number of packets waiting to be processed, or sent.
+        """
+        backlog = self._mesh_rx_queue.qsize()
+        if self._aprs_client is not None:
+            backlog += self._aprs_client.rx_queue_size + self._aprs_client.tx_queue_size
+        return backlog
+
+    def stats(self):
+        """
+        Return statistics from each of the gateway's components.
+        """
+        stats = {
+            "uptime": None
+            if self._start_time is None
+            else time.time() - self._start_time,
+            "startup": dict(self._startup_timings),
+            "reply_to": self._reply_to.stats(),
+            "latency": self._tracer.percentiles(),
+            "slow_ticks": self._slow_ticks.stats(),
+        }
+        if self._aprs_client is not None:
+            stats["aprs_client"] = self._aprs_client.stats()
+        if self._filter_manager is not None:
+            stats["filter"] = self._filter_manager.stats()
+        if self._position_governor is not None:
+            stats["position_governor"] = self._position_governor.stats()
+        if self._nearby is not None:
+            stats["nearby"] = self._nearby.stats()
+        if self._recorder is not None:
+            stats["recorder"] = self._recorder.stats()
+        return stats
+
+    def close(self):
+        """
+        Disconnect, save state, and flush anything buffered, before exiting.
+        """
+        if pubsub.pub.isSubscribed(self._on_recv, MQTT_TOPIC):
+            pubsub.pub.unsubscribe(self._on_recv, MQTT_TOPIC)
+        if self._aprs_client is not None:
+            self._aprs_client.close()
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+            self._metrics_server = None
+        self._slow_ticks.stop()
+        self._reply_to.checkpoint()
+        if self._recorder is not None:
+            self._recorder.close()
 
     def _uptime(self):
         if self._start_time is None:
@@ -681,52 +1301,13 @@ class Gateway(object):
 
         return ", ".join(parts)
 
-    def _truncate_message(self, message, max_bytes):
-        m_len = len(message.encode("utf-8"))
-
-        # Nothing to do
-        if m_len <= max_bytes:
-            return message
-
-        # Warn about the message being too long
-        warnings.warn(
-            f"Message of length {m_len} bytes exceeds the protocol maximum of {max_bytes} bytes."
-        )
-
-        # Trim first by characters to get close, then remove one character at a time
-        strlen = max_bytes
-        message = message[0:strlen]
-        while len(message.encode("utf-8")) > max_bytes:
-            # Chop a character
-            strlen -= 1
-            message = message[0:strlen]
-        return message
-
-    def _chunk_message(self, message, max_bytes):
-        chunks = list()
-
-        # We want to break on spaces
-        tokens = re.split(r"(\s+)", message)
-        if len(tokens) == 0:
-            return chunks
-
-        buffer = tokens.pop(0)  # Always include at least one token
-        while len(tokens) > 0:
-            token = tokens.pop(0)
-            if len((buffer + token).encode("utf-8")) > max_bytes:
-                chunks.append(buffer)
-                buffer = token
-            else:
-                buffer += token
-        if len(buffer) > 0:
-            chunks.append(buffer)
-            buffer = ""
-
-        return chunks
-
     def _send_registration_beacon(self, device_id, call_sign, icon):
         logger.info(
-            f"Beaconing registration {call_sign} <-> {device_id} (icon: {icon}), to {REGISTRATION_BEACON}"
+            "Beaconing registration %s <-> %s (icon: %s), to %s",
+            call_sign,
+            device_id,
+            icon,
+            REGISTRATION_BEACON,
         )
         if icon is None:
             self._send_aprs_message(call_sign, REGISTRATION_BEACON, device_id)
@@ -0,0 +1,42 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import math
+
+EARTH_RADIUS = 6371008.8  # Mean radius, in meters
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """
+    Return the great circle distance, in meters, between two points (in degrees).
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def heading_change(course1, course2):
+    """
+    Return the absolute change in heading, in degrees (0-180).
+    """
+    return abs((course2 - course1 + 180) % 360 - 180)
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """
+    Return the initial bearing, in degrees (0-360), from the first point to the second.
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dlambda = math.radians(lon2 - lon1)
+    y = math.sin(dlambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(
+        dlambda
+    )
+    return math.degrees(math.atan2(y, x)) % 360
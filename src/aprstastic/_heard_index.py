@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import threading
+
+from collections import OrderedDict
+
+
+class HeardIndex(object):
+    """
+    Tracks when each Meshtastic device was last heard.
+
+    Entries are kept in order of recency, so expiring old entries only touches
+    the entries being expired, no matter how many devices are being tracked.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._last_heard = OrderedDict()
+
+    def heard(self, device_id, when=None):
+        """
+        Record that a device was heard at the given time (default: now).
+        """
+        if when is None:
+            when = time.time()
+
+        with self._lock:
+            prior = self._last_heard.get(device_id)
+            if prior is not None and prior >= when:
+                return
+            self._last_heard[device_id] = when
+            self._last_heard.move_to_end(device_id)
+
+            # Out-of-order times are rare (e.g., seeding from the node database), but
+            # would break the ordering. Bubble the entry back into place.
+            # (In the usual case this loop exits on its first check.)
+            keys = reversed(self._last_heard)
+            next(keys)  # Skip the entry just added
+            displaced = list()
+            for k in keys:
+                if self._last_heard[k] <= when:
+                    break
+                displaced.append(k)
+            for k in reversed(displaced):
+                self._last_heard.move_to_end(k)
+
+    def last_heard(self, device_id):
+        """
+        Return when the device was last heard, or None.
+        """
+        return self._last_heard.get(device_id)
+
+    def expire(self, older_than):
+        """
+        Remove, and return a list of, devices that were last heard before the given time.
+        """
+        expired = list()
+        with self._lock:
+            while len(self._last_heard) > 0:
+                device_id, when = next(iter(self._last_heard.items()))
+                if when >= older_than:
+                    break
+                self._last_heard.popitem(last=False)
+                expired.append(device_id)
+        return expired
+
+    def __contains__(self, device_id):
+        return device_id in self._last_heard
+
+    def __len__(self):
+        return len(self._last_heard)
@@ -0,0 +1,156 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import copy
+import json
+import queue
+import logging
+import datetime
+
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+LOG_FORMAT = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
+LOG_FILE = "aprstastic.log"
+
+# Log formats
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"
+LOG_FORMATS = [LOG_FORMAT_TEXT, LOG_FORMAT_JSON]
+
+DEFAULT_LOG_LEVEL = "DEBUG"
+
+# Arguments of these types can't change after they are logged, so formatting
+# them can safely be left to the listener thread
+_IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class LocalDebugFilter(logging.Filter):
+    """
+    Only show debug messages if they are from arpstastic
+    """
+
+    def filter(self, record):
+        if record.name == "aprstastic":
+            return True
+        else:
+            return record.levelno > logging.DEBUG
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as one line of JSON, for log aggregators.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    A QueueHandler that leaves formatting to the listener thread.
+
+    The standard QueueHandler formats each message on the thread that logs it,
+    so that records can be pickled. Our queue never leaves the process, so
+    records are queued as they are, unless their arguments are mutable (e.g.,
+    a packet dictionary), in which case they are formatted now, before they
+    can change.
+    """
+
+    def prepare(self, record):
+        # Tracebacks refer to live frames, so are rendered now
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+
+        args = record.args
+        if not args or (
+            isinstance(args, tuple)
+            and all(isinstance(a, _IMMUTABLE_TYPES) for a in args)
+        ):
+            return record
+
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _QueueListener(QueueListener):
+    """
+    A QueueListener that can safely be stopped more than once.
+    """
+
+    _running = False
+
+    def start(self):
+        super().start()
+        self._running = True
+
+    def stop(self):
+        if self._running:
+            self._running = False
+            super().stop()
+
+
+def setup_logging(level=DEFAULT_LOG_LEVEL, log_format=LOG_FORMAT_TEXT, logs_dir=None):
+    """
+    Route all logging through a queue, to a QueueListener thread that writes to
+    stderr, and (if logs_dir is given) to a daily rotating log file. Threads
+    that log only pay for a queue put. Any handlers installed by an earlier
+    call are replaced.
+
+    Returns the listener. Call its stop() method before exiting, to flush the queue.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(
+            f"Unknown log format '{log_format}'. Expected one of: {LOG_FORMATS}"
+        )
+    if log_format == LOG_FORMAT_JSON:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(LOG_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if logs_dir is not None:
+        handlers.append(
+            TimedRotatingFileHandler(
+                os.path.join(logs_dir, LOG_FILE), when="d", interval=1, backupCount=7
+            )
+        )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.root
+    for handler in list(root.handlers):
+        if isinstance(handler, DeferredQueueHandler):
+            root.removeHandler(handler)
+            handler.listener.stop()
+            for h in handler.listener.handlers:
+                h.close()
+
+    # Filter before queueing, so filtered records cost nothing more
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(LocalDebugFilter())
+    queue_handler.listener = _QueueListener(log_queue, *handlers)
+
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.addHandler(queue_handler)
+    queue_handler.listener.start()
+    return queue_handler.listener
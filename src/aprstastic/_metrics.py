@@ -0,0 +1,263 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import json
+import bisect
+import logging
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("aprstastic")
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9464
+
+# Processing times, in seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter(object):
+    """
+    A monotonically increasing count, optionally broken down by one label.
+
+    inc() is a single dictionary update, so it is cheap enough for the hot path.
+    Updates from multiple threads may (rarely) be lost, which is acceptable for
+    metrics, and avoids a lock.
+    """
+
+    def __init__(self, name, help, label=None):
+        super().__init__()
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = dict()
+
+    def inc(self, label_value=None, amount=1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value=None):
+        return self._values.get(label_value, 0)
+
+    def samples(self):
+        for label_value, value in list(self._values.items()):
+            yield _labels(self.label, label_value), value
+
+    def to_json(self):
+        if self.label is None:
+            return self._values.get(None, 0)
+        return {str(k): v for k, v in list(self._values.items())}
+
+
+class Gauge(object):
+    """
+    A value that can go up and down. Either set() it, or give it a function to
+    read the value from when the metrics are collected.
+    """
+
+    def __init__(self, name, help, function=None):
+        super().__init__()
+        self.name = name
+        self.help = help
+        self._function = function
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                logger.debug(f"Error reading gauge {self.name}", exc_info=True)
+                return float("nan")
+        return self._value
+
+    def samples(self):
+        yield "", self.value()
+
+    def to_json(self):
+        return self.value()
+
+
+class Histogram(object):
+    """
+    Counts observations (e.g., processing times) into cumulative buckets.
+    """
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.help = help
+        self._buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), self._counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield "_bucket" + _labels("le", le), cumulative
+        yield "_sum", self._sum
+        yield "_count", self._count
+
+    def to_json(self):
+        return {
+            "count": self._count,
+            "sum": self._sum,
+            "buckets": {
+                repr(b): c for b, c in zip(self._buckets, _cumsum(self._counts))
+            },
+        }
+
+
+class MetricsRegistry(object):
+    """
+    A collection of named metrics, rendered as Prometheus text or as JSON.
+    """
+
+    def __init__(self, prefix="aprstastic_"):
+        super().__init__()
+        self._prefix = prefix
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, label=None):
+        return self._add(Counter(self._prefix + name, help, label))
+
+    def gauge(self, name, help, function=None):
+        return self._add(Gauge(self._prefix + name, help, function))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self._prefix + name, help, buckets))
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(self._prefix + name)
+
+    def to_prometheus(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        lines = list()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            kind = type(metric).__name__.lower()
+
+            # The family name must match the samples' (counters end in _total)
+            name = metric.name + "_total" if kind == "counter" else metric.name
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, value in metric.samples():
+                lines.append(f"{name}{suffix} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """
+        Return a snapshot of all metrics, as a dictionary.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name[len(self._prefix) :]: m.to_json() for m in metrics}
+
+
+class MetricsServer(object):
+    """
+    Serves a MetricsRegistry over HTTP: /metrics (Prometheus) and /metrics.json.
+    Other JSON documents can be served by passing routes, a dictionary of paths
+    to functions returning JSON-serializable values.
+    """
+
+    def __init__(
+        self,
+        registry,
+        host=DEFAULT_METRICS_HOST,
+        port=DEFAULT_METRICS_PORT,
+        routes=None,
+    ):
+        super().__init__()
+        metrics = registry
+        routes = dict(routes or {})
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/metrics":
+                    body = metrics.to_prometheus().encode("utf-8")
+                    content_type = PROMETHEUS_CONTENT_TYPE
+                elif path == "/metrics.json":
+                    body = json.dumps(metrics.to_json(), indent=4).encode("utf-8")
+                    content_type = "application/json"
+                elif path in routes:
+                    body = json.dumps(routes[path](), indent=4).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("Metrics request: " + format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[0:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Serving metrics at http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _labels(label, value):
+    if label is None or value is None:
+        return ""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'{{{label}="{value}"}}'
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _cumsum(values):
+    total = 0
+    result = list()
+    for v in values:
+        total += v
+        result.append(total)
+    return result
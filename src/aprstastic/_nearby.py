@@ -0,0 +1,203 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import math
+import time
+import heapq
+import itertools
+import threading
+
+from collections import OrderedDict
+from ._geo import EARTH_RADIUS, distance, bearing
+
+DEFAULT_NEARBY_TTL = 3600  # Forget stations not heard in an hour
+DEFAULT_CELL_SIZE = 0.1  # Degrees (about 11 km of latitude)
+
+STATION = "station"
+OBJECT = "object"
+WEATHER = "wx"
+
+COMPASS_POINTS = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+
+
+class NearbyStations(object):
+    """
+    A spatial index of recently heard APRS stations, objects and weather stations.
+
+    Positions are bucketed into a grid of cell_size degree cells, so a query only
+    visits the cells overlapping its radius, no matter how many stations are
+    known. Columns wrap at the antimeridian. Entries are kept in order of last
+    update, so expiring old entries only touches the entries being expired.
+    """
+
+    def __init__(self, ttl=DEFAULT_NEARBY_TTL, cell_size=DEFAULT_CELL_SIZE):
+        super().__init__()
+        self._ttl = ttl
+        self._cell_size = cell_size
+        self._min_col = self._column(-180)
+        self._max_col = self._column(180 - cell_size / 2)
+        self._lock = threading.Lock()
+
+        # name -> (lat, lon, kind, time, cell), least recently updated first
+        self._entries = OrderedDict()
+
+        # cell -> set of names
+        self._grid = dict()
+
+    def update(self, name, lat, lon, kind=STATION, now=None):
+        """
+        Record the position of a station (or object).
+        """
+        if now is None:
+            now = time.time()
+
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None and old[4] != cell:
+                self._remove_from_grid(name, old[4])
+            self._entries[name] = (lat, lon, kind, now, cell)
+            self._grid.setdefault(cell, set()).add(name)
+
+    def remove(self, name):
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self._remove_from_grid(name, old[4])
+
+    def expire(self, now=None):
+        """
+        Remove entries not updated within the TTL. Returns the number removed.
+        """
+        if now is None:
+            now = time.time()
+
+        removed = 0
+        with self._lock:
+            while len(self._entries) > 0:
+                name, entry = next(iter(self._entries.items()))
+                if entry[3] >= now - self._ttl:
+                    break
+                self._entries.popitem(last=False)
+                self._remove_from_grid(name, entry[4])
+                removed += 1
+        return removed
+
+    def query(self, lat, lon, radius, limit=None, now=None):
+        """
+        Return the stations within radius meters of (lat, lon), nearest first, as
+        (distance, bearing, name, kind) tuples. At most limit are returned.
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - self._ttl
+
+        # The cells overlapping the bounding box of the radius
+        dlat = math.degrees(radius / EARTH_RADIUS)
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = min(180.0, dlat / cos_lat)
+        row0 = self._row(lat - dlat)
+        row1 = self._row(lat + dlat)
+        cols = list(self._columns(lon, dlon))
+
+        with self._lock:
+            candidates = list()
+            for row in range(row0, row1 + 1):
+                for col in cols:
+                    names = self._grid.get((row, col))
+                    if names is not None:
+                        candidates.extend(names)
+            entries = [self._entries[n] for n in candidates]
+
+        # Distances for the whole batch, using the equirectangular approximation
+        # (accurate to well under 1% at these ranges), in one pass
+        k = math.radians(1) * EARTH_RADIUS
+        scored = [
+            ((e[0] - lat) ** 2 + (_wrap_lon(e[1] - lon) * cos_lat) ** 2, i)
+            for i, e in enumerate(entries)
+            if e[3] >= cutoff
+        ]
+        max_squared = (radius / k) ** 2
+        scored = [s for s in scored if s[0] <= max_squared]
+
+        if limit is not None:
+            scored = heapq.nsmallest(limit, scored)
+        else:
+            scored.sort()
+
+        # Exact distances and bearings, only for the results
+        results = list()
+        for _, i in scored:
+            e = entries[i]
+            results.append(
+                (
+                    distance(lat, lon, e[0], e[1]),
+                    bearing(lat, lon, e[0], e[1]),
+                    candidates[i],
+                    e[2],
+                )
+            )
+        results.sort()
+        return results
+
+    def stats(self):
+        return {"stations": len(self._entries), "cells": len(self._grid)}
+
+    def _cell(self, lat, lon):
+        return (self._row(lat), self._column(lon))
+
+    def _row(self, lat):
+        return int(math.floor(lat / self._cell_size))
+
+    def _column(self, lon):
+        return int(math.floor(_wrap_lon(lon) / self._cell_size))
+
+    def _columns(self, lon, dlon):
+        """
+        The columns overlapping lon +/- dlon degrees, wrapping at the antimeridian.
+        """
+        if 2 * dlon >= 360 - self._cell_size:
+            return range(self._min_col, self._max_col + 1)
+        west = self._column(lon - dlon)
+        east = self._column(lon + dlon)
+        if west <= east:
+            return range(west, east + 1)
+        return itertools.chain(
+            range(west, self._max_col + 1), range(self._min_col, east + 1)
+        )
+
+    def _remove_from_grid(self, name, cell):
+        names = self._grid.get(cell)
+        if names is not None:
+            names.discard(name)
+            if len(names) == 0:
+                del self._grid[cell]
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _wrap_lon(lon):
+    """
+    Normalize a longitude (or longitude difference) to [-180, 180).
+    """
+    return (lon + 180.0) % 360.0 - 180.0
+
+
+def format_digest(results, radius):
+    """
+    Format query results as a short digest, e.g.:
+    "APRS within 50km: N0CALL-9 2.1km NE, K1ABC wx 4.0km S"
+    """
+    if len(results) == 0:
+        return None
+
+    parts = list()
+    for dist, brg, name, kind in results:
+        label = name if kind == STATION else f"{name} {kind}"
+        point = COMPASS_POINTS[int((brg + 22.5) % 360 // 45)]
+        parts.append(f"{label} {dist / 1000:.1f}km {point}")
+    return f"APRS within {radius / 1000:g}km: " + ", ".join(parts)
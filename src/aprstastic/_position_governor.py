@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import threading
+
+from ._geo import distance, heading_change
+
+# SmartBeaconing-style defaults (speeds in km/h, times in seconds)
+DEFAULT_SLOW_SPEED = 5
+DEFAULT_SLOW_RATE = 1800
+DEFAULT_FAST_SPEED = 90
+DEFAULT_FAST_RATE = 180
+DEFAULT_MIN_TURN_ANGLE = 30  # Degrees
+DEFAULT_TURN_SLOPE = 240  # Degrees * km/h
+DEFAULT_MIN_TURN_TIME = 15
+DEFAULT_MIN_DISTANCE = 100  # Meters
+DEFAULT_MIN_INTERVAL = 30  # Never forward the same device more often than this
+
+
+class PositionGovernor(object):
+    """
+    Decides which Meshtastic position reports are worth forwarding to APRS-IS.
+
+    For each device, the governor remembers the last position forwarded. A new
+    position is forwarded if the device has moved at least min_distance and the
+    SmartBeaconing rate for its speed has elapsed (fast_rate at fast_speed or
+    above, slow_rate at slow_speed or below, and proportional in between), if it
+    has turned a corner (min_turn_angle, plus turn_slope / speed), or if slow_rate
+    has elapsed regardless. Nothing is forwarded within min_interval of the last
+    forward.
+    """
+
+    def __init__(
+        self,
+        slow_speed=DEFAULT_SLOW_SPEED,
+        slow_rate=DEFAULT_SLOW_RATE,
+        fast_speed=DEFAULT_FAST_SPEED,
+        fast_rate=DEFAULT_FAST_RATE,
+        min_turn_angle=DEFAULT_MIN_TURN_ANGLE,
+        turn_slope=DEFAULT_TURN_SLOPE,
+        min_turn_time=DEFAULT_MIN_TURN_TIME,
+        min_distance=DEFAULT_MIN_DISTANCE,
+        min_interval=DEFAULT_MIN_INTERVAL,
+    ):
+        super().__init__()
+        self._slow_speed = slow_speed
+        self._slow_rate = slow_rate
+        self._fast_speed = fast_speed
+        self._fast_rate = fast_rate
+        self._min_turn_angle = min_turn_angle
+        self._turn_slope = turn_slope
+        self._min_turn_time = min_turn_time
+        self._min_distance = min_distance
+        self._min_interval = min_interval
+
+        self._lock = threading.Lock()
+
+        # device_id -> (lat, lon, course, time) of the last position forwarded
+        self._last_sent = dict()
+        self._forwarded = 0
+        self._suppressed = 0
+
+    def should_forward(self, device_id, lat, lon, course=None, speed=None, now=None):
+        """
+        Return True if the position should be forwarded (and remember it as the
+        last position sent), or False if it should be suppressed. Speed is in km/h,
+        and is estimated from the distance moved if not given.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            forward = self._should_forward(device_id, lat, lon, course, speed, now)
+            if forward:
+                self._forwarded += 1
+                self._last_sent[device_id] = (lat, lon, course, now)
+            else:
+                self._suppressed += 1
+            return forward
+
+    def _should_forward(self, device_id, lat, lon, course, speed, now):
+        last = self._last_sent.get(device_id)
+        if last is None:
+            return True
+
+        last_lat, last_lon, last_course, last_time = last
+        elapsed = now - last_time
+        if elapsed < self._min_interval:
+            return False
+
+        # The periodic update, moving or not
+        if elapsed >= self._slow_rate:
+            return True
+
+        moved = distance(last_lat, last_lon, lat, lon)
+        if speed is None:
+            speed = moved / elapsed * 3.6
+
+        # Corner pegging
+        if (
+            speed > self._slow_speed
+            and course is not None
+            and last_course is not None
+            and elapsed >= self._min_turn_time
+        ):
+            threshold = self._min_turn_angle + self._turn_slope / speed
+            if heading_change(last_course, course) > threshold:
+                return True
+
+        # Moving, at a rate that depends on speed
+        if moved < self._min_distance:
+            return False
+        return elapsed >= self.rate(speed)
+
+    def rate(self, speed):
+        """
+        Return the SmartBeaconing interval, in seconds, for the given speed (km/h).
+        """
+        if speed <= self._slow_speed:
+            return self._slow_rate
+        if speed >= self._fast_speed:
+            return self._fast_rate
+        return min(self._slow_rate, self._fast_rate * self._fast_speed / speed)
+
+    def forget(self, device_id):
+        with self._lock:
+            self._last_sent.pop(device_id, None)
+
+    def stats(self):
+        return {
+            "devices": len(self._last_sent),
+            "forwarded": self._forwarded,
+            "suppressed": self._suppressed,
+        }
@@ -0,0 +1,335 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import traceback
+
+logger = logging.getLogger("aprstastic")
+
+# Profiling modes
+PROFILE_MODE_SAMPLE = "sample"  # Sample the stacks of all threads (low overhead)
+PROFILE_MODE_CPROFILE = "cprofile"  # Deterministic profile of the main loop thread
+PROFILE_MODES = [PROFILE_MODE_SAMPLE, PROFILE_MODE_CPROFILE]
+
+DEFAULT_PROFILE_DURATION = 60  # Seconds, if no duration is given
+MAX_PROFILE_DURATION = 3600  # Never profile for more than an hour
+DEFAULT_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+DEFAULT_SLOW_TICK_THRESHOLD = 1.0  # Seconds
+SLOW_TICK_LOG_INTERVAL = 60  # Log at most one stack snapshot a minute
+
+
+class Profiler(object):
+    """
+    An on-demand profiler, which writes its results to the logs directory.
+
+    In "sample" mode, a background thread periodically samples the stacks of
+    every thread (the main loop, and the APRS-IS threads), and writes them in
+    the collapsed format read by flame graph tools (profile-*.folded), along
+    with a summary of the hottest functions (profile-*.txt).
+
+    In "cprofile" mode, the main loop thread is profiled with cProfile, and
+    the stats are written as profile-*.prof (for pstats or snakeviz), and
+    summarized in profile-*.txt. cProfile must be enabled on the thread it
+    profiles, so start() and stop() only take effect in the next call to tick().
+
+    Sessions end when stop() is called, or after their duration elapses.
+    """
+
+    def __init__(
+        self,
+        logs_dir,
+        mode=PROFILE_MODE_SAMPLE,
+        sample_interval=DEFAULT_SAMPLE_INTERVAL,
+    ):
+        super().__init__()
+        if mode not in PROFILE_MODES:
+            raise ValueError(
+                f"Unknown profiling mode '{mode}'. Expected one of: {PROFILE_MODES}"
+            )
+        self._logs_dir = logs_dir
+        self._mode = mode
+        self._sample_interval = sample_interval
+        self._lock = threading.Lock()
+
+        self._requested = False  # Should a session be running?
+        self._toggle_requested = False  # Set by the signal handler
+        self._deadline = None
+        self._running = False
+        self._started = None
+
+        self._cprofile = None
+        self._sampler = None
+        self._sampler_stop = None
+        self._samples = None  # Collapsed stack -> count
+        self._sample_count = 0
+
+        self.last_output = None
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self, duration=DEFAULT_PROFILE_DURATION):
+        """
+        Request a profiling session lasting up to duration seconds.
+        """
+        with self._lock:
+            self._request_session(duration, time.monotonic())
+
+    def stop(self):
+        """
+        Request that the current session end, and its results be written.
+        """
+        with self._lock:
+            self._requested = False
+
+    def toggle(self):
+        """
+        Start a session if none is requested, otherwise stop it.
+        """
+        with self._lock:
+            self._toggle(time.monotonic())
+
+    def request_toggle(self):
+        """
+        Like toggle(), but deferred to the next call to tick(). Safe to call from
+        a signal handler, since it takes no locks (the interrupted main thread may
+        already hold them).
+        """
+        self._toggle_requested = True
+
+    def tick(self, now=None):
+        """
+        Start or stop the session, as requested. Called from the main loop, on
+        every iteration. Returns the path of the report, when a session ends.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            if self._toggle_requested:
+                self._toggle_requested = False
+                self._toggle(now)
+            requested = self._requested
+            if requested and self._deadline is not None and now > self._deadline:
+                requested = self._requested = False
+
+        if requested == self._running:
+            return None
+        if requested:
+            self._begin()
+            return None
+        return self._end()
+
+    def _toggle(self, now):
+        # Called with the lock held
+        if self._requested:
+            self._requested = False
+        else:
+            self._request_session(DEFAULT_PROFILE_DURATION, now)
+
+    def _request_session(self, duration, now):
+        # Called with the lock held
+        duration = max(1, min(duration, MAX_PROFILE_DURATION))
+        self._requested = True
+        self._deadline = now + duration
+        logger.info(f"Profiling ({self._mode}) requested for up to {duration}s")
+
+    def _begin(self):
+        self._started = time.time()
+        if self._mode == PROFILE_MODE_CPROFILE:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._samples = dict()
+            self._sample_count = 0
+            self._sampler_stop = threading.Event()
+            self._sampler = threading.Thread(
+                target=self._sample_loop, args=(self._sampler_stop,), daemon=True
+            )
+            self._sampler.start()
+        self._running = True
+        logger.info(f"Profiling ({self._mode}) started")
+
+    def _end(self):
+        self._running = False
+        base = os.path.join(
+            self._logs_dir,
+            "profile-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started)),
+        )
+
+        if self._mode == PROFILE_MODE_CPROFILE:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(base + ".prof")
+            summary = io.StringIO()
+            stats = pstats.Stats(self._cprofile, stream=summary)
+            stats.sort_stats("cumulative").print_stats(40)
+            self._cprofile = None
+            self._write(base + ".txt", summary.getvalue())
+            output = base + ".prof"
+        else:
+            self._sampler_stop.set()
+            self._sampler.join()
+            self._sampler = None
+            samples, self._samples = self._samples, None
+            self._write(
+                base + ".folded",
+                "".join(f"{stack} {count}\n" for stack, count in samples.items()),
+            )
+            self._write(base + ".txt", _summarize_samples(samples, self._sample_count))
+            output = base + ".folded"
+
+        logger.info(f"Profiling stopped. Results written to {output}")
+        self.last_output = output
+        return output
+
+    def _sample_loop(self, stop):
+        own_id = threading.get_ident()
+        while not stop.wait(self._sample_interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = _collapse(names.get(thread_id, str(thread_id)), frame)
+                self._samples[stack] = self._samples.get(stack, 0) + 1
+            self._sample_count += 1
+
+    def _write(self, path, text):
+        with open(path, "wt", encoding="utf-8") as fh:
+            fh.write(text)
+
+
+class SlowTickDetector(object):
+    """
+    Logs main loop iterations (and handlers) that take longer than a threshold.
+
+    The main loop calls begin() at the start of each iteration, and end() when
+    it is done. If an iteration is still running after threshold seconds, a
+    watchdog thread logs a snapshot of the main thread's stack, showing where it
+    is stuck. Handlers can be timed with check(label, elapsed).
+    """
+
+    def __init__(self, threshold=DEFAULT_SLOW_TICK_THRESHOLD):
+        super().__init__()
+        self._threshold = threshold
+        self._thread_id = threading.get_ident()
+        self._tick_start = None
+        self._tick_number = 0
+        self._reported_tick = None
+        self._next_log_time = 0
+        self._stop = threading.Event()
+        self._watchdog = None
+
+        self.slow_ticks = 0
+        self.slow_handlers = 0
+
+    def start(self):
+        """
+        Start the watchdog thread. The calling thread is the one watched.
+        """
+        self._thread_id = threading.get_ident()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def begin(self):
+        self._tick_number += 1
+        self._tick_start = time.perf_counter()
+
+    def end(self):
+        start = self._tick_start
+        self._tick_start = None
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed > self._threshold:
+            self.slow_ticks += 1
+            logger.warning("Slow main loop iteration: %.3fs", elapsed)
+
+    def check(self, label, elapsed):
+        """
+        Log a handler that took longer than the threshold.
+        """
+        if elapsed > self._threshold:
+            self.slow_handlers += 1
+            logger.warning("Slow handler '%s': %.3fs", label, elapsed)
+
+    def _watch(self):
+        interval = max(0.01, self._threshold / 4)
+        while not self._stop.wait(interval):
+            start, tick = self._tick_start, self._tick_number
+            if start is None or self._reported_tick == tick:
+                continue
+            elapsed = time.perf_counter() - start
+            if elapsed <= self._threshold:
+                continue
+
+            # Report each stuck iteration once, and rate limit the (long) stack dumps
+            self._reported_tick = tick
+            now = time.monotonic()
+            if now < self._next_log_time:
+                continue
+            self._next_log_time = now + SLOW_TICK_LOG_INTERVAL
+
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "" if frame is None else "".join(traceback.format_stack(frame))
+            logger.warning(
+                "Main loop iteration running for %.3fs. Stack:\n%s", elapsed, stack
+            )
+
+    def stats(self):
+        return {
+            "threshold": self._threshold,
+            "slow_ticks": self.slow_ticks,
+            "slow_handlers": self.slow_handlers,
+        }
+
+
+def _collapse(thread_name, frame):
+    """
+    Collapse a stack to "thread;outer;...;inner", for flame graphs.
+    """
+    names = list()
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names)).replace(" ", "_")
+
+
+def _summarize_samples(samples, sample_count, limit=40):
+    """
+    Report the functions most often on top of a stack (self), and anywhere in it (total).
+    """
+    own = dict()
+    total = dict()
+    for stack, count in samples.items():
+        frames = stack.split(";")[1:]
+        if len(frames) == 0:
+            continue
+        own[frames[-1]] = own.get(frames[-1], 0) + count
+        for f in set(frames):
+            total[f] = total.get(f, 0) + count
+
+    lines = [f"{sample_count} samples, of all threads", ""]
+    for title, counts in (("Self", own), ("Total", total)):
+        lines.append(f"{title:>8}  Function")
+        for name, count in sorted(counts.items(), key=lambda x: -x[1])[0:limit]:
+            lines.append(f"{count:>8}  {name}")
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,224 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import gzip
+import json
+import time
+import base64
+import logging
+import threading
+
+from queue import Queue, Full, Empty
+
+logger = logging.getLogger("aprstastic")
+
+# Traffic sources
+APRS_RX = "aprs_rx"  # Raw lines received from APRS-IS
+APRS_TX = "aprs_tx"  # Raw lines sent to APRS-IS
+MESH_RX = "mesh_rx"  # Meshtastic packets received
+MESH_TX = "mesh_tx"  # Meshtastic text messages sent
+
+TRAFFIC_FILE_PREFIX = "traffic-"
+TRAFFIC_FILE_SUFFIX = ".jsonl.gz"
+
+DEFAULT_RECORDER_QUEUE_SIZE = 10000  # Entries buffered before dropping
+DEFAULT_RECORDER_MAX_BYTES = 64 * 1024 * 1024  # Rotate after 64 MB (uncompressed)
+DEFAULT_RECORDER_MAX_AGE = 3600  # Rotate after an hour
+DEFAULT_RECORDER_BACKUP_COUNT = 48  # Keep two days of hourly files
+RECORDER_FLUSH_INTERVAL = 5  # Flush to disk at least this often, when idle
+
+_STOP = object()
+
+
+class TrafficRecorder(object):
+    """
+    Records raw APRS-IS lines and Meshtastic packets to gzipped JSON lines files
+    in the logs directory (traffic-YYYYmmdd-HHMMSS-NNN.jsonl.gz). Each line is:
+
+        {"t": <monotonic time>, "wall": <unix time>, "src": "aprs_rx", "data": ...}
+
+    Files are rotated when they reach max_bytes (uncompressed), or max_age
+    seconds, and only the newest backup_count files are kept.
+
+    record() never blocks: entries are buffered in a bounded queue, and are
+    serialized, compressed, and written on the recorder's own thread. If the
+    queue is full, entries are dropped, but they are counted, logged, and
+    marked in the file with a {"dropped": n} line, so gaps are never silent.
+    """
+
+    def __init__(
+        self,
+        logs_dir,
+        max_bytes=DEFAULT_RECORDER_MAX_BYTES,
+        max_age=DEFAULT_RECORDER_MAX_AGE,
+        backup_count=DEFAULT_RECORDER_BACKUP_COUNT,
+        queue_size=DEFAULT_RECORDER_QUEUE_SIZE,
+    ):
+        super().__init__()
+        self._logs_dir = logs_dir
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._backup_count = backup_count
+        self._queue = Queue(maxsize=queue_size)
+
+        self._recorded = 0
+        self._dropped = 0  # Dropped in total
+        self._unreported_drops = 0  # Dropped since the last marker was written
+        self._drop_lock = threading.Lock()
+
+        self._file = None
+        self._file_path = None
+        self._file_bytes = 0
+        self._file_opened = 0
+        self._files_written = 0
+        self._last_name = None
+        self._sequence = 0
+
+        self._thread = threading.Thread(target=self._thread_body, daemon=True)
+        self._thread.start()
+
+    def record(self, source, data):
+        """
+        Record a raw line (str or bytes) or a packet (dict) from the given source.
+        Never blocks.
+        """
+        try:
+            self._queue.put_nowait((time.monotonic(), time.time(), source, data))
+        except Full:
+            with self._drop_lock:
+                self._dropped += 1
+                self._unreported_drops += 1
+
+    def close(self):
+        """
+        Write everything buffered, and close the current file.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    def stats(self):
+        return {
+            "recorded": self._recorded,
+            "dropped": self._dropped,
+            "queued": self._queue.qsize(),
+            "files_written": self._files_written,
+            "current_file": self._file_path,
+        }
+
+    def _thread_body(self):
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    entry = self._queue.get(timeout=RECORDER_FLUSH_INTERVAL)
+                except Empty:
+                    entry = None
+
+                if entry is _STOP:
+                    break
+
+                self._report_drops()
+                if entry is not None:
+                    self._write(entry)
+
+                # Flush when caught up, so the files are readable while running
+                now = time.monotonic()
+                if self._file is not None and (
+                    self._queue.empty() and now - last_flush > RECORDER_FLUSH_INTERVAL
+                ):
+                    self._file.flush()
+                    last_flush = now
+        except Exception:
+            logger.exception("Traffic recorder failed. No further traffic is recorded.")
+        finally:
+            self._report_drops()
+            self._close_file()
+
+    def _write(self, entry):
+        t, wall, source, data = entry
+        line = json.dumps(
+            {"t": round(t, 6), "wall": round(wall, 6), "src": source, "data": data},
+            default=_jsonable,
+            separators=(",", ":"),
+        )
+        self._write_line(line)
+        self._recorded += 1
+
+    def _report_drops(self):
+        with self._drop_lock:
+            dropped, self._unreported_drops = self._unreported_drops, 0
+        if dropped > 0:
+            logger.warning(
+                "Traffic recorder fell behind, and dropped %d entries", dropped
+            )
+            self._write_line(
+                json.dumps({"t": round(time.monotonic(), 6), "dropped": dropped})
+            )
+
+    def _write_line(self, line):
+        data = (line + "\n").encode("utf-8")
+        if self._file is None or (
+            self._file_bytes + len(data) > self._max_bytes
+            or time.monotonic() - self._file_opened > self._max_age
+        ):
+            self._rotate()
+        self._file.write(data)
+        self._file_bytes += len(data)
+
+    def _rotate(self):
+        self._close_file()
+
+        # Names sort in the order the files were written, even within a second
+        name = TRAFFIC_FILE_PREFIX + time.strftime("%Y%m%d-%H%M%S")
+        if name != self._last_name:
+            self._last_name = name
+            self._sequence = 0
+        while True:
+            path = os.path.join(
+                self._logs_dir, f"{name}-{self._sequence:03d}{TRAFFIC_FILE_SUFFIX}"
+            )
+            self._sequence += 1
+            if not os.path.exists(path):
+                break
+
+        self._file = gzip.open(path, "wb", compresslevel=6)
+        self._file_path = path
+        self._file_bytes = 0
+        self._file_opened = time.monotonic()
+        self._files_written += 1
+        logger.debug("Recording traffic to %s", path)
+
+        # Remove the oldest files
+        files = sorted(
+            f
+            for f in os.listdir(self._logs_dir)
+            if f.startswith(TRAFFIC_FILE_PREFIX) and f.endswith(TRAFFIC_FILE_SUFFIX)
+        )
+        for f in files[0 : max(0, len(files) - self._backup_count)]:
+            try:
+                os.unlink(os.path.join(self._logs_dir, f))
+            except OSError as e:
+                logger.warning("Unable to remove old traffic file %s: %s", f, e)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _jsonable(value):
+    """
+    Convert the values in Meshtastic packets that JSON can't represent.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            return {"base64": base64.b64encode(value).decode("ascii")}
+    return repr(value)
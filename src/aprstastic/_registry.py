@@ -5,12 +5,15 @@ import sqlite3
 import logging
 import json
 import shutil
+import sys
+import threading
 import time
-import requests
 import traceback
 import os
 
-from packaging.version import Version
+from array import array
+from bisect import bisect_left
+
 from .__about__ import __version__
 
 logger = logging.getLogger("aprstastic")
@@ -25,6 +28,16 @@ COL_DEVICE_ID = 0
 COL_CALL_SIGN = 1
 COL_SETTINGS = 2
 COL_TIMESTAMP = 3
+COL_TABLE = 4
+COL_ROWID = 5
+
+# Compaction only considers rows older than this (in seconds)
+DEFAULT_COMPACTION_RETENTION = 3600 * 24 * 30
+
+# Kinds of registry change events
+EVENT_ADDED = "added"
+EVENT_CHANGED = "changed"
+EVENT_REMOVED = "removed"
 
 
 class CallSignRegistry(object):
@@ -38,27 +51,96 @@ class CallSignRegistry(object):
 
     The records are then merged, by date (with system-level overrides having the final word).
     This class manages this process
+
+    Reads are safe from any thread, and never block: the merged registrations are an
+    immutable snapshot that is replaced wholesale whenever they change. Writes are
+    serialized by a lock, and each thread uses its own sqlite connection.
     """
 
     def __init__(self, data_dir):
         super().__init__()
         self._data_dir = data_dir
-
-        self._db_conn = self._open_db(os.path.join(data_dir, DATABASE_FILE))
+        self._db_path = os.path.join(data_dir, DATABASE_FILE)
+        self._write_lock = threading.RLock()
+        self._thread_local = threading.local()
+        self._connections = (
+            list()
+        )  # Every thread's connection, so close() can close them
+        self._connections_lock = threading.Lock()
+
+        self._thread_local.conn = self._open_db(self._db_path)
         self._precompiled = self._load_precompiled(
             os.path.join(data_dir, PRECOMPILED_FILE)
         )
+        self._remember_precompiled_keys(self._precompiled)
         self._overrides = self._load_overrides(os.path.join(data_dir, OVERRIDES_FILE))
-        self._merged = dict()
+        self._merged = _MergedRegistrations()
+        self._subscribers = list()
 
         self._rebuild()
 
+    def subscribe(self, callback):
+        """
+        Register a callback to be called with a RegistryEvent whenever a registration is
+        added, changed, or removed. Callbacks are called on the thread that made the change,
+        after the new snapshot has been published, and in the order that changes occurred.
+        """
+        with self._write_lock:
+            self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        """
+        Remove a callback previously registered with subscribe().
+        """
+        with self._write_lock:
+            self._subscribers = [c for c in self._subscribers if c != callback]
+
+    @property
+    def _db_conn(self):
+        """
+        The calling thread's connection to the registration database (opened on first use).
+        """
+        conn = getattr(self._thread_local, "conn", None)
+        if conn is None:
+            conn = self._connect(self._db_path)
+            self._thread_local.conn = conn
+        return conn
+
+    def _connect(self, db_path):
+        """
+        Open a connection to the registration database, and track it so that close() can
+        close it. Each connection is only used by the thread that opened it, but may be
+        closed from another.
+        """
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """
+        Close every thread's connection to the registration database. Other threads must
+        have finished using the registry.
+        """
+        with self._connections_lock:
+            connections, self._connections = self._connections, list()
+        for conn in connections:
+            conn.close()
+        self._thread_local.conn = None
+
+    def snapshot(self):
+        """
+        Return an immutable, dictionary-like, snapshot of the merged registrations.
+        Use this when making several related reads, so they are mutually consistent.
+        """
+        return self._merged
+
     def _open_db(self, db_path):
         """
         Return a sqlite database connection to the registration database, initilizing the database if needed.
         """
         create_db = not os.path.isfile(db_path)
-        conn = sqlite3.connect(db_path)
+        conn = self._connect(db_path)
         cursor = conn.cursor()
 
         if create_db:
@@ -102,100 +184,251 @@ CREATE TABLE IF NOT EXISTS BeaconedRegistrations (
             conn.commit()
             logger.debug(f"initialized database: {db_path}")
 
+        # Every device id and call sign ever seen in the precompiled registrations
+        # (added after version 1, so it may be missing from existing databases)
+        cursor.execute(
+            """
+CREATE TABLE IF NOT EXISTS PrecompiledKeys (
+    key TEXT PRIMARY KEY
+)
+"""
+        )
+        conn.commit()
+
         cursor.close()
         return conn
 
-    def add_registration(self, device_id, call_sign, icon, is_local):
+    def _remember_precompiled_keys(self, tuples):
+        """
+        Record the device ids and call signs in the precompiled registrations, so
+        that compaction keeps any tombstones for them, even after they drop out
+        of the precompiled data (which may later bring them back).
+        """
+        keys = set()
+        for t in tuples:
+            keys.add(t[COL_DEVICE_ID])
+            keys.add(t[COL_CALL_SIGN])
+        keys.discard(None)
         cursor = self._db_conn.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO PrecompiledKeys (key) VALUES (?);",
+            [(k,) for k in keys],
+        )
+        self._db_conn.commit()
+        cursor.close()
 
+    def add_registration(self, device_id, call_sign, icon, is_local):
         # Make sure that device or call_sign is non None
         if device_id is None and call_sign is None:
             raise ValueError(
                 "At least one of 'device_id' or 'call_sign' must be non-None."
             )
 
-        # Delete prior rows
-        del_query = "DELETE FROM %s WHERE device_id = ? OR call_sign = ?;" % (
-            "LocalRegistrations" if is_local else "BeaconedRegistrations",
+        with self._write_lock:
+            self._add_registration(device_id, call_sign, icon, is_local)
+
+    def _add_registration(self, device_id, call_sign, icon, is_local):
+        cursor = self._db_conn.cursor()
+        table = "LocalRegistrations" if is_local else "BeaconedRegistrations"
+
+        # Note what the change can affect: the new row, and the prior rows it replaces
+        touched_ids = set([device_id])
+        touched_call_signs = set([call_sign])
+        cursor.execute(
+            "SELECT device_id, call_sign FROM %s WHERE device_id = ? OR call_sign = ?;"
+            % (table,),
+            (device_id, call_sign),
         )
+        for row in cursor.fetchall():
+            touched_ids.add(row[0])
+            touched_call_signs.add(row[1])
+
+        # Delete prior rows
+        del_query = "DELETE FROM %s WHERE device_id = ? OR call_sign = ?;" % (table,)
         cursor.execute(del_query, (device_id, call_sign))
 
         # Insert the new record
         insert_query = (
             "INSERT INTO %s (device_id, call_sign, settings_json, timestamp) VALUES (?, ?, ?, ?);"
-            % ("LocalRegistrations" if is_local else "BeaconedRegistrations",)
+            % (table,)
         )
         cursor.execute(insert_query, (device_id, call_sign, icon, int(time.time())))
 
         self._db_conn.commit()
         cursor.close()
 
-        self._rebuild()
+        self._rebuild(touched_ids, touched_call_signs)
 
-    def _rebuild(self):
+    def _rebuild(self, touched_ids=None, touched_call_signs=None):
         """
         Updates (by rebuilding), the in-memory copy of the merged database, replaying actions in time order.
+        The new copy is built off to the side, then published with a single assignment.
+
+        If the device ids and call signs touched by the change are given, only their
+        registrations are compared when notifying subscribers. Otherwise, all are.
         """
-        cursor = self._db_conn.cursor()
+        with self._write_lock:
+            cursor = self._db_conn.cursor()
+            operations = self._get_operations(cursor)
+            cursor.close()
+            previous = self._merged
+            self._merged = _MergedRegistrations(_replay(operations))
+
+            # Notify subscribers of what changed
+            if len(self._subscribers) > 0:
+                for event in self._merged.diff(
+                    previous, touched_ids, touched_call_signs
+                ):
+                    self._notify(event)
+
+    def _notify(self, event):
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logger.error(traceback.format_exc())
 
-        # Append all the operations together
-        operations = [t for t in self._precompiled]
-        operations.extend([t for t in self._overrides])
+    def _get_operations(self, cursor):
+        """
+        Return all registration operations, from all sources, sorted by date (ascending).
+        Each operation is a tuple (device_id, call_sign, settings, timestamp, table, rowid),
+        where table and rowid are None for operations that are not stored in the database.
+        """
 
-        cursor.execute(
-            "SELECT device_id, call_sign, settings_json, timestamp FROM BeaconedRegistrations;"
+        # Append all the operations together
+        operations = [(t[0], t[1], t[2], t[3], None, None) for t in self._precompiled]
+        operations.extend(
+            [(t[0], t[1], t[2], t[3], None, None) for t in self._overrides]
         )
-        rows = cursor.fetchall()
-        for row in rows:
-            operations.append(
-                (
-                    row[COL_DEVICE_ID],
-                    row[COL_CALL_SIGN],
-                    row[COL_SETTINGS],
-                    row[COL_TIMESTAMP],
-                )
-            )
 
-        cursor.execute(
-            "SELECT device_id, call_sign, settings_json, timestamp FROM LocalRegistrations;"
-        )
-        rows = cursor.fetchall()
-        for row in rows:
-            operations.append(
-                (
-                    row[COL_DEVICE_ID],
-                    row[COL_CALL_SIGN],
-                    row[COL_SETTINGS],
-                    row[COL_TIMESTAMP],
-                )
+        for table in ["BeaconedRegistrations", "LocalRegistrations"]:
+            cursor.execute(
+                "SELECT device_id, call_sign, settings_json, timestamp, rowid FROM %s;"
+                % (table,)
             )
+            rows = cursor.fetchall()
+            for row in rows:
+                operations.append(
+                    (
+                        row[COL_DEVICE_ID],
+                        row[COL_CALL_SIGN],
+                        row[COL_SETTINGS],
+                        row[COL_TIMESTAMP],
+                        table,
+                        row[-1],  # rowid
+                    )
+                )
 
         # Sort by date, ascending
         operations.sort(key=lambda x: x[COL_TIMESTAMP])
+        return operations
+
+    def compact(self, retention=DEFAULT_COMPACTION_RETENTION):
+        """
+        Remove database rows that no longer affect the merged registrations, then VACUUM.
+
+        Rows are only considered if they are older than the retention window (in seconds).
+        Of those, two kinds of row are removed:
+            - rows whose device id and call sign are both reassigned by a strictly later operation
+            - tombstones that no longer delete anything, unless their device id or call
+              sign has ever appeared in the precompiled registrations (which a later
+              download could bring back)
+
+        The merged registrations are replayed without the candidate rows, and nothing is
+        removed unless the result is identical to the current merged registrations.
 
-        self._merged = dict()
+        Returns a dictionary of statistics (row counts before and after, and timing).
+        """
+        with self._write_lock:
+            return self._compact(retention)
+
+    def _compact(self, retention):
+        start_time = time.time()
+        cursor = self._db_conn.cursor()
+        before = self._count_rows(cursor)
+
+        operations = self._get_operations(cursor)
+        effective = list()
+        expected = _replay(operations, effective)
+
+        # The last time each device id and call sign was (re)assigned
+        last_device_id = dict()
+        last_call_sign = dict()
         for op in operations:
+            if op[COL_DEVICE_ID] is not None:
+                last_device_id[op[COL_DEVICE_ID]] = op[COL_TIMESTAMP]
+            if op[COL_CALL_SIGN] is not None:
+                last_call_sign[op[COL_CALL_SIGN]] = op[COL_TIMESTAMP]
+
+        cursor.execute("SELECT key FROM PrecompiledKeys;")
+        precompiled_keys = set(row[0] for row in cursor.fetchall())
+
+        superseded = set()
+        expired = set()
+        cutoff = start_time - retention
+        for i, op in enumerate(operations):
+            if op[COL_TABLE] is None or op[COL_TIMESTAMP] >= cutoff:
+                continue
             d_id = op[COL_DEVICE_ID]
-            icon = op[COL_SETTINGS]
-            timestamp = op[COL_TIMESTAMP]
             cs = op[COL_CALL_SIGN]
-            cs_key = self._get_device_id(self._merged, cs)
+            if (d_id is None or last_device_id[d_id] > op[COL_TIMESTAMP]) and (
+                cs is None or last_call_sign[cs] > op[COL_TIMESTAMP]
+            ):
+                superseded.add(i)
+            elif (
+                (d_id is None or cs is None)
+                and not effective[i]
+                and d_id not in precompiled_keys
+                and cs not in precompiled_keys
+            ):
+                expired.add(i)
+
+        # Try the most aggressive option first, falling back if the merged view would change
+        removed = set()
+        for candidates in [superseded | expired, superseded]:
+            remaining = [op for i, op in enumerate(operations) if i not in candidates]
+            if _replay(remaining) == expected:
+                removed = candidates
+                break
+            logger.warning(
+                "Registry compaction would alter the merged registrations. Trying a more conservative option."
+            )
 
-            # Delete the prior value(s)
-            if d_id is not None and d_id in self._merged:
-                del self._merged[d_id]
-            if cs_key is not None and cs_key in self._merged:
-                del self._merged[cs_key]
+        for i in removed:
+            op = operations[i]
+            cursor.execute(
+                "DELETE FROM %s WHERE rowid = ?;" % (op[COL_TABLE],), (op[COL_ROWID],)
+            )
+        self._db_conn.commit()
+        cursor.execute("VACUUM;")
 
-            # If either the device id or call sign are None, then continue
-            # (this is a tombstone)
-            if d_id is None or cs is None:
-                continue
+        after = self._count_rows(cursor)
+        cursor.close()
 
-            # Update
-            self._merged[d_id] = {"call_sign": cs, "icon": icon, "timestamp": timestamp}
+        stats = {
+            "before": before,
+            "after": after,
+            "removed": len(removed),
+            "elapsed_seconds": time.time() - start_time,
+        }
+        logger.info(
+            "Registry compaction removed %d rows in %.3f seconds. Before: %s, After: %s",
+            stats["removed"],
+            stats["elapsed_seconds"],
+            before,
+            after,
+        )
+        return stats
 
-        cursor.close()
+    def _count_rows(self, cursor):
+        """
+        Return a dictionary with the number of rows in each registration table.
+        """
+        counts = dict()
+        for table in ["BeaconedRegistrations", "LocalRegistrations"]:
+            cursor.execute("SELECT COUNT(*) FROM %s;" % (table,))
+            counts[table] = cursor.fetchone()[0]
+        return counts
 
     def _load_overrides(self, file_path):
         """
@@ -246,6 +479,10 @@ CREATE TABLE IF NOT EXISTS BeaconedRegistrations (
         if now - cached_timestamp > 3600 * 24:
             logger.debug("Downloading precompiled database.")
             try:
+                # Only needed once a day (imports are slow)
+                import requests
+                from packaging.version import Version
+
                 response = requests.get(precompiled_data.get("url"))
                 response.raise_for_status()
                 new_data = json.loads(response.text)
@@ -280,16 +517,17 @@ CREATE TABLE IF NOT EXISTS BeaconedRegistrations (
             t[COL_TIMESTAMP] = min(now, t[COL_TIMESTAMP])
         return tuples
 
-    def _get_device_id(self, d, call_sign):
+    def get_device_id(self, call_sign):
         """
-        Return the first device id that maps to the given call sign
+        Return the device id registered to the given call sign (case-insensitive), or None
         """
-        for k in d:
-            if d[k]["call_sign"] == call_sign:
-                return k
-        return None
+        return self._merged.get_device_id(call_sign)
+
+    def get(self, key, default=None):
+        return self._merged.get(key, default)
 
     # Emulate a dictionary
+    # (each method reads the current snapshot exactly once)
     def __getitem__(self, key):
         return self._merged[key]
 
@@ -310,3 +548,263 @@ CREATE TABLE IF NOT EXISTS BeaconedRegistrations (
 
     def __iter__(self):
         return iter(self._merged)
+
+
+class RegistryEvent(object):
+    """
+    Describes a change to a single registration. 'kind' is one of EVENT_ADDED,
+    EVENT_CHANGED, or EVENT_REMOVED. 'old' and 'new' are the registration
+    dictionaries before and after the change (None if absent).
+    """
+
+    __slots__ = ("kind", "device_id", "old", "new")
+
+    def __init__(self, kind, device_id, old, new):
+        super().__init__()
+        self.kind = kind
+        self.device_id = device_id
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return f"RegistryEvent({self.kind!r}, {self.device_id!r}, {self.old!r}, {self.new!r})"
+
+
+def _replay(operations, effective=None):
+    """
+    Replay the (time-ordered) registration operations, and return a dictionary
+    mapping each surviving device id to a (call_sign, icon, timestamp) tuple.
+
+    If 'effective' is a list, then one boolean is appended to it per operation,
+    indicating if the operation changed the merged result.
+    """
+    merged = dict()
+    by_call_sign = dict()  # Reverse index, so that each step is O(1)
+    for op in operations:
+        size = len(merged)
+        d_id = op[COL_DEVICE_ID]
+        icon = op[COL_SETTINGS]
+        timestamp = op[COL_TIMESTAMP]
+        cs = op[COL_CALL_SIGN]
+
+        # Delete the prior value(s)
+        if d_id is not None:
+            prior = merged.pop(d_id, None)
+            if prior is not None:
+                del by_call_sign[prior[0]]
+        if cs is not None:
+            cs_key = by_call_sign.pop(cs, None)
+            if cs_key is not None:
+                del merged[cs_key]
+
+        # If either the device id or call sign are None, then continue
+        # (this is a tombstone)
+        if d_id is None or cs is None:
+            if effective is not None:
+                effective.append(len(merged) != size)
+            continue
+
+        # Update
+        merged[d_id] = (cs, icon, timestamp)
+        by_call_sign[cs] = d_id
+        if effective is not None:
+            effective.append(True)
+    return merged
+
+
+def _pack_device_id(device_id):
+    """
+    Return the 32-bit node number of a canonical Meshtastic id (e.g., "!da577418"),
+    or None if the id is not in canonical form.
+    """
+    if not isinstance(device_id, str) or len(device_id) != 9 or device_id[0] != "!":
+        return None
+    try:
+        node_num = int(device_id[1:], 16)
+    except ValueError:
+        return None
+    # Reject anything that would not format back to the same string (e.g., upper case)
+    if "!%08x" % node_num != device_id:
+        return None
+    return node_num
+
+
+class _MergedRegistrations(object):
+    """
+    A compact, read-only, dictionary-like view of the merged registrations.
+
+    Rather than one dictionary per device, keyed by strings like "!da577418", the
+    records are stored in parallel arrays. Canonical Meshtastic ids are packed into
+    their 32-bit node numbers (sorted, for binary search), while any other ids are
+    kept verbatim in a (normally empty) side table. Call signs and icons are
+    interned, and a sorted array of call signs supports reverse lookups.
+    Lookups return dictionaries of the form {"call_sign", "icon", "timestamp"}.
+
+    Instances are never modified after construction, so they can be shared
+    between threads without locking.
+    """
+
+    __slots__ = (
+        "_nodes",
+        "_other",
+        "_other_keys",
+        "_call_signs",
+        "_icons",
+        "_timestamps",
+        "_sorted_call_signs",
+        "_sorted_positions",
+    )
+
+    def __init__(self, records=None):
+        # Packed node numbers occupy positions [0, len(_nodes)) of the parallel
+        # arrays. Other ids occupy the positions that follow.
+        self._nodes = array("I")
+        self._other = dict()
+        self._other_keys = list()
+        self._call_signs = list()
+        self._icons = list()
+        self._timestamps = array("d")
+        self._sorted_call_signs = list()
+        self._sorted_positions = array("I")
+
+        if records is None:
+            return
+
+        packed = list()
+        other = list()
+        for device_id, record in records.items():
+            node_num = _pack_device_id(device_id)
+            if node_num is None:
+                other.append((device_id, record))
+            else:
+                packed.append((node_num, record))
+        packed.sort(key=lambda x: x[0])
+
+        for node_num, record in packed:
+            self._nodes.append(node_num)
+            self._append(record)
+        for device_id, record in other:
+            self._other[device_id] = len(self._call_signs)
+            self._other_keys.append(device_id)
+            self._append(record)
+
+        # Build the reverse index. If two call signs normalize to the same
+        # value, the first one wins.
+        reverse = list()
+        for pos, call_sign in enumerate(self._call_signs):
+            normalized = call_sign.strip().upper()
+            reverse.append((call_sign if normalized == call_sign else normalized, pos))
+        reverse.sort(key=lambda x: x[0])
+        for call_sign, pos in reverse:
+            if self._sorted_call_signs and self._sorted_call_signs[-1] == call_sign:
+                continue
+            self._sorted_call_signs.append(call_sign)
+            self._sorted_positions.append(pos)
+
+    def _append(self, record):
+        self._call_signs.append(sys.intern(record[0]))
+        self._icons.append(record[1] if record[1] is None else sys.intern(record[1]))
+        self._timestamps.append(record[2])
+
+    def _position(self, key):
+        """
+        Return the array position of the given device id, or -1 if not present.
+        """
+        node_num = _pack_device_id(key)
+        if node_num is None:
+            return self._other.get(key, -1)
+        i = bisect_left(self._nodes, node_num)
+        if i < len(self._nodes) and self._nodes[i] == node_num:
+            return i
+        return -1
+
+    def _key(self, pos):
+        if pos < len(self._nodes):
+            return "!%08x" % self._nodes[pos]
+        return self._other_keys[pos - len(self._nodes)]
+
+    def get_device_id(self, call_sign):
+        call_sign = call_sign.strip().upper()
+        i = bisect_left(self._sorted_call_signs, call_sign)
+        if i < len(self._sorted_call_signs) and self._sorted_call_signs[i] == call_sign:
+            return self._key(self._sorted_positions[i])
+        return None
+
+    def get(self, key, default=None):
+        pos = self._position(key)
+        if pos < 0:
+            return default
+        return self._record(pos)
+
+    def __getitem__(self, key):
+        pos = self._position(key)
+        if pos < 0:
+            raise KeyError(key)
+        return self._record(pos)
+
+    def _record(self, pos):
+        timestamp = self._timestamps[pos]
+        return {
+            "call_sign": self._call_signs[pos],
+            "icon": self._icons[pos],
+            "timestamp": int(timestamp) if timestamp.is_integer() else timestamp,
+        }
+
+    def __contains__(self, key):
+        return self._position(key) >= 0
+
+    def __len__(self):
+        return len(self._call_signs)
+
+    def __iter__(self):
+        for node_num in self._nodes:
+            yield "!%08x" % node_num
+        yield from self._other_keys
+
+    def diff(self, previous, device_ids=None, call_signs=None):
+        """
+        Yield a RegistryEvent for each registration that differs from 'previous'.
+
+        If device_ids is given, only those devices are compared, along with the
+        devices holding any of the given call signs (before or after the change),
+        rather than every registration.
+        """
+        if device_ids is not None:
+            keys = set(k for k in device_ids if k is not None)
+            for call_sign in call_signs or []:
+                if call_sign is None:
+                    continue
+                for registrations in (previous, self):
+                    key = registrations.get_device_id(call_sign)
+                    if key is not None:
+                        keys.add(key)
+            for key in sorted(keys):
+                old = previous.get(key)
+                new = self.get(key)
+                if old is None and new is not None:
+                    yield RegistryEvent(EVENT_ADDED, key, None, new)
+                elif new is None and old is not None:
+                    yield RegistryEvent(EVENT_REMOVED, key, old, None)
+                elif old != new:
+                    yield RegistryEvent(EVENT_CHANGED, key, old, new)
+            return
+
+        for key in self:
+            new = self[key]
+            old = previous.get(key)
+            if old is None:
+                yield RegistryEvent(EVENT_ADDED, key, None, new)
+            elif old != new:
+                yield RegistryEvent(EVENT_CHANGED, key, old, new)
+        for key in previous:
+            if key not in self:
+                yield RegistryEvent(EVENT_REMOVED, key, previous[key], None)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[k] for k in self]
+
+    def items(self):
+        return [(k, self[k]) for k in self]
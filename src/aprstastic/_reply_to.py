@@ -0,0 +1,190 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import json
+import time
+import logging
+import threading
+import traceback
+
+from collections import OrderedDict
+
+logger = logging.getLogger("aprstastic")
+
+REPLY_TO_FILE = "reply_to.json"
+DEFAULT_REPLY_TO_MAX_SIZE = 10000
+DEFAULT_REPLY_TO_TTL = 3600 * 24 * 7
+
+
+class ReplyToTable(object):
+    """
+    Remembers who each Meshtastic device last talked to (on APRS), so that replies
+    without a call sign prefix can be routed.
+
+    The table is bounded both in size (least recently used entries are evicted first)
+    and in age (entries not used in 'ttl' seconds expire). It can be checkpointed to,
+    and reloaded from, the data directory so that conversations survive a restart.
+    """
+
+    def __init__(
+        self,
+        data_dir=None,
+        max_size=DEFAULT_REPLY_TO_MAX_SIZE,
+        ttl=DEFAULT_REPLY_TO_TTL,
+    ):
+        super().__init__()
+        self._path = None if data_dir is None else os.path.join(data_dir, REPLY_TO_FILE)
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+
+        # device_id -> (call_sign, last_used), least recently used first
+        self._entries = OrderedDict()
+        self._dirty = False
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+        if self._path is not None:
+            self.load()
+
+    def get(self, device_id, now=None):
+        """
+        Return the call sign the device last talked to, or None. A hit counts as a use.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            call_sign, last_used = entry
+            if last_used < now - self._ttl:
+                del self._entries[device_id]
+                self._expirations += 1
+                self._misses += 1
+                self._dirty = True
+                return None
+
+            self._hits += 1
+            self._entries[device_id] = (call_sign, now)
+            self._entries.move_to_end(device_id)
+            self._dirty = True
+            return call_sign
+
+    def set(self, device_id, call_sign, now=None):
+        """
+        Record that the device is talking to the given call sign.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            self._entries[device_id] = (call_sign, now)
+            self._entries.move_to_end(device_id)
+            self._dirty = True
+            self._expire(now)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def expire(self, now=None):
+        """
+        Remove entries that have not been used within the TTL. Returns the number removed.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            return self._expire(now)
+
+    def _expire(self, now):
+        # Entries are in order of use, so only the expired entries are visited
+        removed = 0
+        while len(self._entries) > 0:
+            device_id, (call_sign, last_used) = next(iter(self._entries.items()))
+            if last_used >= now - self._ttl:
+                break
+            self._entries.popitem(last=False)
+            removed += 1
+        if removed > 0:
+            self._expirations += removed
+            self._dirty = True
+        return removed
+
+    @property
+    def dirty(self):
+        """
+        True if the table changed since it was last loaded or checkpointed.
+        """
+        return self._dirty
+
+    def checkpoint(self):
+        """
+        Save the table to the data directory, if it has changed. The file is written
+        to a temporary path, then moved into place, so it is never left half-written.
+        """
+        if self._path is None:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [[k, cs, ts] for k, (cs, ts) in self._entries.items()]
+            self._dirty = False
+
+        tmp_path = self._path + ".tmp"
+        try:
+            with open(tmp_path, "wt") as fh:
+                fh.write(json.dumps({"entries": entries}))
+            os.replace(tmp_path, self._path)
+        except:
+            with self._lock:
+                self._dirty = True
+            raise
+
+    def load(self):
+        """
+        Replace the table's contents with the last checkpoint (if any).
+        """
+        if self._path is None or not os.path.isfile(self._path):
+            return
+
+        try:
+            with open(self._path, "rt") as fh:
+                entries = json.loads(fh.read()).get("entries", [])
+        except:
+            logger.error(traceback.format_exc())
+            return
+
+        now = time.time()
+        with self._lock:
+            self._entries.clear()
+            for device_id, call_sign, last_used in sorted(entries, key=lambda e: e[2]):
+                self._entries[device_id] = (call_sign, last_used)
+            self._expire(now)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+            self._dirty = False
+        logger.debug(f"Loaded {len(self._entries)} reply-to entries.")
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self._max_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+        }
+
+    def __contains__(self, device_id):
+        return device_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
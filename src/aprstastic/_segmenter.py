@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import warnings
+
+MAX_APRS_TEXT_MESSAGE_LENGTH = 67  # As per the APRS specification
+MAX_MESH_MESSAGE_LENGTH = 237  # Meshtastic's data payload limit (DATA_PAYLOAD_LEN)
+
+# Segments are broken on (ASCII) whitespace
+_WHITESPACE = b" \t\n\r\x0b\x0c"
+_WHITESPACE_BYTES = [bytes([w]) for w in _WHITESPACE]
+
+# The shortest limit that can always hold one (4-byte) UTF-8 character
+_MIN_MAX_BYTES = 4
+
+
+def truncate(message, max_bytes):
+    """
+    Truncate a message to at most max_bytes of UTF-8, without splitting a character.
+    """
+    data = message.encode("utf-8")
+    if len(data) <= max_bytes:
+        return message
+
+    # Warn about the message being too long
+    warnings.warn(
+        f"Message of length {len(data)} bytes exceeds the protocol maximum of {max_bytes} bytes."
+    )
+    return data[0 : _boundary(data, 0, max_bytes)].decode("utf-8")
+
+
+def segment(message, max_bytes, markers=False):
+    """
+    Split a message into segments of at most max_bytes of UTF-8 each.
+
+    Segments are broken at whitespace where possible, and whitespace at the
+    boundaries is dropped. Words longer than a segment are broken, but never in
+    the middle of a UTF-8 character. If markers is True, and there is more than
+    one segment, each segment ends with a part marker, e.g. " (1/3)", which is
+    counted against max_bytes.
+
+    Works on byte offsets in a single pass, so runs in time linear in the
+    length of the message.
+    """
+    if max_bytes < _MIN_MAX_BYTES:
+        raise ValueError(f"max_bytes must be at least {_MIN_MAX_BYTES}")
+
+    data = message.encode("utf-8")
+    spans = _spans(data, max_bytes)
+    if not markers or len(spans) <= 1:
+        return [data[s:e].decode("utf-8") for s, e in spans]
+
+    # Reserve room for the markers. More segments may need a wider marker,
+    # so repeat until the number of digits settles (at most a few times).
+    digits = 1
+    while True:
+        reserve = len(" (/)") + 2 * digits
+        if max_bytes - reserve < _MIN_MAX_BYTES:
+            raise ValueError("max_bytes is too small for part markers")
+        spans = _spans(data, max_bytes - reserve)
+        if len(str(len(spans))) <= digits:
+            break
+        digits = len(str(len(spans)))
+
+    total = len(spans)
+    return [
+        f"{data[s:e].decode('utf-8')} ({i + 1}/{total})"
+        for i, (s, e) in enumerate(spans)
+    ]
+
+
+def _spans(data, max_bytes):
+    """
+    Return the (start, end) byte offsets of each segment of data.
+    """
+    spans = list()
+    n = len(data)
+    start = _skip_whitespace(data, 0, n)
+    while start < n:
+        if n - start <= max_bytes:
+            end = _rstrip(data, start, n)
+            spans.append((start, end))
+            break
+
+        # Break at the last whitespace that fits (the byte just past the
+        # segment counts, since the whitespace itself is dropped)
+        limit = start + max_bytes
+        brk = max([data.rfind(w, start + 1, limit + 1) for w in _WHITESPACE_BYTES])
+        if brk > start:
+            end = _rstrip(data, start, brk)
+        else:
+            # No whitespace, so hard break the word
+            brk = end = _boundary(data, start, max_bytes)
+
+        spans.append((start, end))
+        start = _skip_whitespace(data, brk, n)
+    return spans
+
+
+def _boundary(data, start, max_bytes):
+    """
+    Return the largest offset, at most start + max_bytes, that does not split a character.
+    """
+    end = min(len(data), start + max_bytes)
+    # Continuation bytes look like 0b10xxxxxx
+    while end > start and end < len(data) and (data[end] & 0xC0) == 0x80:
+        end -= 1
+    return end
+
+
+def _skip_whitespace(data, i, n):
+    while i < n and data[i] in _WHITESPACE:
+        i += 1
+    return i
+
+
+def _rstrip(data, start, end):
+    while end > start and data[end - 1] in _WHITESPACE:
+        end -= 1
+    return end
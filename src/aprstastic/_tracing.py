@@ -0,0 +1,159 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import random
+import threading
+
+from collections import deque
+
+DEFAULT_TRACE_SAMPLE_RATE = 0.1  # Trace one message in ten
+DEFAULT_TRACE_WINDOW = 1000  # Percentiles are over the last 1000 traces of each kind
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+# Trace kinds
+UPLINK = "uplink"  # Mesh -> APRS-IS
+DOWNLINK = "downlink"  # APRS-IS -> mesh
+
+
+class Trace(object):
+    """
+    The timeline of one message through the gateway: a list of (stage, time)
+    stamps, relative to the first.
+
+    A trace can be handed between threads (e.g., to the APRS-IS transmit thread).
+    Each holder calls hold() when it takes the trace, and release() when done. The
+    trace is complete, and is reported to its tracer, when the last holder releases it.
+    """
+
+    __slots__ = ("kind", "stages", "_start", "_holds", "_tracer", "_lock")
+
+    def __init__(self, kind, tracer=None, stage=None):
+        self.kind = kind
+        self.stages = list()
+        self._start = time.perf_counter()
+        self._holds = 1
+        self._tracer = tracer
+        self._lock = threading.Lock()
+        if stage is not None:
+            self.stages.append((stage, 0.0))
+
+    def stamp(self, stage):
+        """
+        Record that the message reached the given stage, now.
+        """
+        self.stages.append((stage, time.perf_counter() - self._start))
+
+    def hold(self):
+        with self._lock:
+            self._holds += 1
+
+    def release(self):
+        with self._lock:
+            self._holds -= 1
+            done = self._holds == 0
+        if done and self._tracer is not None:
+            self._tracer._finish(self)
+
+    def to_dict(self):
+        return {"kind": self.kind, "stages": [[s, t] for s, t in self.stages]}
+
+
+class Tracer(object):
+    """
+    Samples messages for tracing, and aggregates completed traces into
+    per-stage latency percentiles.
+
+    For each kind of trace, the time from the first stamp to each later stage is
+    kept for the last 'window' traces, from which percentiles are computed on demand.
+    """
+
+    def __init__(
+        self,
+        sample_rate=DEFAULT_TRACE_SAMPLE_RATE,
+        window=DEFAULT_TRACE_WINDOW,
+        rng=None,
+    ):
+        super().__init__()
+        self._sample_rate = sample_rate
+        self._window = window
+        self._rng = rng if rng is not None else random.Random()
+        self._lock = threading.Lock()
+
+        # kind -> stage -> deque of latencies
+        self._latencies = dict()
+        self._completed = dict()
+        self._recent = deque(maxlen=20)
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    def start(self, kind, stage):
+        """
+        Start a trace, stamped at the given stage, or return None if this
+        message is not sampled.
+        """
+        if self._sample_rate <= 0 or self._rng.random() >= self._sample_rate:
+            return None
+        return Trace(kind, self, stage)
+
+    def _finish(self, trace):
+        with self._lock:
+            self._completed[trace.kind] = self._completed.get(trace.kind, 0) + 1
+            stages = self._latencies.setdefault(trace.kind, dict())
+            for stage, elapsed in trace.stages[1:]:
+                window = stages.get(stage)
+                if window is None:
+                    window = stages[stage] = deque(maxlen=self._window)
+                window.append(elapsed)
+            self._recent.append(trace)
+
+    def percentiles(self, kind=None, percentiles=DEFAULT_PERCENTILES):
+        """
+        Return {kind: {stage: {"count": n, "p50": seconds, ...}}}, for one kind or all.
+        """
+        with self._lock:
+            snapshot = {
+                k: {s: list(w) for s, w in stages.items()}
+                for k, stages in self._latencies.items()
+                if kind is None or k == kind
+            }
+
+        result = dict()
+        for k, stages in snapshot.items():
+            result[k] = dict()
+            for stage, values in stages.items():
+                values.sort()
+                summary = {"count": len(values)}
+                for p in percentiles:
+                    summary[f"p{p}"] = _percentile(values, p)
+                result[k][stage] = summary
+        return result
+
+    def recent(self):
+        """
+        Return the most recently completed traces.
+        """
+        with self._lock:
+            return [t.to_dict() for t in self._recent]
+
+    def summary(self):
+        with self._lock:
+            completed = dict(self._completed)
+        return {
+            "sample_rate": self._sample_rate,
+            "completed": completed,
+            "percentiles": self.percentiles(),
+            "recent": self.recent(),
+        }
+
+
+def _percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already-sorted list.
+    """
+    if len(sorted_values) == 0:
+        return None
+    rank = max(1, int(-(-p * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
@@ -0,0 +1,30 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+#
+# Local stand-ins for APRS-IS and Meshtastic, for testing the gateway
+# without a network connection or a radio.
+from ._aprsis_server import FakeAPRSISServer
+from ._mesh_interface import FakeMeshInterface, node_id, node_num
+from ._virtual_mesh import VirtualMesh
+from ._replay import ReplayHarness, load_traffic, synthetic_traffic
+from ._soak import SoakTest, aprs_traffic
+from ._lora import LoRaChannel, MODEM_PRESETS, airtime
+from ._airtime import AirtimeSimulator
+
+__all__ = [
+    "FakeAPRSISServer",
+    "FakeMeshInterface",
+    "VirtualMesh",
+    "ReplayHarness",
+    "SoakTest",
+    "AirtimeSimulator",
+    "LoRaChannel",
+    "MODEM_PRESETS",
+    "airtime",
+    "load_traffic",
+    "synthetic_traffic",
+    "aprs_traffic",
+    "node_id",
+    "node_num",
+]
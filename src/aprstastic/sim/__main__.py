@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import sys
+import json
+import logging
+import argparse
+
+from ._replay import ReplayHarness, load_traffic, synthetic_traffic, SIM_GATEWAY_ID
+from ._soak import (
+    SoakTest,
+    DEFAULT_SOAK_DURATION,
+    DEFAULT_REPORT_INTERVAL,
+    DEFAULT_APRS_RATE,
+    DEFAULT_APRS_NOISE,
+)
+from ._virtual_mesh import DEFAULT_POSITION_INTERVAL, DEFAULT_MESSAGE_INTERVAL
+from ._airtime import AirtimeSimulator
+from ._lora import (
+    MODEM_PRESETS,
+    DEFAULT_MODEM_PRESET,
+    DEFAULT_HOP_LIMIT,
+    DEFAULT_TX_QUEUE_SIZE,
+    DEFAULT_HIDDEN_FRACTION,
+)
+
+
+def _speed(value):
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive, or 'max'")
+    return speed
+
+
+def _add_traffic_arguments(parser):
+    parser.add_argument(
+        "--traffic",
+        default=None,
+        help="A traffic-*.jsonl.gz recording, or a directory of them. If omitted, traffic is synthesized.",
+    )
+    parser.add_argument(
+        "--gateway-id",
+        default=SIM_GATEWAY_ID,
+        help=f"The node id of the simulated gateway device. (Default: {SIM_GATEWAY_ID})",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=None,
+        help="Use this data directory (e.g., with a registration database), instead of an empty one.",
+    )
+    parser.add_argument("--devices", type=int, default=10, help="Synthetic devices.")
+    parser.add_argument(
+        "--messages", type=int, default=1000, help="Synthetic messages."
+    )
+    parser.add_argument(
+        "--rate", type=float, default=100.0, help="Synthetic messages per second."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic traffic seed.")
+    parser.add_argument(
+        "--verbose", action="store_true", help="Log the gateway's activity."
+    )
+
+
+def _load_events(args):
+    if args.traffic is not None:
+        return load_traffic(args.traffic)
+    return synthetic_traffic(
+        devices=args.devices,
+        messages=args.messages,
+        rate=args.rate,
+        seed=args.seed,
+        gateway_id=args.gateway_id,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m aprstastic.sim",
+        description="Run the gateway against simulated APRS-IS and Meshtastic endpoints.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay = commands.add_parser(
+        "replay",
+        help="Replay recorded (or synthetic) traffic through the gateway, and report its performance.",
+    )
+    replay.add_argument(
+        "--speed",
+        type=_speed,
+        default=1.0,
+        help="Replay speed: 1 for real time, N for N times faster, or 'max'. (Default: 1)",
+    )
+    _add_traffic_arguments(replay)
+
+    soak = commands.add_parser(
+        "soak",
+        help="Run the gateway for a long time against many virtual nodes, and steady APRS-IS traffic, reporting as it goes.",
+    )
+    soak.add_argument("--nodes", type=int, default=10, help="Virtual mesh nodes.")
+    soak.add_argument(
+        "--position-interval",
+        type=float,
+        default=DEFAULT_POSITION_INTERVAL,
+        help=f"Average seconds between each node's position reports. (Default: {DEFAULT_POSITION_INTERVAL})",
+    )
+    soak.add_argument(
+        "--message-interval",
+        type=float,
+        default=DEFAULT_MESSAGE_INTERVAL,
+        help=f"Average seconds between each node's direct messages. (Default: {DEFAULT_MESSAGE_INTERVAL})",
+    )
+    soak.add_argument(
+        "--aprs-rate",
+        type=float,
+        default=DEFAULT_APRS_RATE,
+        help=f"APRS-IS packets injected per second, before filtering. (Default: {DEFAULT_APRS_RATE})",
+    )
+    soak.add_argument(
+        "--aprs-noise",
+        type=float,
+        default=DEFAULT_APRS_NOISE,
+        help=f"Fraction of APRS-IS packets that the server should filter out. (Default: {DEFAULT_APRS_NOISE})",
+    )
+    soak.add_argument(
+        "--duration",
+        type=float,
+        default=DEFAULT_SOAK_DURATION,
+        help=f"Seconds to run. (Default: {DEFAULT_SOAK_DURATION})",
+    )
+    soak.add_argument(
+        "--report-interval",
+        type=float,
+        default=DEFAULT_REPORT_INTERVAL,
+        help=f"Seconds between reports, printed as JSON lines. (Default: {DEFAULT_REPORT_INTERVAL})",
+    )
+    soak.add_argument("--seed", type=int, default=0, help="Traffic seed.")
+    soak.add_argument(
+        "--verbose", action="store_true", help="Log the gateway's activity."
+    )
+
+    airtime = commands.add_parser(
+        "airtime",
+        help="Estimate the mesh channel utilization, queueing delay, and losses caused by recorded (or synthetic) traffic.",
+    )
+    airtime.add_argument(
+        "--preset",
+        choices=list(MODEM_PRESETS),
+        default=DEFAULT_MODEM_PRESET,
+        help=f"The Meshtastic modem preset. (Default: {DEFAULT_MODEM_PRESET})",
+    )
+    airtime.add_argument(
+        "--hop-limit",
+        type=int,
+        default=DEFAULT_HOP_LIMIT,
+        help=f"Times each packet is rebroadcast. (Default: {DEFAULT_HOP_LIMIT})",
+    )
+    airtime.add_argument(
+        "--relays-per-hop",
+        type=int,
+        default=1,
+        help="Nodes that rebroadcast each packet, at each hop. (Default: 1)",
+    )
+    airtime.add_argument(
+        "--tx-queue-size",
+        type=int,
+        default=DEFAULT_TX_QUEUE_SIZE,
+        help=f"Packets the gateway's radio queues before dropping. (Default: {DEFAULT_TX_QUEUE_SIZE})",
+    )
+    airtime.add_argument(
+        "--hidden-fraction",
+        type=float,
+        default=DEFAULT_HIDDEN_FRACTION,
+        help=f"Fraction of transmitters that can't hear others. (Default: {DEFAULT_HIDDEN_FRACTION})",
+    )
+    _add_traffic_arguments(airtime)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.ERROR)
+
+    config = dict()
+    if getattr(args, "data_dir", None) is not None:
+        config["data_dir"] = args.data_dir
+
+    if args.command == "replay":
+        harness = ReplayHarness(config, speed=args.speed, gateway_id=args.gateway_id)
+        print(json.dumps(harness.run(_load_events(args)), indent=4))
+    elif args.command == "airtime":
+        simulator = AirtimeSimulator(
+            config,
+            preset=args.preset,
+            hop_limit=args.hop_limit,
+            relays_per_hop=args.relays_per_hop,
+            tx_queue_size=args.tx_queue_size,
+            hidden_fraction=args.hidden_fraction,
+            gateway_id=args.gateway_id,
+            seed=args.seed,
+        )
+        print(json.dumps(simulator.run(_load_events(args)), indent=4))
+    elif args.command == "soak":
+        soak_test = SoakTest(
+            nodes=args.nodes,
+            position_interval=args.position_interval,
+            message_interval=args.message_interval,
+            aprs_rate=args.aprs_rate,
+            aprs_noise=args.aprs_noise,
+            duration=args.duration,
+            report_interval=args.report_interval,
+            seed=args.seed,
+        )
+        soak_test.run(on_report=lambda report: print(json.dumps(report), flush=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import shutil
+import logging
+import tempfile
+
+from .._gateway import Gateway
+from .._recorder import APRS_RX, MESH_RX
+from ._aprsis_server import FakeAPRSISServer
+from ._mesh_interface import FakeMeshInterface, BROADCAST_ID, node_num
+from ._replay import LOGIN_TIMEOUT, SIM_GATEWAY_ID, sim_gateway_config
+from ._lora import (
+    LoRaChannel,
+    NODE,
+    GATEWAY,
+    MESH_HEADER_BYTES,
+    POSITION_PAYLOAD_BYTES,
+    POLITE_CHANNEL_UTILIZATION,
+    DEFAULT_MODEM_PRESET,
+    DEFAULT_HOP_LIMIT,
+    DEFAULT_TX_QUEUE_SIZE,
+    DEFAULT_HIDDEN_FRACTION,
+    airtime,
+    text_packet_bytes,
+)
+
+logger = logging.getLogger("aprstastic")
+
+APRS_SETTLE_TIMEOUT = 0.05  # Seconds to wait for an injected line to reach the gateway
+MAX_KEPT = 1000  # Sent messages kept by the simulated interface
+
+
+class VirtualClockMeshInterface(FakeMeshInterface):
+    """
+    A FakeMeshInterface that stamps each message sent with the simulation's
+    virtual clock, rather than the wall clock.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.clock = 0.0
+
+    def sendText(self, text, destinationId=BROADCAST_ID, **kwargs):
+        packet = super().sendText(text, destinationId=destinationId, **kwargs)
+        packet["time"] = self.clock
+        return packet
+
+
+class AirtimeSimulator(object):
+    """
+    Estimates how much traffic a Meshtastic channel can carry through the gateway.
+
+    Traffic (recorded, or synthetic) is run through a real Gateway, as in the
+    ReplayHarness, so the gateway decides what to send over the air (message
+    segments, replies, relayed APRS messages). Everything transmitted (by mesh
+    nodes, and by the gateway) is then stamped with the traffic's own timeline,
+    and played through a LoRaChannel model of the modem preset, hops, and
+    collisions. The report gives channel utilization, the gateway's queueing
+    delay, and drop and collision rates.
+
+    The gateway runs as fast as it can, so its own timers (e.g., the position
+    governor's) see the traffic compressed in time.
+    """
+
+    def __init__(
+        self,
+        config=None,
+        preset=DEFAULT_MODEM_PRESET,
+        hop_limit=DEFAULT_HOP_LIMIT,
+        relays_per_hop=1,
+        tx_queue_size=DEFAULT_TX_QUEUE_SIZE,
+        hidden_fraction=DEFAULT_HIDDEN_FRACTION,
+        gateway_id=SIM_GATEWAY_ID,
+        seed=0,
+    ):
+        super().__init__()
+        self._config = dict(config or {})
+        self._gateway_id = gateway_id
+        self._channel = LoRaChannel(
+            preset=preset,
+            hop_limit=hop_limit,
+            relays_per_hop=relays_per_hop,
+            tx_queue_size=tx_queue_size,
+            hidden_fraction=hidden_fraction,
+            seed=seed,
+        )
+
+    def run(self, events):
+        """
+        Run the (time, source, data) events, and return a report.
+        """
+        temp_dir = tempfile.mkdtemp(prefix="aprstastic-airtime-")
+        server = FakeAPRSISServer(filtering=False).start()
+        interface = VirtualClockMeshInterface(
+            node_num(self._gateway_id), max_sent=MAX_KEPT
+        )
+        gateway = None
+        try:
+            config = sim_gateway_config(server, temp_dir)
+            config.update(self._config)
+            gateway = Gateway(config)
+            gateway.start(interface)
+            server.wait_for_clients(timeout=LOGIN_TIMEOUT)
+
+            packets = self._run_gateway(gateway, interface, server, events)
+        finally:
+            if gateway is not None:
+                gateway.close()
+            interface.close()
+            server.stop()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        duration = events[-1][0] if len(events) > 0 else 0.0
+        report = self._channel.simulate(packets, duration)
+        report["events"] = len(events)
+        report["polite_limit_exceeded"] = (
+            report["channel_utilization"] > POLITE_CHANNEL_UTILIZATION
+        )
+        return report
+
+    def _run_gateway(self, gateway, interface, server, events):
+        """
+        Run each event through the gateway, one at a time, and return everything
+        sent over the air, as (time, kind, size, ack) tuples.
+        """
+        packets = list()
+        for t, source, data in events:
+            sent_before = interface.sent_count
+            if source == MESH_RX:
+                size, ack = _mesh_packet_size(data)
+                if size is not None:
+                    packets.append((t, NODE, size, ack))
+                    # The gateway hears it once it has been transmitted
+                    interface.clock = t + airtime(size, self._channel.preset)
+                interface.receive(data)
+                gateway.tick()
+            elif source == APRS_RX:
+                interface.clock = t
+                self._deliver_aprs(gateway, server, data)
+
+            new = interface.sent_count - sent_before
+            for sent in interface.sent()[-new:] if new > 0 else []:
+                packets.append(
+                    (
+                        sent["time"],
+                        GATEWAY,
+                        text_packet_bytes(sent["text"]),
+                        sent["to"] != BROADCAST_ID,
+                    )
+                )
+        return packets
+
+    def _deliver_aprs(self, gateway, server, line):
+        """
+        Inject a line, and process it. (It is read on another thread, so wait for it.)
+        """
+        received = gateway.metrics.get("aprs_packets_received")
+        processed = sum(received.to_json().values())
+        server.inject(line)
+        deadline = time.monotonic() + APRS_SETTLE_TIMEOUT
+        while sum(received.to_json().values()) == processed:
+            if time.monotonic() > deadline:
+                # e.g., discarded as a duplicate
+                logger.debug("APRS-IS line was not processed: %s", line)
+                break
+            if gateway.backlog() == 0:
+                time.sleep(0.0001)
+            gateway.tick()
+
+
+def _mesh_packet_size(packet):
+    """
+    Estimate the on-air size of a received Meshtastic packet, and whether it is a
+    direct message that is acknowledged. Returns (None, False) if unknown.
+    """
+    decoded = packet.get("decoded", {})
+    portnum = decoded.get("portnum")
+    direct = (
+        packet.get("to") not in (None, 0xFFFFFFFF)
+        and packet.get("toId") != BROADCAST_ID
+    )
+    if portnum == "TEXT_MESSAGE_APP":
+        payload = decoded.get("payload", b"")
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        return text_packet_bytes(payload.decode("utf-8", errors="replace")), direct
+    if portnum == "POSITION_APP":
+        return MESH_HEADER_BYTES + POSITION_PAYLOAD_BYTES, False
+    return None, False
@@ -0,0 +1,369 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import re
+import time
+import socket
+import fnmatch
+import logging
+import threading
+import socketserver
+
+from collections import deque
+from aprslib.passcode import passcode
+
+from .._aprs_client import message_addressee
+
+logger = logging.getLogger("aprstastic")
+
+DEFAULT_KEEPALIVE_INTERVAL = 20  # Real servers send a keepalive every 20 seconds
+INJECTOR_MAX_SLEEP = 0.01  # Seconds. Injectors check if they were stopped this often
+
+
+class FakeAPRSISServer(object):
+    """
+    A minimal, local, APRS-IS server. It speaks enough of the protocol to exercise
+    APRSClient: the banner, login (with passcode verification), '#filter' commands,
+    and keepalives. Packets sent by clients are recorded, and packets can be injected
+    to all connected clients, once, or at a steady rate (see inject_at_rate).
+
+    Like a real (port 14580) server, injected packets are only delivered to the
+    clients whose filters match them. The group message ("g/") and buddy ("b/")
+    filters are supported, with wildcards, and exclusions ("-g/"). Other filter
+    types match nothing. With filtering=False, every client receives every packet
+    (e.g., to replay traffic recorded after a real server had already filtered it).
+
+    Pass port=0 to pick a free port, then read it back from the 'port' attribute.
+    A 'latency' (in seconds) delays the banner and the login response. At most
+    max_received packets from clients are kept (all of them, if None).
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        name="SIM",
+        latency=0.0,
+        keepalive_interval=DEFAULT_KEEPALIVE_INTERVAL,
+        filtering=True,
+        max_received=None,
+    ):
+        super().__init__()
+        self.name = name
+        self.latency = latency
+        self.keepalive_interval = keepalive_interval
+        self.filtering = filtering
+
+        self._lock = threading.Lock()
+        self._clients = list()
+        self._received = deque(maxlen=max_received)
+        self._received_count = 0
+        self._injected = 0
+        self._delivered = 0
+        self._filtered = 0
+        self._injectors = list()
+        self._stopped = threading.Event()
+
+        server = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server._handle(self)
+
+        self._server = socketserver.ThreadingTCPServer(
+            (host, port), _Handler, bind_and_activate=False
+        )
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self.host, self.port = self._server.server_address[0:2]
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._keepalive_thread = threading.Thread(
+            target=self._keepalive_thread_body, daemon=True
+        )
+
+    @property
+    def address(self):
+        """
+        The server address, in the "host:port" form used by the gateway's configuration.
+        """
+        return f"{self.host}:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        self._keepalive_thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop accepting connections, and drop all connected clients.
+        """
+        self._stopped.set()
+        for injector in self._injectors:
+            injector.stop()
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_clients()
+
+    def drop_clients(self):
+        """
+        Abruptly disconnect all clients (e.g., to simulate a server failure).
+        """
+        with self._lock:
+            clients = list(self._clients)
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def inject(self, line):
+        """
+        Send a raw packet to every logged in client whose filters match it.
+        """
+        delivered = 0
+        clients = self.clients()
+        for client in clients:
+            if not self.filtering or client.accepts(line):
+                client.send(line)
+                delivered += 1
+        with self._lock:
+            self._injected += 1
+            self._delivered += delivered
+            self._filtered += len(clients) - delivered
+
+    def inject_at_rate(self, lines, rate, count=None):
+        """
+        Inject packets from an iterable (which may be endless, e.g., a generator)
+        at a steady rate (per second), from a background thread, until the lines
+        run out, count packets have been injected, or stop() is called on the
+        returned injector.
+        """
+        injector = _RateInjector(self, lines, rate, count)
+        with self._lock:
+            self._injectors = [i for i in self._injectors if i.running]
+            self._injectors.append(injector)
+        return injector.start()
+
+    def wait_for_clients(self, count=1, timeout=10):
+        """
+        Wait until at least count clients have logged in.
+        """
+        deadline = time.monotonic() + timeout
+        while len(self.clients()) < count:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Expected {count} client(s) to log in to the simulated APRS-IS"
+                )
+            time.sleep(0.01)
+
+    def clients(self):
+        with self._lock:
+            return [c for c in self._clients if c.logged_in]
+
+    def received(self):
+        """
+        Return the list of packets received from clients, so far.
+        """
+        with self._lock:
+            return list(self._received)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clients": sum(1 for c in self._clients if c.logged_in),
+                "received": self._received_count,
+                "injected": self._injected,
+                "delivered": self._delivered,
+                "filtered": self._filtered,
+            }
+
+    def _handle(self, handler):
+        client = _FakeClient(handler.connection)
+        with self._lock:
+            self._clients.append(client)
+        try:
+            time.sleep(self.latency)
+            client.send(f"# aprstastic-sim {self.name}")
+            for raw in handler.rfile:
+                if self._stopped.is_set() or client.closed:
+                    break
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if not client.logged_in:
+                    self._login(client, line)
+                elif line.startswith("#filter"):
+                    client.set_filters(line[len("#filter") :].strip())
+                    client.send(f"# filter {client.filters} active")
+                elif line.startswith("#"):
+                    pass
+                elif line != "" and client.verified:
+                    # (Like real servers, packets from unverified clients are dropped)
+                    with self._lock:
+                        self._received.append(line)
+                        self._received_count += 1
+        except OSError:
+            pass
+        finally:
+            client.close()
+            with self._lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+
+    def _login(self, client, line):
+        # user CALL pass CODE vers SOFTWARE VERSION [filter FILTER]
+        parts = line.split()
+        if len(parts) < 4 or parts[0] != "user" or parts[2] != "pass":
+            client.send("# invalid login")
+            return
+        call_sign = parts[1]
+        if "filter" in parts:
+            client.set_filters(" ".join(parts[parts.index("filter") + 1 :]))
+        verified = parts[3] == str(passcode(call_sign))
+        time.sleep(self.latency)
+        client.call_sign = call_sign
+        client.verified = verified
+        client.logged_in = True
+        client.send(
+            f"# logresp {call_sign} {'verified' if verified else 'unverified'}, server {self.name}"
+        )
+
+    def _keepalive_thread_body(self):
+        while not self._stopped.wait(self.keepalive_interval):
+            for client in self.clients():
+                client.send(f"# aprstastic-sim {self.name} keepalive")
+
+
+class _FakeClient(object):
+    def __init__(self, sock):
+        super().__init__()
+        self._sock = sock
+        self._send_lock = threading.Lock()
+        self.closed = False
+        self.logged_in = False
+        self.verified = False
+        self.call_sign = None
+        self.filters = None
+        self._matchers = list()
+
+    def set_filters(self, filters):
+        """
+        Set (and compile) the client's filters, e.g., "g/N0CALL*/K1ABC b/W1AW".
+        """
+        self.filters = filters
+        self._matchers = _compile_filters(filters)
+
+    def accepts(self, line):
+        """
+        Return True if the client's filters match the packet.
+        """
+        if len(self._matchers) == 0:
+            return False
+        source = line[0 : line.find(">")].upper()
+        addressee = None
+        accepted = False
+        for exclude, kind, pattern in self._matchers:
+            if kind == "g":
+                if addressee is None:
+                    addressee = message_addressee(line) or ""
+                matched = pattern.match(addressee) is not None
+            else:
+                matched = pattern.match(source) is not None
+            if matched:
+                if exclude:
+                    return False
+                accepted = True
+        return accepted
+
+    def send(self, line):
+        try:
+            with self._send_lock:
+                self._sock.sendall((line.rstrip("\r\n") + "\r\n").encode("utf-8"))
+        except OSError:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+class _RateInjector(object):
+    """
+    Injects lines into a FakeAPRSISServer at a steady rate. Lines that fall
+    behind schedule are sent in a burst, so the average rate holds.
+    """
+
+    def __init__(self, server, lines, rate, count=None):
+        super().__init__()
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._server = server
+        self._lines = iter(lines)
+        self._rate = rate
+        self._count = count
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._thread_body, daemon=True)
+        self.sent = 0
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _thread_body(self):
+        start = time.monotonic()
+        while not self._stop.is_set():
+            due = int((time.monotonic() - start) * self._rate) + 1
+            if self._count is not None:
+                due = min(due, self._count)
+            while self.sent < due:
+                try:
+                    line = next(self._lines)
+                except StopIteration:
+                    return
+                self._server.inject(line)
+                self.sent += 1
+            if self._count is not None and self.sent >= self._count:
+                return
+            wait = start + self.sent / self._rate - time.monotonic()
+            if wait > 0:
+                self._stop.wait(min(wait, INJECTOR_MAX_SLEEP))
+
+
+def _compile_filters(filters):
+    """
+    Compile the supported terms of an APRS-IS filter string into a list of
+    (exclude, kind, pattern) tuples. Patterns match upper case call signs.
+    """
+    matchers = list()
+    for term in (filters or "").split():
+        exclude = term.startswith("-")
+        if exclude:
+            term = term[1:]
+        kind, _, args = term.partition("/")
+        if kind not in ("g", "b") or args == "":
+            logger.debug("Simulated APRS-IS ignoring unsupported filter: %s", term)
+            continue
+        pattern = re.compile(
+            "|".join(
+                fnmatch.translate(call_sign.upper())
+                for call_sign in args.split("/")
+                if call_sign != ""
+            )
+        )
+        matchers.append((exclude, kind, pattern))
+    return matchers
@@ -0,0 +1,294 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import math
+import heapq
+import random
+
+from collections import deque
+
+from .._tracing import _percentile
+
+# Meshtastic modem presets: (spreading factor, bandwidth in Hz, coding rate 4/N)
+MODEM_PRESETS = {
+    "SHORT_TURBO": (7, 500000, 5),
+    "SHORT_FAST": (7, 250000, 5),
+    "SHORT_SLOW": (8, 250000, 5),
+    "MEDIUM_FAST": (9, 250000, 5),
+    "MEDIUM_SLOW": (10, 250000, 5),
+    "LONG_FAST": (11, 250000, 5),
+    "LONG_MODERATE": (11, 125000, 8),
+    "LONG_SLOW": (12, 125000, 8),
+    "VERY_LONG_SLOW": (12, 62500, 8),
+}
+DEFAULT_MODEM_PRESET = "LONG_FAST"
+
+PREAMBLE_SYMBOLS = 16  # Meshtastic's preamble length
+MESH_HEADER_BYTES = 16  # The unencrypted packet header: to, from, id, flags, ...
+DATA_OVERHEAD_BYTES = 4  # Protobuf tags and lengths around a text payload
+POSITION_PAYLOAD_BYTES = 30  # A typical encoded position report
+ACK_PAYLOAD_BYTES = 11  # A routing (ack) packet's payload
+
+DEFAULT_HOP_LIMIT = 3
+DEFAULT_TX_QUEUE_SIZE = 16  # Packets the gateway's radio will queue before dropping
+DEFAULT_HIDDEN_FRACTION = 0.1  # Transmitters that can't hear the channel is busy
+CAD_SYMBOLS = 2  # Symbols before a transmission can be detected (channel activity)
+SLOT_SYMBOLS = 2.5  # Contention window slot length
+CONTENTION_WINDOW = 32  # Slots
+POLITE_CHANNEL_UTILIZATION = 0.25  # Nodes start holding back above this
+
+# Transmission kinds
+NODE = "node"  # Packets originated by mesh nodes
+GATEWAY = "gateway"  # Packets sent by the gateway
+RELAY = "relay"  # Rebroadcasts by relaying nodes
+ACK = "ack"  # Acknowledgements of direct messages
+KINDS = [NODE, GATEWAY, RELAY, ACK]
+
+
+def airtime(payload_bytes, preset=DEFAULT_MODEM_PRESET):
+    """
+    Time on air (in seconds) of a LoRa packet with the given payload, using
+    Semtech's formula, with an explicit header and CRC, as Meshtastic does.
+    """
+    sf, bw, cr = MODEM_PRESETS[preset]
+    symbol_time = (2**sf) / bw
+    low_data_rate = 1 if symbol_time > 0.016 else 0
+    payload_symbols = 8 + max(
+        math.ceil(
+            (8 * payload_bytes - 4 * sf + 28 + 16) / (4 * (sf - 2 * low_data_rate))
+        )
+        * cr,
+        0,
+    )
+    return (PREAMBLE_SYMBOLS + 4.25 + payload_symbols) * symbol_time
+
+
+def text_packet_bytes(text):
+    """
+    On-air size of a Meshtastic text message.
+    """
+    return MESH_HEADER_BYTES + DATA_OVERHEAD_BYTES + len(text.encode("utf-8"))
+
+
+class LoRaChannel(object):
+    """
+    A discrete-event model of a single Meshtastic channel, shared by every node.
+
+    Transmitters listen before talking: if the channel is busy, they wait until
+    it is clear, plus a random number of contention window slots. A transmission
+    is only detectable CAD_SYMBOLS after it starts, so transmitters that choose
+    nearly the same moment collide, as do 'hidden' transmitters (a fraction,
+    chosen at random) that can't hear the others at all. Overlapping
+    transmissions are both lost.
+
+    Each transmission received intact is rebroadcast by relays_per_hop nodes,
+    up to the hop limit, and direct messages are acknowledged by their
+    recipient (once the first transmission is received).
+
+    The gateway has one radio, with a bounded transmit queue: packets sent
+    while it is full are dropped. Everyone else transmits independently.
+    """
+
+    def __init__(
+        self,
+        preset=DEFAULT_MODEM_PRESET,
+        hop_limit=DEFAULT_HOP_LIMIT,
+        relays_per_hop=1,
+        tx_queue_size=DEFAULT_TX_QUEUE_SIZE,
+        hidden_fraction=DEFAULT_HIDDEN_FRACTION,
+        seed=0,
+    ):
+        super().__init__()
+        if preset not in MODEM_PRESETS:
+            raise ValueError(
+                f"Unknown modem preset '{preset}'. Expected one of: {list(MODEM_PRESETS)}"
+            )
+        self.preset = preset
+        self._hop_limit = hop_limit
+        self._relays_per_hop = relays_per_hop
+        self._tx_queue_size = tx_queue_size
+        self._hidden_fraction = hidden_fraction
+        self._seed = seed
+
+        sf, bw, _ = MODEM_PRESETS[preset]
+        symbol_time = (2**sf) / bw
+        self._cad_time = CAD_SYMBOLS * symbol_time
+        self._slot_time = SLOT_SYMBOLS * symbol_time
+
+    def simulate(self, packets, duration=None):
+        """
+        Simulate the transmission of packets: a list of (time, kind, size, ack)
+        tuples, where kind is NODE or GATEWAY, size is in bytes, and ack is True
+        for direct messages that the recipient acknowledges. Returns a report.
+        """
+        self._rng = random.Random(self._seed)
+        self._events = list()
+        self._sequence = 0
+        self._active = list()  # Transmissions on the air
+        self._busy = list()  # (start, end) of every transmission
+        self._gateway_queue = deque()
+        self._gateway_busy = False
+        self._counts = {k: 0 for k in KINDS}
+        self._airtime = {k: 0.0 for k in KINDS}
+        self._collided = {k: 0 for k in KINDS}
+        self._gateway_offered = 0
+        self._gateway_dropped = 0
+        self._queueing_delays = list()
+
+        for t, kind, size, ack in packets:
+            self._push(t, "ready", _Transmission(kind, size, 0, ack, t))
+
+        while len(self._events) > 0:
+            t, _, event, tx = heapq.heappop(self._events)
+            if event == "ready":
+                self._ready(t, tx)
+            elif event == "attempt":
+                self._attempt(t, tx)
+            else:
+                self._end(t, tx)
+
+        end = max([e for _, e in self._busy] + [t for t, _, _, _ in packets] + [0])
+        if duration is None or duration < end:
+            duration = end
+        return self._report(duration)
+
+    def _push(self, t, event, tx):
+        self._sequence += 1
+        heapq.heappush(self._events, (t, self._sequence, event, tx))
+
+    def _backoff(self):
+        return self._rng.randrange(0, CONTENTION_WINDOW) * self._slot_time
+
+    def _ready(self, t, tx):
+        if tx.kind != GATEWAY:
+            self._push(t, "attempt", tx)
+            return
+
+        # The gateway transmits one packet at a time, from its queue
+        self._gateway_offered += 1
+        if not self._gateway_busy:
+            self._gateway_busy = True
+            self._push(t, "attempt", tx)
+        elif len(self._gateway_queue) >= self._tx_queue_size:
+            self._gateway_dropped += 1
+        else:
+            self._gateway_queue.append(tx)
+
+    def _attempt(self, t, tx):
+        if tx.hidden is None:
+            tx.hidden = self._rng.random() < self._hidden_fraction
+
+        # Listen before talking
+        self._active = [a for a in self._active if a.end > t]
+        if not tx.hidden:
+            sensed = [a.end for a in self._active if t >= a.start + self._cad_time]
+            if len(sensed) > 0:
+                self._push(max(sensed) + self._backoff(), "attempt", tx)
+                return
+
+        tx.start = t
+        tx.end = t + airtime(tx.size, self.preset)
+        for other in self._active:
+            other.collided = tx.collided = True
+        self._active.append(tx)
+        self._busy.append((tx.start, tx.end))
+        self._counts[tx.kind] += 1
+        self._airtime[tx.kind] += tx.end - tx.start
+        if tx.kind == GATEWAY:
+            self._queueing_delays.append(tx.start - tx.ready)
+        self._push(tx.end, "end", tx)
+
+    def _end(self, t, tx):
+        if tx.kind == GATEWAY:
+            if len(self._gateway_queue) > 0:
+                self._push(t, "attempt", self._gateway_queue.popleft())
+            else:
+                self._gateway_busy = False
+
+        if tx.collided:
+            self._collided[tx.kind] += 1
+            return
+
+        if tx.hop < self._hop_limit:
+            for _ in range(0, self._relays_per_hop):
+                relay = _Transmission(RELAY, tx.size, tx.hop + 1, False, t)
+                self._push(t + self._backoff(), "attempt", relay)
+        if tx.ack:
+            ack = _Transmission(ACK, MESH_HEADER_BYTES + ACK_PAYLOAD_BYTES, 0, False, t)
+            self._push(t + self._backoff(), "attempt", ack)
+
+    def _report(self, duration):
+        delays = sorted(self._queueing_delays)
+        total = sum(self._counts.values())
+        gateway_lost = self._gateway_dropped + self._collided[GATEWAY]
+        return {
+            "preset": self.preset,
+            "hop_limit": self._hop_limit,
+            "duration_seconds": round(duration, 3),
+            "channel_utilization": _busy_time(self._busy) / duration
+            if duration > 0
+            else 0.0,
+            "transmissions": dict(self._counts),
+            "airtime_seconds": {k: round(v, 3) for k, v in self._airtime.items()},
+            "collisions": dict(self._collided),
+            "collision_rate": sum(self._collided.values()) / total
+            if total > 0
+            else 0.0,
+            "gateway": {
+                "offered": self._gateway_offered,
+                "dropped": self._gateway_dropped,
+                "collided": self._collided[GATEWAY],
+                "drop_rate": gateway_lost / self._gateway_offered
+                if self._gateway_offered > 0
+                else 0.0,
+                "queueing_delay": {
+                    "p50": _percentile(delays, 50),
+                    "p90": _percentile(delays, 90),
+                    "p99": _percentile(delays, 99),
+                    "max": delays[-1] if len(delays) > 0 else None,
+                },
+            },
+        }
+
+
+class _Transmission(object):
+    __slots__ = [
+        "kind",
+        "size",
+        "hop",
+        "ack",
+        "ready",
+        "hidden",
+        "start",
+        "end",
+        "collided",
+    ]
+
+    def __init__(self, kind, size, hop, ack, ready):
+        self.kind = kind
+        self.size = size
+        self.hop = hop
+        self.ack = ack
+        self.ready = ready
+        self.hidden = None
+        self.start = None
+        self.end = None
+        self.collided = False
+
+
+def _busy_time(intervals):
+    """
+    Total length of the union of (start, end) intervals.
+    """
+    busy = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                busy += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        busy += current_end - current_start
+    return busy
@@ -0,0 +1,197 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import logging
+import threading
+
+from collections import deque
+
+import pubsub.pub
+
+logger = logging.getLogger("aprstastic")
+
+MESHTASTIC_RECEIVE_TOPIC = "meshtastic.receive"
+BROADCAST_ID = "^all"
+
+SIM_GATEWAY_NODE_NUM = 0x5A5A0001  # The simulated gateway device: !5a5a0001
+SIM_DEVICE_NODE_NUM = 0x5A5A1000  # Simulated devices are numbered from here
+
+
+class FakeMeshInterface(object):
+    """
+    A stand-in for a Meshtastic StreamInterface. It implements the parts of the
+    interface used by the gateway (getMyNodeInfo, nodesByNum, sendText, and the
+    stream's is_open), and publishes received packets on "meshtastic.receive",
+    as the real interface does.
+
+    Text messages sent by the gateway are recorded, and can be read back with
+    sent(). At most max_sent are kept (all of them, if None), but all are counted.
+    """
+
+    def __init__(self, node_num=SIM_GATEWAY_NODE_NUM, position=None, max_sent=None):
+        super().__init__()
+        self.node_num = node_num
+        self.node_id = node_id(node_num)
+        self.nodesByNum = dict()
+        self.stream = _FakeStream()
+
+        self._lock = threading.Lock()
+        self._sent = deque(maxlen=max_sent)
+        self._next_packet_id = 1
+        self.sent_count = 0
+
+        self.add_node(node_num, long_name="aprstastic sim", position=position)
+
+    def add_node(self, num, long_name=None, last_heard=None, position=None):
+        """
+        Add a node to the node database, as if it had been heard earlier.
+        """
+        node = {
+            "num": num,
+            "user": {
+                "id": node_id(num),
+                "longName": long_name or f"Node {num:08x}",
+                "shortName": f"{num & 0xFFFF:04x}",
+            },
+        }
+        if last_heard is not None:
+            node["lastHeard"] = last_heard
+        if position is not None:
+            node["position"] = dict(position)
+        self.nodesByNum[num] = node
+        return node
+
+    def getMyNodeInfo(self):
+        return self.nodesByNum[self.node_num]
+
+    def sendText(
+        self,
+        text,
+        destinationId=BROADCAST_ID,
+        wantAck=False,
+        wantResponse=False,
+        onResponse=None,
+        channelIndex=0,
+        **kwargs,
+    ):
+        with self._lock:
+            packet = {
+                "id": self._next_packet_id,
+                "time": time.monotonic(),
+                "to": destinationId,
+                "text": text,
+                "channel": channelIndex,
+                "wantAck": wantAck,
+            }
+            self._next_packet_id += 1
+            self._sent.append(packet)
+            self.sent_count += 1
+        return packet
+
+    def sent(self):
+        """
+        Return the text messages sent so far, as dictionaries.
+        """
+        with self._lock:
+            return list(self._sent)
+
+    def receive(self, packet):
+        """
+        Deliver a packet (dictionary) as if it was received over the air. The
+        'fromId' and 'toId' fields are filled in from 'from' and 'to', if missing.
+        """
+        packet = dict(packet)
+        if "fromId" not in packet and "from" in packet:
+            packet["fromId"] = node_id(packet["from"])
+        if "toId" not in packet and "to" in packet:
+            packet["toId"] = (
+                BROADCAST_ID if packet["to"] == 0xFFFFFFFF else node_id(packet["to"])
+            )
+        packet.setdefault("rxTime", int(time.time()))
+
+        # Update the node database, like the real interface
+        if packet.get("from") is not None:
+            node = self.nodesByNum.get(packet["from"])
+            if node is None:
+                node = self.add_node(packet["from"])
+            node["lastHeard"] = packet["rxTime"]
+
+        pubsub.pub.sendMessage(MESHTASTIC_RECEIVE_TOPIC, packet=packet, interface=self)
+
+    def receive_text(self, from_id, text, to_id=None, channel=0):
+        """
+        Deliver a text message from a node (by id, e.g., "!00000001"). Messages
+        are sent to the gateway, unless another to_id is given.
+        """
+        self.receive(
+            {
+                "from": node_num(from_id),
+                "to": node_num(self.node_id if to_id is None else to_id),
+                "channel": channel,
+                "decoded": {
+                    "portnum": "TEXT_MESSAGE_APP",
+                    "payload": text.encode("utf-8"),
+                    "text": text,
+                },
+            }
+        )
+
+    def receive_position(
+        self, from_id, lat, lon, altitude=None, ground_speed=None, ground_track=None
+    ):
+        """
+        Deliver a position report from a node. ground_speed is in m/s, and
+        ground_track in degrees, which are converted to Meshtastic's units.
+        """
+        position = {
+            "latitude": lat,
+            "longitude": lon,
+            "latitudeI": int(lat * 1e7),
+            "longitudeI": int(lon * 1e7),
+            "time": int(time.time()),
+        }
+        if altitude is not None:
+            position["altitude"] = altitude
+        if ground_speed is not None:
+            position["groundSpeed"] = ground_speed
+        if ground_track is not None:
+            position["groundTrack"] = int(ground_track * 1e5)
+        self.receive(
+            {
+                "from": node_num(from_id),
+                "to": 0xFFFFFFFF,
+                "decoded": {"portnum": "POSITION_APP", "position": position},
+            }
+        )
+
+    def close(self):
+        self.stream.is_open = False
+
+
+class _FakeStream(object):
+    def __init__(self):
+        self.is_open = True
+
+
+def sim_call_sign(i):
+    """
+    The call sign registered by the i-th simulated device, e.g., 0 -> "SIM0000-1"
+    """
+    return f"SIM{i:04d}-{1 + i % 15}"
+
+
+def node_id(num):
+    """
+    Format a node number as a node id, e.g., 1 -> "!00000001"
+    """
+    return f"!{num:08x}"
+
+
+def node_num(node_id):
+    """
+    Parse a node id, e.g., "!00000001" -> 1
+    """
+    if node_id == BROADCAST_ID:
+        return 0xFFFFFFFF
+    return int(node_id.lstrip("!"), 16)
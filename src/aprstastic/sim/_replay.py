@@ -0,0 +1,318 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import gzip
+import json
+import time
+import base64
+import random
+import shutil
+import logging
+import tempfile
+
+from aprslib.passcode import passcode
+
+from .._gateway import Gateway
+from .._recorder import (
+    APRS_RX,
+    MESH_RX,
+    TRAFFIC_FILE_PREFIX,
+    TRAFFIC_FILE_SUFFIX,
+)
+from ._aprsis_server import FakeAPRSISServer
+from ._mesh_interface import (
+    FakeMeshInterface,
+    SIM_DEVICE_NODE_NUM,
+    SIM_GATEWAY_NODE_NUM,
+    node_id,
+    node_num,
+    sim_call_sign,
+)
+
+logger = logging.getLogger("aprstastic")
+
+SIM_GATEWAY_CALL_SIGN = "N0CALL-10"
+SIM_GATEWAY_ID = node_id(SIM_GATEWAY_NODE_NUM)
+
+DEFAULT_DRAIN_TIMEOUT = 10  # Seconds to wait for the gateway to catch up
+MAX_QUEUED_PACKETS = 100  # At max speed, don't run further ahead of the gateway
+QUIET_PERIOD = 0.25  # Seconds without activity before the gateway is considered idle
+LOGIN_TIMEOUT = 10
+
+
+def load_traffic(path):
+    """
+    Load the inputs (APRS-IS lines and Meshtastic packets received) from a
+    traffic recording: one traffic-*.jsonl.gz file, or a directory of them.
+    Returns a list of (time, source, data) events, with times relative to the first.
+    """
+    if os.path.isdir(path):
+        paths = [
+            os.path.join(path, f)
+            for f in sorted(os.listdir(path))
+            if f.startswith(TRAFFIC_FILE_PREFIX) and f.endswith(TRAFFIC_FILE_SUFFIX)
+        ]
+    else:
+        paths = [path]
+
+    events = list()
+    for p in paths:
+        with gzip.open(p, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                entry = json.loads(line)
+                source = entry.get("src")
+                if source == APRS_RX:
+                    events.append((entry["t"], source, entry["data"]))
+                elif source == MESH_RX:
+                    events.append((entry["t"], source, _restore_payload(entry["data"])))
+
+    events.sort(key=lambda e: e[0])
+    if len(events) > 0:
+        t0 = events[0][0]
+        events = [(t - t0, source, data) for t, source, data in events]
+    return events
+
+
+def synthetic_traffic(
+    devices=10, messages=1000, rate=100.0, seed=0, gateway_id=SIM_GATEWAY_ID
+):
+    """
+    Generate a deterministic (for a given seed) mix of traffic. Each device
+    first registers a call sign, then messages arrive at the given rate (per
+    second): text messages from the mesh to APRS, position reports, and APRS
+    messages to the registered call signs.
+    """
+    rng = random.Random(seed)
+    gateway_num = node_num(gateway_id)
+    interval = 1.0 / rate
+    events = list()
+
+    nodes = [SIM_DEVICE_NODE_NUM + i for i in range(0, devices)]
+    call_signs = [sim_call_sign(i) for i in range(0, devices)]
+    positions = [
+        [47.6 + rng.uniform(-0.2, 0.2), -122.3 + rng.uniform(-0.2, 0.2)]
+        for _ in range(0, devices)
+    ]
+
+    t = 0.0
+    for num, call_sign in zip(nodes, call_signs):
+        events.append(
+            (t, MESH_RX, _text_packet(num, gateway_num, f"!register {call_sign}"))
+        )
+        t += interval
+
+    for k in range(0, messages):
+        i = rng.randrange(0, devices)
+        r = rng.random()
+        if r < 0.4:
+            text = f"K{rng.randrange(0, 10)}ABC-7: hello {k}"
+            events.append((t, MESH_RX, _text_packet(nodes[i], gateway_num, text)))
+        elif r < 0.6:
+            positions[i][0] += rng.uniform(-0.01, 0.01)
+            positions[i][1] += rng.uniform(-0.01, 0.01)
+            events.append(
+                (
+                    t,
+                    MESH_RX,
+                    _position_packet(nodes[i], positions[i][0], positions[i][1]),
+                )
+            )
+        else:
+            line = f"K{rng.randrange(0, 10)}ABC-7>APRS,TCPIP*::{call_signs[i]:<9}:hi {k}{{{k % 1000}"
+            events.append((t, APRS_RX, line))
+        t += interval
+    return events
+
+
+class ReplayHarness(object):
+    """
+    Drives a Gateway, in-process, with recorded or synthetic traffic, using a
+    FakeMeshInterface and a local FakeAPRSISServer, and reports throughput,
+    per-stage latency percentiles (from tracing every message), and CPU time.
+
+    Events are delivered on their original schedule, scaled by speed (e.g., 2.0
+    is twice as fast). If speed is None, events are delivered as fast as the
+    gateway can process them. The harness calls Gateway.tick() itself, without
+    the main loop's sleep.
+
+    Options in config override the harness defaults. Unless given, the data and
+    logs directories are temporary, and removed afterwards.
+    """
+
+    def __init__(
+        self,
+        config=None,
+        speed=1.0,
+        gateway_id=SIM_GATEWAY_ID,
+        drain_timeout=DEFAULT_DRAIN_TIMEOUT,
+    ):
+        super().__init__()
+        self._config = dict(config or {})
+        self._speed = speed
+        self._gateway_id = gateway_id
+        self._drain_timeout = drain_timeout
+
+    def run(self, events):
+        """
+        Replay the (time, source, data) events, and return a report.
+        """
+        temp_dir = tempfile.mkdtemp(prefix="aprstastic-replay-")
+
+        # Recorded traffic was already filtered by the real server
+        server = FakeAPRSISServer(filtering=False).start()
+        interface = FakeMeshInterface(node_num(self._gateway_id))
+        gateway = None
+        try:
+            config = sim_gateway_config(server, temp_dir)
+            config["tracing"] = {"sample_rate": 1.0}
+            config.update(self._config)
+
+            gateway = Gateway(config)
+            gateway.start(interface)
+            server.wait_for_clients(timeout=LOGIN_TIMEOUT)
+            return self._replay(gateway, interface, server, events)
+        finally:
+            if gateway is not None:
+                gateway.close()
+            interface.close()
+            server.stop()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _replay(self, gateway, interface, server, events):
+        mesh_in = sum(1 for e in events if e[1] == MESH_RX)
+        aprs_in = len(events) - mesh_in
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        i = 0
+        while i < len(events):
+            # Deliver the events that are due
+            if self._speed is None:
+                while i < len(events) and gateway.backlog() < MAX_QUEUED_PACKETS:
+                    self._deliver(interface, server, events[i])
+                    i += 1
+            else:
+                elapsed = (time.perf_counter() - start) * self._speed
+                while i < len(events) and events[i][0] <= elapsed:
+                    self._deliver(interface, server, events[i])
+                    i += 1
+
+            gateway.tick()
+
+            # Nothing to do until the next event
+            if self._speed is not None and i < len(events) and gateway.backlog() == 0:
+                wait = events[i][0] / self._speed - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(min(wait, 0.001))
+
+        # Let the gateway catch up. (Lines in flight from the APRS-IS server
+        # aren't in any queue yet, so wait for a quiet period.)
+        end, cpu_end = time.perf_counter(), time.process_time()
+        idle_since = None
+        deadline = end + self._drain_timeout
+        while time.perf_counter() < deadline:
+            gateway.tick()
+            now = time.perf_counter()
+            if gateway.backlog() > 0:
+                idle_since = None
+                end, cpu_end = now, time.process_time()
+            elif idle_since is None:
+                idle_since = end = now
+                cpu_end = time.process_time()
+            elif now - idle_since > QUIET_PERIOD:
+                break
+            else:
+                time.sleep(0.001)
+        elapsed = end - start
+        cpu = cpu_end - cpu_start
+
+        metrics = gateway.metrics.to_json()
+        mesh_processed = sum(metrics["mesh_packets_received"].values())
+        aprs_processed = sum(metrics["aprs_packets_received"].values())
+        processed = mesh_processed + aprs_processed
+        return {
+            "speed": "max" if self._speed is None else self._speed,
+            "events": len(events),
+            "mesh_received": mesh_in,
+            "aprs_received": aprs_in,
+            "mesh_processed": mesh_processed,
+            "aprs_processed": aprs_processed,
+            "mesh_sent": len(interface.sent()),
+            "aprs_sent": len(server.received()),
+            "elapsed_seconds": elapsed,
+            "throughput": processed / elapsed if elapsed > 0 else None,
+            "cpu_seconds": cpu,
+            "cpu_per_packet_ms": 1000 * cpu / processed if processed > 0 else None,
+            "latency": gateway.stats()["latency"],
+        }
+
+    def _deliver(self, interface, server, event):
+        _, source, data = event
+        if source == MESH_RX:
+            interface.receive(data)
+        elif source == APRS_RX:
+            server.inject(data)
+
+
+def sim_gateway_config(server, temp_dir):
+    """
+    The configuration of a gateway connected to a simulated APRS-IS server,
+    with its data and logs directories in temp_dir.
+    """
+    config = {
+        "call_sign": SIM_GATEWAY_CALL_SIGN,
+        "aprsis_passcode": str(passcode(SIM_GATEWAY_CALL_SIGN)),
+        "aprsis_servers": [server.address],
+        "aprsis_max_connections": 1,
+        "aprsis_hot_standby": False,
+        "gateway_beacon": {"enabled": False},
+        "registry_compaction": {"enabled": False},
+        "data_dir": os.path.join(temp_dir, "data"),
+        "logs_dir": os.path.join(temp_dir, "logs"),
+    }
+    os.makedirs(config["data_dir"], exist_ok=True)
+    os.makedirs(config["logs_dir"], exist_ok=True)
+    return config
+
+
+def _text_packet(from_num, to_num, text):
+    return {
+        "from": from_num,
+        "to": to_num,
+        "decoded": {
+            "portnum": "TEXT_MESSAGE_APP",
+            "payload": text.encode("utf-8"),
+            "text": text,
+        },
+    }
+
+
+def _position_packet(from_num, lat, lon):
+    return {
+        "from": from_num,
+        "to": 0xFFFFFFFF,
+        "decoded": {
+            "portnum": "POSITION_APP",
+            "position": {
+                "latitude": lat,
+                "longitude": lon,
+                "latitudeI": int(lat * 1e7),
+                "longitudeI": int(lon * 1e7),
+            },
+        },
+    }
+
+
+def _restore_payload(packet):
+    """
+    Payloads are recorded as text (or base64, if not UTF-8). Restore the bytes.
+    """
+    decoded = packet.get("decoded")
+    if isinstance(decoded, dict):
+        payload = decoded.get("payload")
+        if isinstance(payload, str):
+            decoded["payload"] = payload.encode("utf-8")
+        elif isinstance(payload, dict) and "base64" in payload:
+            decoded["payload"] = base64.b64decode(payload["base64"])
+    return packet
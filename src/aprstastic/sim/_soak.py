@@ -0,0 +1,198 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .._gateway import Gateway
+from ._aprsis_server import FakeAPRSISServer
+from ._mesh_interface import FakeMeshInterface
+from ._replay import LOGIN_TIMEOUT, sim_gateway_config
+from ._virtual_mesh import (
+    VirtualMesh,
+    DEFAULT_POSITION_INTERVAL,
+    DEFAULT_MESSAGE_INTERVAL,
+)
+
+logger = logging.getLogger("aprstastic")
+
+DEFAULT_SOAK_DURATION = 3600  # Seconds
+DEFAULT_REPORT_INTERVAL = 60  # Seconds
+DEFAULT_APRS_RATE = 1.0  # Packets per second, injected by the APRS-IS server
+DEFAULT_APRS_NOISE = 0.9  # Fraction of those packets that the gateway didn't ask for
+MAX_KEPT = 1000  # Sent packets kept by the simulated endpoints (all are counted)
+
+
+def aprs_traffic(call_signs, noise=DEFAULT_APRS_NOISE, seed=0):
+    """
+    An endless stream of APRS-IS lines: messages to the given call signs, and
+    (a 'noise' fraction of the time) positions and messages of other stations,
+    which the server's filters should drop before they reach the gateway.
+    """
+    rng = random.Random(seed)
+    k = 0
+    while True:
+        k += 1
+        sender = f"K{rng.randrange(0, 10)}ABC-7"
+        r = rng.random()
+        if r >= noise:
+            to_call = call_signs[rng.randrange(0, len(call_signs))]
+            yield f"{sender}>APRS,TCPIP*::{to_call:<9}:hi {k}{{{k % 1000}"
+        elif r < noise / 2:
+            lat = 4700 + rng.randrange(0, 100)
+            yield f"{sender}>APRS,TCPIP*:!{lat}.00N/12200.00W-noise {k}"
+        else:
+            to_call = f"NOBODY-{k % 10}"
+            yield f"{sender}>APRS,TCPIP*::{to_call:<9}:hi {k}{{{k % 1000}"
+
+
+class SoakTest(object):
+    """
+    Runs a Gateway for a long time against a VirtualMesh of many nodes, and a
+    FakeAPRSISServer injecting traffic at a steady rate, to find leaks, slow
+    growth, and stalls. The gateway is driven like the real main loop. Every
+    report_interval seconds (and at the end), a report is passed to on_report.
+
+    Options in config override the defaults. Unless given, the data and logs
+    directories are temporary, and removed afterwards.
+    """
+
+    def __init__(
+        self,
+        config=None,
+        nodes=10,
+        position_interval=DEFAULT_POSITION_INTERVAL,
+        message_interval=DEFAULT_MESSAGE_INTERVAL,
+        aprs_rate=DEFAULT_APRS_RATE,
+        aprs_noise=DEFAULT_APRS_NOISE,
+        duration=DEFAULT_SOAK_DURATION,
+        report_interval=DEFAULT_REPORT_INTERVAL,
+        seed=0,
+    ):
+        super().__init__()
+        self._config = dict(config or {})
+        self._nodes = nodes
+        self._position_interval = position_interval
+        self._message_interval = message_interval
+        self._aprs_rate = aprs_rate
+        self._aprs_noise = aprs_noise
+        self._duration = duration
+        self._report_interval = report_interval
+        self._seed = seed
+
+    def run(self, on_report=None):
+        """
+        Run the soak test, and return the final report.
+        """
+        temp_dir = tempfile.mkdtemp(prefix="aprstastic-soak-")
+        server = FakeAPRSISServer(max_received=MAX_KEPT).start()
+        interface = FakeMeshInterface(max_sent=MAX_KEPT)
+        gateway = None
+        mesh = None
+        injector = None
+        try:
+            config = sim_gateway_config(server, temp_dir)
+            config.update(self._config)
+            gateway = Gateway(config)
+            gateway.start(interface)
+            server.wait_for_clients(timeout=LOGIN_TIMEOUT)
+
+            mesh = VirtualMesh(
+                interface,
+                nodes=self._nodes,
+                position_interval=self._position_interval,
+                message_interval=self._message_interval,
+                seed=self._seed,
+            ).start()
+            if self._aprs_rate > 0:
+                injector = server.inject_at_rate(
+                    aprs_traffic(mesh.call_signs, self._aprs_noise, self._seed),
+                    self._aprs_rate,
+                )
+            return self._soak(gateway, interface, server, mesh, on_report)
+        finally:
+            if injector is not None:
+                injector.stop()
+            if mesh is not None:
+                mesh.stop()
+            if gateway is not None:
+                gateway.close()
+            interface.close()
+            server.stop()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _soak(self, gateway, interface, server, mesh, on_report):
+        start = time.monotonic()
+        cpu_start = time.process_time()
+        last = (start, cpu_start)
+        next_report = start + self._report_interval
+        while True:
+            gateway.tick()
+            now = time.monotonic()
+            done = now - start >= self._duration
+            if done or now >= next_report:
+                cpu = time.process_time()
+                report = self._report(gateway, interface, server, mesh, now - start)
+                report["cpu_percent"] = round(
+                    100 * (cpu - last[1]) / max(now - last[0], 1e-9), 1
+                )
+                report["cpu_seconds"] = round(cpu - cpu_start, 3)
+                last = (now, cpu)
+                next_report = now + self._report_interval
+                if on_report is not None:
+                    on_report(report)
+                if done:
+                    return report
+
+            # Yield, like the main loop
+            if gateway.backlog() == 0:
+                time.sleep(0.001)
+
+    def _report(self, gateway, interface, server, mesh, elapsed):
+        metrics = gateway.metrics.to_json()
+        stats = gateway.stats()
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "mesh": mesh.stats(),
+            "mesh_processed": sum(metrics["mesh_packets_received"].values()),
+            "mesh_sent": interface.sent_count,
+            "aprs_server": server.stats(),
+            "aprs_processed": sum(metrics["aprs_packets_received"].values()),
+            "backlog": gateway.backlog(),
+            "slow_ticks": stats["slow_ticks"],
+            "rss_mb": _megabytes(_rss_bytes()),
+            "max_rss_mb": _megabytes(_max_rss_bytes()),
+        }
+
+
+def _rss_bytes():
+    """
+    The current resident set size (on Linux), or the peak, elsewhere.
+    """
+    try:
+        with open("/proc/self/statm", "rt") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _max_rss_bytes()
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    # Kilobytes on Linux, but bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _megabytes(size):
+    return None if size is None else round(size / 1e6, 1)
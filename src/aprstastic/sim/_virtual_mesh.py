@@ -0,0 +1,166 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import heapq
+import random
+import logging
+import threading
+
+from ._mesh_interface import SIM_DEVICE_NODE_NUM, node_id, sim_call_sign
+
+logger = logging.getLogger("aprstastic")
+
+DEFAULT_POSITION_INTERVAL = 900  # Seconds. Meshtastic's default is 15 minutes
+DEFAULT_MESSAGE_INTERVAL = 600  # Seconds between direct messages, per node
+DEFAULT_CENTER = (47.6, -122.3)
+DEFAULT_RADIUS = 0.2  # Degrees
+DM_TO_NODE_FRACTION = 0.2  # Direct messages to other nodes, rather than to APRS
+MAX_SLEEP = 0.01  # Seconds. The mesh checks if it was stopped this often
+
+# Event types
+_REGISTER = 0
+_POSITION = 1
+_MESSAGE = 2
+
+
+class VirtualMesh(object):
+    """
+    Many virtual Meshtastic nodes, heard through a FakeMeshInterface. Each node
+    registers a call sign with the gateway, then, from a background thread,
+    periodically reports its (wandering) position, and sends direct messages:
+    mostly to APRS stations (through the gateway), and some to other nodes.
+
+    Intervals are averages, in seconds. Each node's reports are jittered and
+    staggered, so they don't arrive in lock step. Scale the intervals down to
+    simulate extreme loads. The traffic is deterministic for a given seed,
+    though its timing is not.
+    """
+
+    def __init__(
+        self,
+        interface,
+        nodes=10,
+        position_interval=DEFAULT_POSITION_INTERVAL,
+        message_interval=DEFAULT_MESSAGE_INTERVAL,
+        register=True,
+        seed=0,
+        center=DEFAULT_CENTER,
+        radius=DEFAULT_RADIUS,
+    ):
+        super().__init__()
+        self._interface = interface
+        self._position_interval = position_interval
+        self._message_interval = message_interval
+        self._register = register
+        self._rng = random.Random(seed)
+
+        self.node_ids = [node_id(SIM_DEVICE_NODE_NUM + i) for i in range(0, nodes)]
+        self.call_signs = [sim_call_sign(i) for i in range(0, nodes)]
+        self._positions = [
+            [
+                center[0] + self._rng.uniform(-radius, radius),
+                center[1] + self._rng.uniform(-radius, radius),
+            ]
+            for _ in range(0, nodes)
+        ]
+        for i in range(0, nodes):
+            self._interface.add_node(
+                SIM_DEVICE_NODE_NUM + i, long_name=f"Virtual {self.call_signs[i]}"
+            )
+
+        self.registrations_sent = 0
+        self.positions_sent = 0
+        self.messages_sent = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._thread_body, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "nodes": len(self.node_ids),
+            "registrations_sent": self.registrations_sent,
+            "positions_sent": self.positions_sent,
+            "messages_sent": self.messages_sent,
+        }
+
+    def _schedule(self):
+        """
+        The first event for each node: registration (if enabled), then jittered
+        position and message reports, spread over an interval.
+        """
+        events = list()
+        n = len(self.node_ids)
+        for i in range(0, n):
+            if self._register:
+                events.append((i / n, i, _REGISTER))
+            events.append(
+                (1 + self._rng.uniform(0, self._position_interval), i, _POSITION)
+            )
+            events.append(
+                (1 + self._rng.uniform(0, self._message_interval), i, _MESSAGE)
+            )
+        heapq.heapify(events)
+        return events
+
+    def _thread_body(self):
+        events = self._schedule()
+        start = time.monotonic()
+        try:
+            while not self._stop.is_set() and len(events) > 0:
+                now = time.monotonic() - start
+                while len(events) > 0 and events[0][0] <= now:
+                    t, i, kind = heapq.heappop(events)
+                    next_time = self._send(i, kind)
+                    if next_time is not None:
+                        heapq.heappush(events, (t + next_time, i, kind))
+                if len(events) > 0:
+                    wait = events[0][0] - (time.monotonic() - start)
+                    if wait > 0:
+                        self._stop.wait(min(wait, MAX_SLEEP))
+        except Exception:
+            logger.exception("Virtual mesh failed.")
+
+    def _send(self, i, kind):
+        """
+        Send one report from node i. Returns the delay until the node's next
+        report of the same kind, or None if there is none.
+        """
+        if kind == _REGISTER:
+            self._interface.receive_text(
+                self.node_ids[i], f"!register {self.call_signs[i]}"
+            )
+            self.registrations_sent += 1
+            return None
+
+        if kind == _POSITION:
+            position = self._positions[i]
+            position[0] += self._rng.uniform(-0.005, 0.005)
+            position[1] += self._rng.uniform(-0.005, 0.005)
+            self._interface.receive_position(self.node_ids[i], position[0], position[1])
+            self.positions_sent += 1
+            return self._jitter(self._position_interval)
+
+        if len(self.node_ids) > 1 and self._rng.random() < DM_TO_NODE_FRACTION:
+            j = (i + self._rng.randrange(1, len(self.node_ids))) % len(self.node_ids)
+            self._interface.receive_text(
+                self.node_ids[i], f"hi {self.call_signs[j]}", to_id=self.node_ids[j]
+            )
+        else:
+            self._interface.receive_text(
+                self.node_ids[i],
+                f"K{self._rng.randrange(0, 10)}ABC-7: hello {self.messages_sent}",
+            )
+        self.messages_sent += 1
+        return self._jitter(self._message_interval)
+
+    def _jitter(self, interval):
+        return interval * self._rng.uniform(0.5, 1.5)
@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import pytest
+
+from aprstastic.sim import (
+    AirtimeSimulator,
+    LoRaChannel,
+    MODEM_PRESETS,
+    airtime,
+    synthetic_traffic,
+)
+from aprstastic.sim._lora import NODE, GATEWAY
+
+
+def test_airtime():
+    # SF11, 250 kHz, 4/5: 8.192 ms symbols, 20.25 preamble + 58 payload symbols
+    assert airtime(50, "LONG_FAST") == pytest.approx(0.641, abs=0.001)
+
+    # Slower presets take longer, and bigger packets take longer
+    times = [airtime(50, p) for p in ["SHORT_TURBO", "MEDIUM_FAST", "LONG_SLOW"]]
+    assert times == sorted(times)
+    assert airtime(200) > airtime(50)
+    assert len(MODEM_PRESETS) == 9
+
+
+def test_channel():
+    # One packet, no rebroadcasts
+    channel = LoRaChannel(hop_limit=0, hidden_fraction=0)
+    report = channel.simulate([(0.0, NODE, 50, False)], duration=10.0)
+    assert report["transmissions"][NODE] == 1
+    assert report["channel_utilization"] == pytest.approx(airtime(50) / 10.0)
+    assert report["collision_rate"] == 0
+
+    # Rebroadcasts, and an acknowledgement (which is rebroadcast too)
+    channel = LoRaChannel(hop_limit=2, hidden_fraction=0)
+    report = channel.simulate([(0.0, NODE, 50, True)])
+    assert report["transmissions"] == {"node": 1, "gateway": 0, "relay": 4, "ack": 1}
+
+    # Hidden transmitters collide
+    channel = LoRaChannel(hop_limit=0, hidden_fraction=1.0)
+    report = channel.simulate([(0.0, NODE, 50, False), (0.1, NODE, 50, False)])
+    assert report["collisions"][NODE] == 2
+
+    # Otherwise, the second waits its turn
+    channel = LoRaChannel(hop_limit=0, hidden_fraction=0)
+    report = channel.simulate([(0.0, NODE, 50, False), (0.1, NODE, 50, False)])
+    assert report["collisions"][NODE] == 0
+
+    # The gateway sends one packet at a time, and drops what its queue can't hold
+    channel = LoRaChannel(hop_limit=0, hidden_fraction=0, tx_queue_size=16)
+    report = channel.simulate([(0.0, GATEWAY, 50, False)] * 20)
+    assert report["gateway"]["dropped"] == 3
+    assert report["transmissions"][GATEWAY] == 17
+    assert report["gateway"]["queueing_delay"]["p50"] > 0
+    assert report["gateway"]["drop_rate"] == pytest.approx(3 / 20)
+
+
+def test_simulator():
+    events = synthetic_traffic(devices=5, messages=100, rate=0.1)
+    slow = AirtimeSimulator(preset="LONG_FAST").run(events)
+    fast = AirtimeSimulator(preset="SHORT_FAST").run(events)
+
+    assert slow["events"] == 105
+    assert slow["transmissions"][NODE] > 0
+    assert slow["transmissions"][GATEWAY] > 0
+    assert 0 < fast["channel_utilization"] < slow["channel_utilization"]
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_airtime()
+    test_channel()
+    test_simulator()
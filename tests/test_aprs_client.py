@@ -0,0 +1,211 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import re
+import time
+import threading
+
+from aprslib.passcode import passcode
+from aprstastic._aprs_client import (
+    APRSClient,
+    plan_filters,
+    message_addressee,
+    _APRSConnection,
+)
+from aprstastic.sim import FakeAPRSISServer
+
+
+def _matches(term, call_sign):
+    if term.endswith("*"):
+        return call_sign.startswith(term[0:-1])
+    return call_sign == term
+
+
+def _check_plan(call_signs, shards, max_length):
+    """
+    Every call sign must be matched by exactly one term, and every filter must fit.
+    """
+    terms = list()
+    for shard in shards:
+        assert len(shard) <= max_length
+        assert shard.startswith("g/")
+        terms.extend(shard[2:].split("/"))
+    for call_sign in call_signs:
+        assert len([t for t in terms if _matches(t, call_sign)]) == 1
+
+
+def test_plan_filters():
+    # Nothing to compress
+    assert plan_filters(["N0CALL-10", "MESHID-01", "K1ABC-7"]) == [
+        "g/N0CALL-10/MESHID-01/K1ABC-7"
+    ]
+
+    # A small set stays exact, even if call signs share a base call. Duplicates
+    # are removed, and order preserved
+    assert plan_filters(["N0CALL-10", "MESHID-01", "n0call-1", "N0CALL-1"]) == [
+        "g/N0CALL-10/MESHID-01/N0CALL-1"
+    ]
+
+    # If they don't fit, base calls are grouped
+    assert plan_filters(
+        ["N0CALL-10", "MESHID-01", "N0CALL-1"], max_length=25, max_shards=1
+    ) == ["g/N0CALL*/MESHID-01"]
+
+    # A bare base call is subsumed by its wildcard
+    assert plan_filters(
+        ["N0CALL", "N0CALL-2", "K1ABC"], max_length=20, max_shards=1
+    ) == ["g/N0CALL*/K1ABC"]
+
+    # Too long for one filter, so shard
+    call_signs = [f"K{i}ABC-1" for i in range(0, 100)]
+    shards = plan_filters(call_signs, max_length=200, max_shards=10)
+    assert len(shards) > 1
+    assert len(shards) <= 10
+    _check_plan(call_signs, shards, 200)
+
+    # Too long even when sharded, so merge prefixes
+    call_signs = [f"KK{i:03d}-1" for i in range(0, 300)]
+    shards = plan_filters(call_signs, max_length=100, max_shards=2)
+    assert len(shards) <= 2
+    _check_plan(call_signs, shards, 100)
+
+    # Prefixes are never shorter than the minimum
+    call_signs = ["KA1AAA-1", "KB1BBB-1", "KC1CCC-1", "KD1DDD-1"]
+    shards = plan_filters(call_signs, max_length=20, max_shards=1)
+    for shard in shards:
+        for term in shard[2:].split("/"):
+            assert not re.search(r"^.{0,2}\*$", term)
+
+
+def test_message_addressee():
+    assert message_addressee(b"N0CALL-1>APZMAG,TCPIP*::K1ABC-7  :hello{1") == "K1ABC-7"
+    assert message_addressee("N0CALL-1>APZMAG,TCPIP*::k1abc    :ack1") == "K1ABC"
+    assert message_addressee(b"N0CALL-1>APZMAG,TCPIP*:!4736.75N/12220.45W-test") is None
+    assert message_addressee(b"garbage") is None
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_failover():
+    slow = FakeAPRSISServer(name="SLOW", latency=0.2).start()
+    fast = FakeAPRSISServer(name="FAST").start()
+    client = APRSClient(
+        "N0CALL-10",
+        str(passcode("N0CALL-10")),
+        "g/N0CALL-10",
+        servers=[slow.address, fast.address],
+    )
+    try:
+        # The fastest server is the primary, and the other is the standby
+        assert _wait_for(lambda: len(fast.clients()) == 1 and len(slow.clients()) == 1)
+        link = client.stats()["links"][0]
+        assert link["primary"] == fast.address
+        assert link["standby"] == slow.address
+        assert fast.clients()[0].filters == "g/N0CALL-10"
+
+        # Only the primary's login is verified
+        assert fast.clients()[0].verified
+        assert not slow.clients()[0].verified
+
+        # Packets heard on both connections are only received once
+        packet = "K1ABC-7>APZMAG,TCPIP*::N0CALL-10:hello{1"
+        fast.inject(packet)
+        slow.inject(packet)
+        assert _wait_for(lambda: client.stats()["duplicates_discarded"] == 1)
+        assert client.recv(raw=True) == packet
+        assert client.recv(raw=True) is None
+
+        # Filter updates reach both connections
+        client.set_filter("g/N0CALL-10/K1ABC-7")
+        assert _wait_for(
+            lambda: [c.filters for c in slow.clients() + fast.clients()]
+            == ["g/N0CALL-10/K1ABC-7"] * 2
+        )
+
+        # The primary fails, and the standby takes over
+        fast.stop()
+        assert _wait_for(lambda: client.stats()["failovers"] == 1, timeout=2)
+        assert client.stats()["links"][0]["primary"] == slow.address
+        assert client.stats()["servers"][1]["failures"] >= 1
+
+        # Packets are sent once the new primary logs in, verified
+        client.send("N0CALL-10>APZMAG,TCPIP*::K1ABC-7  :ack1")
+        assert _wait_for(lambda: len(slow.received()) == 1)
+        assert _wait_for(lambda: [c.verified for c in slow.clients()] == [True])
+    finally:
+        client.close()
+        slow.stop()
+
+
+def test_wait_for_login():
+    server = FakeAPRSISServer().start()
+    client = APRSClient(
+        "N0CALL-10", str(passcode("N0CALL-10")), "g/N0CALL-10", servers=[server.address]
+    )
+    try:
+        assert client.wait_for_login(timeout=5)
+        assert client.logged_in
+    finally:
+        client.close()
+        server.stop()
+
+    # Nothing listening
+    client = APRSClient(
+        "N0CALL-10", str(passcode("N0CALL-10")), "g/N0CALL-10", servers=[server.address]
+    )
+    try:
+        assert not client.wait_for_login(timeout=0.5)
+        assert not client.logged_in
+    finally:
+        client.close()
+
+
+def test_set_filter_does_not_block():
+    server = FakeAPRSISServer().start()
+    client = APRSClient(
+        "N0CALL-10", str(passcode("N0CALL-10")), "g/N0CALL-10", servers=[server.address]
+    )
+    stalled = threading.Event()
+    unstall = threading.Event()
+    sendall = _APRSConnection.sendall
+
+    def stalled_sendall(self, packet):
+        stalled.set()
+        unstall.wait(5)
+        sendall(self, packet)
+
+    try:
+        assert client.wait_for_login(timeout=5)
+        _APRSConnection.sendall = stalled_sendall
+
+        # The server stalls, but the caller doesn't
+        start = time.monotonic()
+        client.set_filter("g/N0CALL-10/K1ABC-7")
+        assert time.monotonic() - start < 0.5
+        assert stalled.wait(5)
+        unstall.set()
+        assert _wait_for(lambda: server.clients()[0].filters == "g/N0CALL-10/K1ABC-7")
+    finally:
+        _APRSConnection.sendall = sendall
+        unstall.set()
+        client.close()
+        server.stop()
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_plan_filters()
+    test_message_addressee()
+    test_failover()
+    test_wait_for_login()
+    test_set_filter_does_not_block()
@@ -0,0 +1,170 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import random
+import string
+
+from aprslib import parse
+from aprstastic._aprs_encoder import (
+    APRSEncoder,
+    POSITION_FORMAT_COMPRESSED,
+    format_compressed_position,
+    format_latitude,
+    format_longitude,
+    format_timestamp,
+)
+
+GATEWAY = "N0CALL-10"
+SYMBOLS = ["/>", "/[", "\\k", "/-", "/k"]
+TEXT_CHARS = string.ascii_letters + string.digits + " .,!?-()"
+COMMENT_CHARS = string.ascii_lowercase + " .,-"  # Avoid accidental comment extensions
+NUM_CASES = 500
+
+
+def _call_sign(rng):
+    base = rng.choice(string.ascii_uppercase) + str(rng.randint(0, 9))
+    base += "".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 3)))
+    return base + "-" + str(rng.randint(1, 15))
+
+
+def _text(rng, max_length, chars=TEXT_CHARS):
+    return "".join(rng.choices(chars, k=rng.randint(1, max_length))).strip() or "x"
+
+
+def test_formatting():
+    assert format_latitude(47.6125) == "4736.75N"
+    assert format_latitude(-33.5) == "3330.00S"
+    assert format_longitude(-122.340833) == "12220.45W"
+    assert format_longitude(2.5) == "00230.00E"
+
+    # Minutes that round up to 60 carry into the degrees
+    assert format_latitude(47.9999999) == "4800.00N"
+    assert format_longitude(-9.99999999) == "01000.00W"
+
+    assert format_timestamp(0) == "010000z"
+    assert format_timestamp(1728880000) == "140426z"
+
+    encoder = APRSEncoder(GATEWAY)
+    assert (
+        encoder.message("K1ABC-7", "WLNK-1", "hello", 42)
+        == "K1ABC-7>APZMAG,WIDE1-1,qAR,N0CALL-10::WLNK-1   :hello{42"
+    )
+    assert (
+        encoder.ack("K1ABC-7", "WLNK-1", "42")
+        == "K1ABC-7>APZMAG,WIDE1-1,qAR,N0CALL-10::WLNK-1   :ack42"
+    )
+    assert (
+        encoder.gateway_beacon(47.6125, -122.340833, "L&", "hi")
+        == "N0CALL-10>APZMAG,TCPIP*:!4736.75NL12220.45W&hi"
+    )
+    assert APRSEncoder(GATEWAY, as_bytes=True).ack("A", "B", "1") == (
+        b"A>APZMAG,WIDE1-1,qAR,N0CALL-10::B        :ack1"
+    )
+
+
+def test_round_trip():
+    rng = random.Random(0)
+    encoder = APRSEncoder(GATEWAY)
+
+    # aprslib resolves DHM timestamps relative to the current month
+    now = int(time.time())
+    month_start = now - (time.gmtime(now).tm_mday - 1) * 86400 - now % 86400
+
+    for i in range(0, NUM_CASES):
+        fromcall = _call_sign(rng)
+        tocall = _call_sign(rng)
+
+        # Messages
+        text = _text(rng, 67)
+        msg_no = str(rng.randint(0, 999))
+        packet = parse(encoder.message(fromcall, tocall, text, msg_no))
+        assert packet["from"] == fromcall
+        assert packet["to"] == "APZMAG"
+        assert packet["path"] == ["WIDE1-1", "qAR", GATEWAY]
+        assert packet["addresse"] == tocall
+        assert packet["message_text"] == text
+        assert packet["msgNo"] == msg_no
+
+        # Acks
+        packet = parse(encoder.ack(fromcall, tocall, msg_no))
+        assert packet["addresse"] == tocall
+        assert packet["response"] == "ack"
+        assert packet["msgNo"] == msg_no
+
+        # Positions, with and without timestamps
+        lat = rng.uniform(-89.99, 89.99)
+        lon = rng.uniform(-179.99, 179.99)
+        symbol = rng.choice(SYMBOLS)
+        comment = _text(rng, 43, COMMENT_CHARS)
+        t = rng.randint(month_start, now) if i % 2 == 0 else None
+        packet = parse(encoder.position(fromcall, lat, lon, symbol, comment, t))
+        assert packet["from"] == fromcall
+        assert abs(packet["latitude"] - lat) <= 1 / 6000
+        assert abs(packet["longitude"] - lon) <= 1 / 6000
+        assert packet["symbol_table"] == symbol[0]
+        assert packet["symbol"] == symbol[1]
+        assert packet["comment"] == comment
+        if t is not None:
+            assert packet["timestamp"] == t - t % 60
+
+
+def test_compressed_positions():
+    # The example from the APRS 1.01 specification (which truncates, rather than
+    # rounds, the longitude), without course and speed
+    assert format_compressed_position(49.5, -72.75, "/>") == "/5L!!<*e8>  C"
+
+    rng = random.Random(1)
+    uncompressed = APRSEncoder(GATEWAY)
+    compressed = APRSEncoder(GATEWAY, position_format=POSITION_FORMAT_COMPRESSED)
+    for i in range(0, NUM_CASES):
+        fromcall = _call_sign(rng)
+        lat = rng.uniform(-89.99, 89.99)
+        lon = rng.uniform(-179.99, 179.99)
+        symbol = rng.choice(SYMBOLS)
+        comment = _text(rng, 43, COMMENT_CHARS)
+        course = rng.uniform(0, 359) if i % 3 != 0 else None
+        speed = rng.uniform(0, 200) if i % 3 != 0 else None
+        altitude = rng.uniform(1, 5000) if i % 2 == 0 else None
+
+        raw = compressed.position(
+            fromcall, lat, lon, symbol, comment, None, course, speed, altitude
+        )
+        packet = parse(raw)
+        assert packet["format"] == "compressed"
+        assert packet["symbol_table"] == symbol[0]
+        assert packet["symbol"] == symbol[1]
+
+        # More precise than uncompressed (1/6000 of a degree)
+        assert abs(packet["latitude"] - lat) < 1e-5
+        assert abs(packet["longitude"] - lon) < 1e-5
+
+        if course is not None:
+            assert abs((packet["course"] - course + 180) % 360 - 180) <= 2
+            assert abs(packet["speed"] - speed) <= speed * 0.04 + 1
+            if altitude is not None:
+                assert abs(packet["altitude"] - altitude) <= 0.3048
+        elif altitude is not None:
+            assert abs(packet["altitude"] - altitude) <= altitude * 0.001 + 0.3048
+        assert packet["comment"] == comment
+
+        # And shorter, unless the altitude is carried in the comment
+        if course is None or altitude is None:
+            legacy = uncompressed.position(fromcall, lat, lon, symbol, comment)
+            assert len(raw) < len(legacy)
+
+    # The gateway beacon can be compressed, too
+    packet = parse(compressed.gateway_beacon(47.6125, -122.340833, "L&", "hi"))
+    assert packet["format"] == "compressed"
+    assert packet["symbol_table"] == "L"
+    assert packet["comment"] == "hi"
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_formatting()
+    test_round_trip()
+    test_compressed_positions()
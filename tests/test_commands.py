@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+from aprstastic._commands import (
+    CommandRouter,
+    CommandMessage,
+    REGISTER_RE,
+    DEST_PREFIX_RE,
+    BEACON_RE,
+)
+
+
+def test_command_message():
+    message = CommandMessage("  !Register: N0CALL-1 MV \n")
+    assert message.stripped == "!Register: N0CALL-1 MV"
+    assert message.lowered == "!register: n0call-1 mv"
+    assert message.token == "!register"
+    assert CommandMessage("   ").token == ""
+    assert CommandMessage("WLNK-1:hello").token == "wlnk-1"
+
+
+def test_command_router():
+    calls = list()
+    router = CommandRouter(fallback=lambda f, m: calls.append(("fallback", m.text)))
+    router.register("?", lambda f, m: calls.append(("help", f)), exact=True)
+    router.register("!REGISTER", lambda f, m: calls.append(("register", m.token)))
+    assert "!register" in router
+
+    router.dispatch("!00000001", " ? ")
+    router.dispatch("!00000001", "? what")  # Not exact, so falls back
+    router.dispatch("!00000001", "!register n0call-1")
+    router.dispatch("!00000001", "!Register: n0call-1")
+    router.dispatch("!00000001", "WLNK-1: hello")
+    assert calls == [
+        ("help", "!00000001"),
+        ("fallback", "? what"),
+        ("register", "!register"),
+        ("register", "!register"),
+        ("fallback", "WLNK-1: hello"),
+    ]
+
+    # Commands can be plugged in, and removed, without touching the core path
+    router.register("!ping", lambda f, m: calls.append(("ping", f)))
+    router.dispatch("!00000002", "!ping")
+    assert calls[-1] == ("ping", "!00000002")
+    router.unregister("!ping")
+    router.dispatch("!00000002", "!ping")
+    assert calls[-1] == ("fallback", "!ping")
+
+    assert not CommandRouter().dispatch("!00000001", "hello")
+
+
+def test_patterns():
+    m = REGISTER_RE.search("!register n0call-10 $$")
+    assert m.group(1) == "n0call-10" and m.group(3) == "$$"
+    assert REGISTER_RE.search("!register: n0call-1").group(3) is None
+    assert REGISTER_RE.search("!register n0call") is None
+
+    m = DEST_PREFIX_RE.search("WLNK-1: hello: world")
+    assert m.group(1) == "WLNK-1" and m.group(3) == " hello: world"
+    assert DEST_PREFIX_RE.search("hello world") is None
+
+    m = BEACON_RE.search("!0a1b2c3d:mv")
+    assert m.group(1) == "!0a1b2c3d" and m.group(3) == "mv"
+    assert BEACON_RE.search("!0a1b2c3d").group(3) is None
+    assert BEACON_RE.search("!0a1b2c3") is None
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_command_message()
+    test_command_router()
+    test_patterns()
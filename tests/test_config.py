@@ -5,6 +5,9 @@ import os
 import json
 import time
 import shutil
+import tempfile
+
+import yaml
 
 from aprstastic._config import (
     ConfigError,
@@ -14,6 +17,9 @@ from aprstastic._config import (
     DATA_SUBDIR,
     DEFAULT_CALL_SIGN,
 )
+from aprstastic._gateway import Gateway
+from aprstastic.sim import FakeAPRSISServer, FakeMeshInterface
+from aprstastic.sim._replay import sim_gateway_config
 
 
 TEST_CONFIG_FILE_NAME_1 = "test_aprstastic_1.yaml"
@@ -137,6 +143,36 @@ def test_load_config():
     )
 
 
+def test_null_sections():
+    # Options uncommented in the template, but left empty, load as null
+    null_options = yaml.safe_load(
+        """
+aprs_position_format:
+metrics:
+reply_to:
+recorder:
+profiler:
+tracing:
+nearby_relay:
+"""
+    )
+
+    temp_dir = tempfile.mkdtemp()
+    server = FakeAPRSISServer().start()
+    config = sim_gateway_config(server, temp_dir)
+    config.update(null_options)
+    gateway = None
+    try:
+        gateway = Gateway(config)
+        gateway.start(FakeMeshInterface())
+        gateway.tick()
+    finally:
+        if gateway is not None:
+            gateway.close()
+        server.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
 ##########################
 if __name__ == "__main__":
     import logging
@@ -144,3 +180,4 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
     test_initialize_config()
     test_load_config()
+    test_null_sections()
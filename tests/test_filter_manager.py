@@ -0,0 +1,96 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+from aprstastic._filter_manager import FilterManager, FILTER_RATE_WINDOW
+
+
+def test_membership():
+    manager = FilterManager(["N0CALL-10", "MESHID-01", "N0CALL-10"])
+
+    assert "N0CALL-10" in manager
+    assert "MESHID-01" in manager
+    assert len(manager) == 2
+
+    assert manager.add("N0CALL-2")
+    assert not manager.add("N0CALL-2")
+    assert manager.add("N0CALL-1")
+    assert not manager.add("N0CALL-10")  # Already present (static)
+    assert "N0CALL-2" in manager
+    assert len(manager) == 4
+
+    # Static call signs come first, and the rest are sorted
+    assert list(manager) == ["N0CALL-10", "MESHID-01", "N0CALL-1", "N0CALL-2"]
+    assert manager.build_filter() == "g/N0CALL-10/MESHID-01/N0CALL-1/N0CALL-2"
+
+    assert manager.discard("N0CALL-2")
+    assert not manager.discard("N0CALL-2")
+    assert not manager.discard("N0CALL-10")  # Static call signs are never removed
+    assert "N0CALL-2" not in manager
+    assert "N0CALL-10" in manager
+
+
+def test_debounce():
+    manager = FilterManager(["N0CALL-10"], debounce_interval=5)
+
+    # The initial filter is released right away
+    assert manager.current_filter is None
+    assert manager.poll(1000) == "g/N0CALL-10"
+    assert manager.current_filter == "g/N0CALL-10"
+
+    # Nothing changed
+    assert manager.poll(1001) is None
+
+    # A burst of changes is coalesced into a single update, once the window elapses
+    manager.add("N0CALL-1")
+    manager.add("N0CALL-2")
+    manager.add("N0CALL-3")
+    assert manager.poll(1002) is None
+    manager.discard("N0CALL-3")
+    assert manager.poll(1004.9) is None
+    assert manager.poll(1005) == "g/N0CALL-10/N0CALL-1/N0CALL-2"
+    assert manager.poll(1006) is None
+
+    # Changes that cancel out don't produce an update
+    manager.add("N0CALL-4")
+    manager.discard("N0CALL-4")
+    assert manager.poll(1020) is None
+
+    # After a quiet period, the first change is released immediately
+    manager.add("N0CALL-4")
+    assert manager.poll(1030) == "g/N0CALL-10/N0CALL-1/N0CALL-2/N0CALL-4"
+
+    # Stats
+    assert manager.update_rate(1030) == 3
+    stats = manager.stats(1030)
+    assert stats["call_signs"] == 4
+    assert stats["total_updates"] == 3
+    assert stats["updates_last_hour"] == 3
+    assert stats["filter"] == manager.current_filter
+    assert stats["filter_length"] == len(manager.current_filter)
+
+    # Older updates age out of the rate
+    assert manager.update_rate(1030 + FILTER_RATE_WINDOW) == 1
+    assert manager.stats(1030 + FILTER_RATE_WINDOW)["total_updates"] == 3
+
+
+def test_extra_terms():
+    manager = FilterManager(["N0CALL-10"], debounce_interval=0)
+    manager.add("K1ABC-7")
+    assert manager.poll(0) == "g/N0CALL-10/K1ABC-7"
+
+    manager.set_extra_terms(["r/47.6000/-122.3000/50"])
+    assert manager.poll(1) == "g/N0CALL-10/K1ABC-7 r/47.6000/-122.3000/50"
+
+    # Setting the same terms again is a no-op
+    manager.set_extra_terms(["r/47.6000/-122.3000/50"])
+    assert manager.poll(2) is None
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_membership()
+    test_debounce()
+    test_extra_terms()
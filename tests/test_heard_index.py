@@ -0,0 +1,43 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+from aprstastic._heard_index import HeardIndex
+
+
+def test_heard_index():
+    index = HeardIndex()
+    assert len(index) == 0
+    assert index.expire(1000) == []
+
+    index.heard("!00000001", 100)
+    index.heard("!00000002", 200)
+    index.heard("!00000003", 300)
+    assert len(index) == 3
+    assert "!00000002" in index
+    assert index.last_heard("!00000002") == 200
+    assert index.last_heard("!00000004") is None
+
+    # Hearing a device again moves it to the back
+    index.heard("!00000001", 400)
+    assert index.last_heard("!00000001") == 400
+
+    # Older times never replace newer ones
+    index.heard("!00000001", 50)
+    assert index.last_heard("!00000001") == 400
+
+    # Out-of-order times are slotted into place
+    index.heard("!00000004", 250)
+
+    assert index.expire(200) == []
+    assert index.expire(260) == ["!00000002", "!00000004"]
+    assert "!00000002" not in index
+    assert index.expire(1000) == ["!00000003", "!00000001"]
+    assert len(index) == 0
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_heard_index()
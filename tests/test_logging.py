@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import json
+import shutil
+import logging
+import tempfile
+
+from aprstastic._logging import (
+    setup_logging,
+    DeferredQueueHandler,
+    LOG_FILE,
+    LOG_FORMAT_JSON,
+    LOG_FORMAT_TEXT,
+)
+
+
+def _read_log(logs_dir):
+    with open(os.path.join(logs_dir, LOG_FILE), "rt", encoding="utf-8") as fh:
+        return fh.read()
+
+
+def test_logging():
+    root_handlers = list(logging.root.handlers)
+    root_level = logging.root.level
+    logs_dir = tempfile.mkdtemp()
+    try:
+        logger = logging.getLogger("aprstastic")
+
+        # Text, at INFO
+        listener = setup_logging("INFO", LOG_FORMAT_TEXT, logs_dir)
+        logger.debug("Not logged: %s", "debug")
+        logger.info("%s -> %s: %s", "!00000001", "^all", "TEXT_MESSAGE_APP")
+        logging.getLogger("other").info("From another logger")
+        listener.stop()
+
+        log = _read_log(logs_dir)
+        assert "Not logged" not in log
+        assert "INFO:aprstastic:!00000001 -> ^all: TEXT_MESSAGE_APP" in log
+        assert "From another logger" in log
+
+        # JSON, at DEBUG, replacing the previous handlers
+        os.remove(os.path.join(logs_dir, LOG_FILE))
+        listener = setup_logging("DEBUG", LOG_FORMAT_JSON, logs_dir)
+        assert (
+            len(
+                [
+                    h
+                    for h in logging.root.handlers
+                    if isinstance(h, DeferredQueueHandler)
+                ]
+            )
+            == 1
+        )
+
+        # Mutable arguments are formatted when logged
+        packet = {"from": "N0CALL"}
+        logger.debug("Packet: %s", packet)
+        packet["from"] = "CHANGED"
+        logging.getLogger("other").debug("Third-party debug messages are filtered")
+        try:
+            raise ValueError("oops")
+        except ValueError:
+            logger.exception("Failed")
+        listener.stop()
+
+        entries = [json.loads(line) for line in _read_log(logs_dir).splitlines()]
+        assert len(entries) == 2
+        assert entries[0]["level"] == "DEBUG"
+        assert entries[0]["logger"] == "aprstastic"
+        assert entries[0]["message"] == "Packet: {'from': 'N0CALL'}"
+        assert "ValueError: oops" in entries[1]["exception"]
+    finally:
+        for handler in list(logging.root.handlers):
+            if handler not in root_handlers:
+                logging.root.removeHandler(handler)
+                for h in handler.listener.handlers:
+                    h.close()
+        logging.root.setLevel(root_level)
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+##########################
+if __name__ == "__main__":
+    test_logging()
@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import json
+import urllib.request
+
+import pytest
+
+from aprstastic._metrics import MetricsRegistry, MetricsServer
+
+
+def test_metrics():
+    metrics = MetricsRegistry()
+    packets = metrics.counter("packets", "Packets received", label="portnum")
+    errors = metrics.counter("errors", "Errors")
+    depth = metrics.gauge("queue_depth", "Queue depth", lambda: 3)
+    size = metrics.gauge("size", "Size")
+    timing = metrics.histogram("seconds", "Processing time", buckets=[0.1, 1])
+
+    packets.inc("TEXT_MESSAGE_APP")
+    packets.inc("TEXT_MESSAGE_APP")
+    packets.inc("POSITION_APP")
+    errors.inc()
+    size.set(7)
+    timing.observe(0.05)
+    timing.observe(0.5)
+    timing.observe(5)
+
+    assert packets.value("TEXT_MESSAGE_APP") == 2
+    assert depth.value() == 3
+    assert timing.count == 3
+
+    with pytest.raises(ValueError):
+        metrics.counter("packets", "Duplicate")
+
+    text = metrics.to_prometheus()
+    assert "# TYPE aprstastic_packets_total counter\n" in text
+    assert 'aprstastic_packets_total{portnum="TEXT_MESSAGE_APP"} 2\n' in text
+    assert "aprstastic_errors_total 1\n" in text
+    assert "aprstastic_queue_depth 3\n" in text
+    assert "aprstastic_size 7\n" in text
+    assert 'aprstastic_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'aprstastic_seconds_bucket{le="1"} 2\n' in text
+    assert 'aprstastic_seconds_bucket{le="+Inf"} 3\n' in text
+    assert "aprstastic_seconds_count 3\n" in text
+
+    # Every sample belongs to the family named by a TYPE line
+    types = dict()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+        elif not line.startswith("#"):
+            name = line.split("{")[0].split(" ")[0]
+            if name not in types:
+                for suffix in ["_bucket", "_sum", "_count"]:
+                    if name.endswith(suffix):
+                        name = name[0 : -len(suffix)]
+                        assert types.get(name) == "histogram"
+            assert name in types, line
+
+    snapshot = metrics.to_json()
+    assert snapshot["packets"] == {"TEXT_MESSAGE_APP": 2, "POSITION_APP": 1}
+    assert snapshot["errors"] == 1
+    assert snapshot["seconds"]["count"] == 3
+
+
+def test_metrics_server():
+    metrics = MetricsRegistry()
+    metrics.counter("errors", "Errors").inc()
+    server = MetricsServer(metrics, port=0).start()
+    try:
+        base = f"http://{server.host}:{server.port}"
+        with urllib.request.urlopen(base + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "aprstastic_errors_total 1" in response.read().decode("utf-8")
+        with urllib.request.urlopen(base + "/metrics.json") as response:
+            assert json.loads(response.read()) == {"errors": 1}
+    finally:
+        server.stop()
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_metrics()
+    test_metrics_server()
@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import random
+
+from aprstastic._geo import distance
+from aprstastic._nearby import NearbyStations, format_digest, OBJECT, WEATHER
+
+LAT = 47.6
+LON = -122.3
+
+
+def test_nearby_stations():
+    nearby = NearbyStations(ttl=100)
+    nearby.update("N0CALL-9", LAT + 0.01, LON, now=0)  # ~1.1 km north
+    nearby.update("K1ABC", LAT, LON - 0.05, kind=WEATHER, now=0)  # ~3.7 km west
+    nearby.update("FARAWAY", LAT + 2, LON, now=0)
+    nearby.update("EVENT", LAT - 0.2, LON, kind=OBJECT, now=0)  # ~22 km south
+    assert len(nearby) == 4
+
+    results = nearby.query(LAT, LON, 50000, now=10)
+    assert [r[2] for r in results] == ["N0CALL-9", "K1ABC", "EVENT"]
+    assert abs(results[0][0] - 1112) < 5
+    assert results[0][1] < 1 or results[0][1] > 359
+    assert abs(results[1][1] - 270) < 1
+    assert [r[2] for r in nearby.query(LAT, LON, 50000, limit=1, now=10)] == [
+        "N0CALL-9"
+    ]
+
+    assert (
+        format_digest(results, 50000)
+        == "APRS within 50km: N0CALL-9 1.1km N, K1ABC wx 3.7km W, EVENT object 22.2km S"
+    )
+    assert format_digest([], 50000) is None
+
+    # Moving between cells
+    nearby.update("N0CALL-9", LAT + 1, LON, now=50)
+    assert [r[2] for r in nearby.query(LAT, LON, 50000, now=60)] == ["K1ABC", "EVENT"]
+
+    # Removing, and expiring
+    nearby.remove("EVENT")
+    assert "EVENT" not in nearby
+    assert nearby.expire(now=120) == 2
+    assert len(nearby) == 1
+    assert nearby.stats() == {"stations": 1, "cells": 1}
+
+
+def test_nearby_query_accuracy():
+    rng = random.Random(0)
+    nearby = NearbyStations()
+    now = time.time()
+    positions = dict()
+    for i in range(0, 2000):
+        positions[f"S{i}"] = (LAT + rng.uniform(-1, 1), LON + rng.uniform(-1, 1))
+        nearby.update(f"S{i}", *positions[f"S{i}"], now=now)
+
+    # Compare against a brute force search (allowing for the approximation at the edge)
+    results = nearby.query(LAT, LON, 30000, now=now)
+    found = set([r[2] for r in results])
+    for name, (lat, lon) in positions.items():
+        d = distance(LAT, LON, lat, lon)
+        if d < 29900:
+            assert name in found
+        elif d > 30100:
+            assert name not in found
+    assert [r[0] for r in results] == sorted([r[0] for r in results])
+    assert len(results) > 50
+
+
+def test_nearby_antimeridian():
+    # Fiji straddles the antimeridian
+    nearby = NearbyStations()
+    nearby.update("EAST", -17.0, 179.99, now=0)
+    nearby.update("WEST", -17.0, -179.99, now=0)
+    nearby.update("EDGE", -17.0, 180.0, now=0)
+    nearby.update("FARAWAY", -17.0, 179.0, now=0)  # ~106 km west
+
+    for lon in (179.95, -179.95, 180.0, -180.0):
+        results = nearby.query(-17.0, lon, 50000, now=10)
+        assert set([r[2] for r in results]) == set(["EAST", "WEST", "EDGE"])
+        assert all(r[0] < 10000 for r in results)
+
+    # The stations share cells with those just across the line
+    assert nearby.stats() == {"stations": 4, "cells": 3}
+
+
+def test_nearby_scale():
+    # Stations outside the query area should cost (almost) nothing
+    rng = random.Random(0)
+    nearby = NearbyStations()
+    now = time.time()
+    for i in range(0, 100000):
+        nearby.update(f"S{i}", rng.uniform(-60, 60), rng.uniform(-180, 180), now=now)
+
+    start = time.perf_counter()
+    for _ in range(0, 100):
+        nearby.query(LAT, LON, 50000, limit=5, now=now)
+    assert time.perf_counter() - start < 1.0
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_nearby_stations()
+    test_nearby_query_accuracy()
+    test_nearby_antimeridian()
+    test_nearby_scale()
@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+from aprstastic._geo import distance, heading_change
+from aprstastic._position_governor import PositionGovernor
+
+NODE = "!00000001"
+
+# About 111 meters per 0.001 degrees of latitude
+LAT = 47.6
+LON = -122.3
+
+
+def test_geo():
+    assert distance(LAT, LON, LAT, LON) == 0
+    assert abs(distance(LAT, LON, LAT + 0.001, LON) - 111.2) < 0.5
+    assert heading_change(350, 10) == 20
+    assert heading_change(10, 350) == 20
+    assert heading_change(0, 180) == 180
+
+
+def test_stationary():
+    governor = PositionGovernor()
+
+    # The first position is always forwarded
+    assert governor.should_forward(NODE, LAT, LON, now=0)
+
+    # A stationary node is only reported every slow_rate
+    for t in range(30, 1800, 30):
+        assert not governor.should_forward(NODE, LAT, LON, now=t)
+    assert governor.should_forward(NODE, LAT, LON, now=1800)
+
+    stats = governor.stats()
+    assert stats["forwarded"] == 2
+    assert stats["suppressed"] == 59
+
+
+def test_moving():
+    governor = PositionGovernor()
+    assert governor.rate(100) == 180
+    assert governor.rate(45) == 360
+    assert governor.rate(1) == 1800
+
+    # At 40 m/s (144 km/h), report every fast_rate (180s)
+    forwarded = list()
+    for t in range(0, 600, 30):
+        lat = LAT + t * 40 / 111195
+        if governor.should_forward(NODE, lat, LON, course=0, speed=144, now=t):
+            forwarded.append(t)
+    assert forwarded == [0, 180, 360, 540]
+
+    # Turning a corner is reported early, but not within min_turn_time
+    governor = PositionGovernor()
+    assert governor.should_forward(NODE, LAT, LON, course=0, speed=50, now=0)
+    assert not governor.should_forward(NODE, LAT, LON, course=0, speed=50, now=30)
+    assert governor.should_forward(NODE, LAT, LON, course=90, speed=50, now=40)
+
+    # Nothing is forwarded within min_interval
+    assert not governor.should_forward(NODE, LAT + 1, LON, course=270, now=50)
+
+    # Jitter (small moves) is not reported before slow_rate
+    governor = PositionGovernor()
+    assert governor.should_forward(NODE, LAT, LON, now=0)
+    assert not governor.should_forward(NODE, LAT + 0.0002, LON, now=600)
+
+    # Forgotten devices start over
+    governor.forget(NODE)
+    assert governor.should_forward(NODE, LAT, LON, now=601)
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_geo()
+    test_stationary()
+    test_moving()
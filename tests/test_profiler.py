@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+from aprstastic._profiler import (
+    Profiler,
+    SlowTickDetector,
+    PROFILE_MODE_SAMPLE,
+    PROFILE_MODE_CPROFILE,
+)
+
+
+def _busy_work(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(0, 100))
+    return total
+
+
+def test_sample_profiler():
+    logs_dir = tempfile.mkdtemp()
+    try:
+        profiler = Profiler(logs_dir, mode=PROFILE_MODE_SAMPLE, sample_interval=0.001)
+        assert profiler.tick() is None
+        profiler.start()
+        assert profiler.tick() is None
+        assert profiler.running
+
+        # Work in another thread is sampled too
+        worker = threading.Thread(target=_busy_work, args=(0.2,), name="worker")
+        worker.start()
+        worker.join()
+
+        profiler.stop()
+        output = profiler.tick()
+        assert not profiler.running
+        assert output.endswith(".folded")
+        with open(output, "rt") as fh:
+            folded = fh.read()
+        assert "worker;" in folded
+        assert "_busy_work" in folded
+        assert os.path.isfile(output[: -len(".folded")] + ".txt")
+    finally:
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+def test_cprofile_profiler():
+    logs_dir = tempfile.mkdtemp()
+    try:
+        profiler = Profiler(logs_dir, mode=PROFILE_MODE_CPROFILE)
+        profiler.start(duration=10)
+        profiler.tick(now=time.monotonic())
+        _busy_work(0.05)
+
+        # Sessions end on their own
+        output = profiler.tick(now=time.monotonic() + 11)
+        assert output.endswith(".prof")
+        with open(output[: -len(".prof")] + ".txt", "rt") as fh:
+            assert "_busy_work" in fh.read()
+
+        # Toggling
+        profiler.toggle()
+        profiler.tick()
+        assert profiler.running
+        profiler.toggle()
+        assert profiler.tick() is not None
+    finally:
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+def test_signal_toggle():
+    logs_dir = tempfile.mkdtemp()
+    try:
+        profiler = Profiler(logs_dir, mode=PROFILE_MODE_CPROFILE)
+
+        # The signal may interrupt the main thread while it holds the lock (e.g.,
+        # handling !profile), so requesting a toggle must not take it
+        with profiler._lock:
+            profiler.request_toggle()
+        assert not profiler.running
+
+        # The toggle takes effect on the next tick
+        assert profiler.tick() is None
+        assert profiler.running
+        profiler.request_toggle()
+        assert profiler.tick() is not None
+        assert not profiler.running
+    finally:
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+def test_slow_ticks():
+    detector = SlowTickDetector(threshold=0.05).start()
+    try:
+        detector.begin()
+        detector.end()
+        assert detector.slow_ticks == 0
+
+        detector.begin()
+        time.sleep(0.15)
+        detector.end()
+        assert detector.slow_ticks == 1
+
+        detector.check("handler", 0.01)
+        detector.check("handler", 0.1)
+        assert detector.stats()["slow_handlers"] == 1
+    finally:
+        detector.stop()
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_sample_profiler()
+    test_cprofile_profiler()
+    test_signal_toggle()
+    test_slow_ticks()
@@ -0,0 +1,114 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import threading
+
+from aprstastic._recorder import (
+    TrafficRecorder,
+    APRS_RX,
+    MESH_RX,
+    TRAFFIC_FILE_PREFIX,
+)
+
+
+def _read_traffic(logs_dir):
+    entries = list()
+    for f in sorted(os.listdir(logs_dir)):
+        if f.startswith(TRAFFIC_FILE_PREFIX):
+            with gzip.open(os.path.join(logs_dir, f), "rt", encoding="utf-8") as fh:
+                entries.extend(json.loads(line) for line in fh)
+    return entries
+
+
+def test_recorder():
+    logs_dir = tempfile.mkdtemp()
+    try:
+        recorder = TrafficRecorder(logs_dir)
+        recorder.record(APRS_RX, b"K1ABC-7>APZMAG,TCPIP*::N0CALL-10:hello{1")
+        recorder.record(
+            MESH_RX,
+            {
+                "fromId": "!00000001",
+                "decoded": {"portnum": "TEXT_MESSAGE_APP", "payload": b"\xff\x00"},
+            },
+        )
+        recorder.close()
+
+        entries = _read_traffic(logs_dir)
+        assert len(entries) == 2
+        assert entries[0]["src"] == APRS_RX
+        assert entries[0]["data"] == "K1ABC-7>APZMAG,TCPIP*::N0CALL-10:hello{1"
+        assert entries[1]["data"]["decoded"]["payload"] == {"base64": "/wA="}
+        assert entries[0]["t"] <= entries[1]["t"]
+        assert recorder.stats()["recorded"] == 2
+    finally:
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+def test_recorder_rotation():
+    logs_dir = tempfile.mkdtemp()
+    try:
+        recorder = TrafficRecorder(logs_dir, max_bytes=500, backup_count=3)
+        for i in range(0, 100):
+            recorder.record(APRS_RX, f"N0CALL-{i}>APZMAG,TCPIP*:>status")
+        recorder.close()
+
+        files = [f for f in os.listdir(logs_dir) if f.startswith(TRAFFIC_FILE_PREFIX)]
+        assert len(files) == 3
+        assert recorder.stats()["files_written"] > 3
+
+        # The newest entries are kept
+        entries = _read_traffic(logs_dir)
+        assert entries[-1]["data"] == "N0CALL-99>APZMAG,TCPIP*:>status"
+    finally:
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+class _StalledRecorder(TrafficRecorder):
+    """
+    A recorder whose writer waits until released.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.release = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def _write(self, entry):
+        self.release.wait()
+        super()._write(entry)
+
+
+def test_recorder_drops():
+    logs_dir = tempfile.mkdtemp()
+    try:
+        recorder = _StalledRecorder(logs_dir, queue_size=5)
+        for i in range(0, 20):
+            recorder.record(APRS_RX, f"line {i}")
+
+        # One entry may be held by the (stalled) writer, and 5 are queued
+        assert recorder.dropped in (14, 15)
+        recorder.release.set()
+        recorder.close()
+
+        entries = _read_traffic(logs_dir)
+        recorded = [e for e in entries if "src" in e]
+        markers = [e for e in entries if "dropped" in e]
+        assert len(recorded) + recorder.dropped == 20
+        assert sum(m["dropped"] for m in markers) == recorder.dropped
+    finally:
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_recorder()
+    test_recorder_rotation()
+    test_recorder_drops()
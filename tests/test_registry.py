@@ -3,7 +3,9 @@
 # SPDX-License-Identifier: MIT
 import os
 import json
+import random
 import sqlite3
+import threading
 import time
 import shutil
 from aprstastic._registry import (
@@ -11,6 +13,10 @@ from aprstastic._registry import (
     DATABASE_FILE,
     OVERRIDES_FILE,
     PRECOMPILED_FILE,
+    EVENT_ADDED,
+    EVENT_CHANGED,
+    EVENT_REMOVED,
+    _MergedRegistrations,
 )
 
 EMPTY_PRECOMPILED_FILE = "empty_" + PRECOMPILED_FILE
@@ -284,6 +290,285 @@ def test_overrides():
     }
 
 
+def test_compaction():
+    db_file = os.path.join(data_dir, DATABASE_FILE)
+    overrides_file = os.path.join(data_dir, OVERRIDES_FILE)
+    precompiled_file = os.path.join(data_dir, PRECOMPILED_FILE)
+    empty_precompiled_file = os.path.join(data_dir, EMPTY_PRECOMPILED_FILE)
+
+    # Start fresh
+    if os.path.isfile(db_file):
+        os.unlink(db_file)
+    if os.path.isfile(overrides_file):
+        os.unlink(overrides_file)
+    shutil.copyfile(empty_precompiled_file, precompiled_file)
+
+    registry = CallSignRegistry(data_dir)
+    registry._precompiled = {}
+
+    # Insert rows directly, so that we can control the timestamps
+    now = int(time.time())
+    day = 3600 * 24
+    rows = [
+        # Superseded by a later local registration
+        ("BeaconedRegistrations", "!00000001", "N0CALL-1", now - 100 * day),
+        ("LocalRegistrations", "!00000001", "N0CALL-1", now - 90 * day),
+        # An old tombstone that deletes nothing
+        ("BeaconedRegistrations", "!00000002", None, now - 100 * day),
+        # An old tombstone that is still needed
+        ("LocalRegistrations", "!00000003", "N0CALL-3", now - 100 * day),
+        ("BeaconedRegistrations", "!00000003", None, now - 90 * day),
+        # A recent tombstone that deletes nothing
+        ("LocalRegistrations", None, "N0CALL-9", now),
+    ]
+    cursor = registry._db_conn.cursor()
+    for table, device_id, call_sign, timestamp in rows:
+        cursor.execute(
+            "INSERT INTO %s (device_id, call_sign, settings_json, timestamp) VALUES (?, ?, ?, ?);"
+            % (table,),
+            (device_id, call_sign, None, timestamp),
+        )
+    registry._db_conn.commit()
+    cursor.close()
+    registry._rebuild()
+    expected = _to_dict(registry)
+    assert list(expected.keys()) == ["!00000001"]
+
+    stats = registry.compact(retention=30 * day)
+    assert stats["before"] == {"BeaconedRegistrations": 3, "LocalRegistrations": 3}
+    assert stats["after"] == {"BeaconedRegistrations": 1, "LocalRegistrations": 3}
+    assert stats["removed"] == 2
+    assert stats["elapsed_seconds"] >= 0
+
+    # The merged view is unchanged
+    registry._rebuild()
+    assert _to_dict(registry) == expected
+
+    # Compacting again is a no-op
+    stats = registry.compact(retention=30 * day)
+    assert stats["removed"] == 0
+    assert stats["before"] == stats["after"]
+
+    # Tombstones are kept for anything that was ever in the precompiled data (which
+    # a later download could bring back), even if it isn't in the current copy
+    registry._remember_precompiled_keys([("!00000005", "N0CALL-5", None, now - day)])
+    registry.add_registration("!00000005", None, None, False)
+    cursor = registry._db_conn.cursor()
+    cursor.execute(
+        "UPDATE BeaconedRegistrations SET timestamp = ? WHERE device_id = ?;",
+        (now - 100 * day, "!00000005"),
+    )
+    registry._db_conn.commit()
+    cursor.close()
+    stats = registry.compact(retention=30 * day)
+    assert stats["removed"] == 0
+    assert stats["after"]["BeaconedRegistrations"] == 2
+
+
+def test_concurrent_reads():
+    db_file = os.path.join(data_dir, DATABASE_FILE)
+    overrides_file = os.path.join(data_dir, OVERRIDES_FILE)
+    precompiled_file = os.path.join(data_dir, PRECOMPILED_FILE)
+    empty_precompiled_file = os.path.join(data_dir, EMPTY_PRECOMPILED_FILE)
+
+    # Start fresh
+    if os.path.isfile(db_file):
+        os.unlink(db_file)
+    if os.path.isfile(overrides_file):
+        os.unlink(overrides_file)
+    shutil.copyfile(empty_precompiled_file, precompiled_file)
+
+    registry = CallSignRegistry(data_dir)
+    registry._precompiled = {}
+    registry._rebuild()
+
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            while not stop.is_set():
+                # Every snapshot must be internally consistent
+                snapshot = registry.snapshot()
+                call_signs = [snapshot[k]["call_sign"] for k in snapshot]
+                assert len(call_signs) == len(snapshot)
+                assert len(set(call_signs)) == len(call_signs)
+                for k in snapshot:
+                    assert snapshot.get_device_id(snapshot[k]["call_sign"]) == k
+        except Exception as e:
+            errors.append(e)
+
+    def writer(offset):
+        # Writes from a thread other than the one that created the registry
+        try:
+            for i in range(0, 20):
+                registry.add_registration(
+                    f"!{offset + i:08x}", f"N0CALL-{offset + i}", None, True
+                )
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for i in range(0, 4)]
+    writers = [threading.Thread(target=writer, args=(i * 100,)) for i in range(0, 2)]
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    stop.set()
+    for t in readers:
+        t.join()
+
+    assert errors == []
+    assert len(registry) == 40
+    assert registry.get("!00000065")["call_sign"] == "N0CALL-101"
+    assert registry.get("!00000fff") is None
+
+    # Closing the registry closes every thread's connection
+    connections = list(registry._connections)
+    assert len(connections) == 3
+    registry.close()
+    assert registry._connections == []
+    for conn in connections:
+        try:
+            conn.execute("SELECT 1")
+            assert False, "Connection still open"
+        except sqlite3.ProgrammingError:
+            pass
+
+
+def test_change_events():
+    db_file = os.path.join(data_dir, DATABASE_FILE)
+    overrides_file = os.path.join(data_dir, OVERRIDES_FILE)
+    precompiled_file = os.path.join(data_dir, PRECOMPILED_FILE)
+    empty_precompiled_file = os.path.join(data_dir, EMPTY_PRECOMPILED_FILE)
+
+    # Start fresh
+    if os.path.isfile(db_file):
+        os.unlink(db_file)
+    if os.path.isfile(overrides_file):
+        os.unlink(overrides_file)
+    shutil.copyfile(empty_precompiled_file, precompiled_file)
+
+    registry = CallSignRegistry(data_dir)
+    registry._precompiled = {}
+    registry._rebuild()
+
+    events = []
+
+    def on_event(event):
+        events.append((event.kind, event.device_id, event.old, event.new))
+
+    def summary():
+        result = [
+            (
+                kind,
+                device_id,
+                None if old is None else old["call_sign"],
+                None if new is None else new["call_sign"],
+            )
+            for kind, device_id, old, new in events
+        ]
+        events.clear()
+        return result
+
+    registry.subscribe(on_event)
+
+    # A bad subscriber does not prevent others from being notified
+    def bad_subscriber(event):
+        raise Exception("Oops")
+
+    registry.subscribe(bad_subscriber)
+
+    registry.add_registration("!00000001", "N0CALL-1", None, True)
+    assert summary() == [(EVENT_ADDED, "!00000001", None, "N0CALL-1")]
+
+    registry.add_registration("!00000001", "N0CALL-2", None, True)
+    assert summary() == [(EVENT_CHANGED, "!00000001", "N0CALL-1", "N0CALL-2")]
+
+    # Move the call sign to another device
+    registry.add_registration("!00000002", "N0CALL-2", None, True)
+    assert sorted(summary()) == [
+        (EVENT_ADDED, "!00000002", None, "N0CALL-2"),
+        (EVENT_REMOVED, "!00000001", "N0CALL-2", None),
+    ]
+
+    # Icons changes are reported too
+    registry.add_registration("!00000002", "N0CALL-2", "MV", True)
+    assert events[0][0] == EVENT_CHANGED
+    assert events[0][2]["icon"] is None
+    assert events[0][3]["icon"] == "MV"
+    events.clear()
+
+    # Tombstones
+    registry.add_registration(None, "N0CALL-2", None, True)
+    assert summary() == [(EVENT_REMOVED, "!00000002", "N0CALL-2", None)]
+
+    # Nothing changes
+    registry.add_registration("!00000003", None, None, True)
+    assert summary() == []
+
+    # Unsubscribe
+    registry.unsubscribe(on_event)
+    registry.add_registration("!00000003", "N0CALL-3", None, True)
+    assert summary() == []
+
+    # Each change's events match a comparison of every registration
+    rng = random.Random(0)
+    device_ids = ["!00000001", "!00000002", "!00000003", "!00000004"]
+    call_signs = ["N0CALL-1", "N0CALL-2", "N0CALL-3"]
+    registry.subscribe(on_event)
+    for _ in range(0, 200):
+        device_id = rng.choice(device_ids + [None])
+        call_sign = rng.choice(call_signs + ([None] if device_id else []))
+        before = registry.snapshot()
+        registry.add_registration(device_id, call_sign, None, rng.random() < 0.5)
+        expected = [
+            (e.kind, e.device_id, e.old, e.new)
+            for e in registry.snapshot().diff(before)
+        ]
+        assert sorted(events) == sorted(expected)
+        events.clear()
+    registry.unsubscribe(on_event)
+
+
+def test_compact_records():
+    merged = _MergedRegistrations(
+        {
+            "!da577418": ("N0CALL-1", "MV", 1728880000),
+            "!00000002": ("N0CALL-2", None, 1728790000.5),
+            "!DA577419": ("N0CALL-3", "OGM", 1728790000),  # Not canonical
+        }
+    )
+
+    assert len(merged) == 3
+    assert "!da577418" in merged
+    assert "!DA577419" in merged
+    assert "!da577419" not in merged
+    assert "!00000003" not in merged
+    assert "N0CALL-1" not in merged
+
+    # Packed ids come first, in node number order
+    assert merged.keys() == ["!00000002", "!da577418", "!DA577419"]
+    assert merged["!da577418"] == {
+        "call_sign": "N0CALL-1",
+        "icon": "MV",
+        "timestamp": 1728880000,
+    }
+    assert merged["!00000002"]["timestamp"] == 1728790000.5
+    assert dict(merged.items())["!DA577419"]["icon"] == "OGM"
+
+    # Reverse lookups
+    assert merged.get_device_id("N0CALL-1") == "!da577418"
+    assert merged.get_device_id(" n0call-3 ") == "!DA577419"
+    assert merged.get_device_id("N0CALL-4") is None
+
+    try:
+        merged["!00000003"]
+        assert False
+    except KeyError:
+        pass
+
+
 def _to_dict(registry):
     """
     Helper function to convert the registry into a dictionary
@@ -303,3 +588,7 @@ if __name__ == "__main__":
     test_inserts_and_updates()
     test_precompiled()
     test_overrides()
+    test_compaction()
+    test_concurrent_reads()
+    test_change_events()
+    test_compact_records()
@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import shutil
+import tempfile
+
+import pubsub
+
+from aprstastic._recorder import TrafficRecorder, MESH_RX
+from aprstastic.sim import (
+    FakeMeshInterface,
+    ReplayHarness,
+    load_traffic,
+    synthetic_traffic,
+    node_id,
+    node_num,
+)
+
+
+def test_fake_mesh_interface():
+    interface = FakeMeshInterface(0x12345678)
+    assert interface.getMyNodeInfo()["user"]["id"] == "!12345678"
+    assert node_num(node_id(0xABCDEF01)) == 0xABCDEF01
+
+    received = list()
+
+    def on_recv(packet, interface=None):
+        received.append(packet)
+
+    pubsub.pub.subscribe(on_recv, "meshtastic.receive")
+    try:
+        interface.receive_text("!00000001", "hello")
+    finally:
+        pubsub.pub.unsubscribe(on_recv, "meshtastic.receive")
+
+    assert len(received) == 1
+    assert received[0]["fromId"] == "!00000001"
+    assert received[0]["toId"] == "!12345678"
+    assert received[0]["decoded"]["payload"] == b"hello"
+    assert "lastHeard" in interface.nodesByNum[1]
+
+    interface.sendText("hi", destinationId="!00000001")
+    assert interface.sent()[0]["text"] == "hi"
+
+
+def test_synthetic_traffic():
+    # The same seed gives the same traffic
+    a = synthetic_traffic(devices=3, messages=50, seed=1)
+    b = synthetic_traffic(devices=3, messages=50, seed=1)
+    assert a == b
+    assert len(a) == 53
+    assert a != synthetic_traffic(devices=3, messages=50, seed=2)
+
+
+def test_replay():
+    events = synthetic_traffic(devices=3, messages=200, rate=1000)
+    report = ReplayHarness(speed=None).run(events)
+    assert report["mesh_processed"] == report["mesh_received"]
+    assert report["aprs_processed"] == report["aprs_received"]
+    assert report["mesh_sent"] > 0
+    assert report["aprs_sent"] > 0
+    assert report["throughput"] > 0
+    assert report["cpu_per_packet_ms"] > 0
+    assert report["latency"]["uplink"]["socket_write"]["count"] > 0
+    assert report["latency"]["downlink"]["send_text"]["count"] > 0
+
+
+def test_replay_recording():
+    logs_dir = tempfile.mkdtemp()
+    try:
+        # Record some synthetic traffic, then replay the recording (in real time)
+        recorder = TrafficRecorder(logs_dir)
+        for _, source, data in synthetic_traffic(devices=2, messages=20, seed=3):
+            if source == MESH_RX:
+                data = dict(data, fromId=node_id(data["from"]))
+            recorder.record(source, data)
+        recorder.close()
+
+        events = load_traffic(logs_dir)
+        assert len(events) == 22
+        assert events[0][0] == 0
+        assert isinstance(events[0][2]["decoded"]["payload"], bytes)
+
+        report = ReplayHarness(speed=1.0).run(events)
+        assert report["mesh_processed"] + report["aprs_processed"] == 22
+    finally:
+        shutil.rmtree(logs_dir, ignore_errors=True)
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_fake_mesh_interface()
+    test_synthetic_traffic()
+    test_replay()
+    test_replay_recording()
@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import os
+import shutil
+
+from aprstastic._reply_to import ReplyToTable, REPLY_TO_FILE
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(TESTS_DIR, "test_data")
+
+
+def test_reply_to():
+    table = ReplyToTable(max_size=3, ttl=100)
+    assert table.get("!00000001", now=0) is None
+
+    table.set("!00000001", "N0CALL-1", now=10)
+    table.set("!00000002", "N0CALL-2", now=20)
+    table.set("!00000003", "N0CALL-3", now=30)
+    assert table.get("!00000001", now=40) == "N0CALL-1"
+
+    # The least recently used entry is evicted
+    table.set("!00000004", "N0CALL-4", now=50)
+    assert len(table) == 3
+    assert "!00000002" not in table
+    assert "!00000001" in table
+
+    # Entries expire
+    assert table.get("!00000003", now=131) is None
+    assert table.expire(now=145) == 1
+    assert "!00000001" not in table
+    assert table.get("!00000004", now=145) == "N0CALL-4"
+
+    stats = table.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 2
+
+
+def test_reply_to_checkpoint():
+    data_dir = os.path.join(DATA_DIR, "reply_to")
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.makedirs(data_dir)
+    try:
+        table = ReplyToTable(data_dir)
+        assert not table.dirty
+        table.set("!00000001", "N0CALL-1")
+        table.set("!00000002", "N0CALL-2")
+        assert table.dirty
+        table.checkpoint()
+        assert not table.dirty
+        assert os.path.isfile(os.path.join(data_dir, REPLY_TO_FILE))
+
+        # Reloaded at startup, with the size cap applied
+        table = ReplyToTable(data_dir)
+        assert table.get("!00000001") == "N0CALL-1"
+        table = ReplyToTable(data_dir, max_size=1)
+        assert "!00000001" not in table
+        assert table.get("!00000002") == "N0CALL-2"
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_reply_to()
+    test_reply_to_checkpoint()
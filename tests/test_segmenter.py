@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import random
+import warnings
+
+import pytest
+
+from aprstastic._segmenter import segment, truncate
+
+
+def test_truncate():
+    assert truncate("hello", 10) == "hello"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert truncate("hello world", 5) == "hello"
+
+        # Never split a character ("é" is 2 bytes, "😀" is 4)
+        assert truncate("ééé", 5) == "éé"
+        assert truncate("a😀", 4) == "a"
+
+
+def test_segment():
+    assert segment("", 67) == []
+    assert segment("   ", 67) == []
+    assert segment("hello world", 67) == ["hello world"]
+    assert segment("  hello world  ", 67) == ["hello world"]
+
+    # Break on whitespace, dropping it at the boundaries
+    assert segment("aaa bbb ccc", 7) == ["aaa bbb", "ccc"]
+    assert segment("aaa  \n bbb ccc", 8) == ["aaa", "bbb ccc"]
+
+    # Hard break long words
+    assert segment("abcdefghij", 4) == ["abcd", "efgh", "ij"]
+    assert segment("ab cdefghijkl", 4) == ["ab", "cdef", "ghij", "kl"]
+
+    # Respect UTF-8 boundaries
+    assert segment("éééé", 5) == ["éé", "éé"]
+    assert segment("😀😀😀", 6) == ["😀", "😀", "😀"]
+
+    # Part markers count against the limit
+    assert segment("one two three four five six", 14, markers=True) == [
+        "one two (1/4)",
+        "three (2/4)",
+        "four (3/4)",
+        "five six (4/4)",
+    ]
+    assert segment("short", 67, markers=True) == ["short"]
+
+    # Markers widen when there are 10 or more parts
+    parts = segment("x" * 100, 16, markers=True)
+    assert len(parts) >= 10
+    assert parts[0] == "xxxxxxxx (1/13)"
+    assert all([len(p.encode("utf-8")) <= 16 for p in parts])
+    assert "".join([p.rsplit(" ", 1)[0] for p in parts]) == "x" * 100
+
+    with pytest.raises(ValueError):
+        segment("hello", 3)
+
+
+def test_segment_random():
+    rng = random.Random(0)
+    alphabet = ["a", "b", "é", "€", "😀", " ", "  ", "\n"]
+    for _ in range(0, 500):
+        message = "".join(rng.choices(alphabet, k=rng.randint(0, 300)))
+        max_bytes = rng.randint(4, 80)
+        parts = segment(message, max_bytes)
+        for part in parts:
+            assert 0 < len(part.encode("utf-8")) <= max_bytes
+            assert part == part.strip()
+
+        # Nothing but whitespace is lost
+        assert "".join(parts).replace(" ", "").replace("\n", "") == message.replace(
+            " ", ""
+        ).replace("\n", "")
+
+
+def test_segment_linear():
+    # A long message (with and without spaces) should take well under a second
+    start = time.perf_counter()
+    segment("word " * 200000, 67)
+    segment("x" * 1000000, 67)
+    assert time.perf_counter() - start < 5
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_truncate()
+    test_segment()
+    test_segment_random()
+    test_segment_linear()
@@ -0,0 +1,254 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import shutil
+import socket
+import tempfile
+
+import pubsub
+
+from aprslib.passcode import passcode
+from aprstastic._gateway import Gateway
+from aprstastic.sim._replay import sim_gateway_config
+from aprstastic.sim import (
+    FakeAPRSISServer,
+    FakeMeshInterface,
+    VirtualMesh,
+    SoakTest,
+    aprs_traffic,
+    node_id,
+)
+
+
+def _login(server, filters):
+    sock = socket.create_connection((server.host, server.port))
+    sock.sendall(
+        f"user N0CALL-10 pass {passcode('N0CALL-10')} vers test 1.0 filter {filters}\r\n".encode()
+    )
+    sock.settimeout(5)
+    return sock.makefile("rb"), sock
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_server_filtering():
+    server = FakeAPRSISServer().start()
+    reader, sock = _login(server, "g/N0CALL*/K1ABC-7 -g/N0CALL-2 b/W1AW")
+    try:
+        server.wait_for_clients()
+        client = server.clients()[0]
+        assert client.accepts("K1ABC-7>APRS,TCPIP*::N0CALL-1 :hello{1")
+        assert client.accepts("N0CALL-1>APRS,TCPIP*::K1ABC-7  :hello{1")
+        assert not client.accepts("K1ABC-7>APRS,TCPIP*::N0CALL-2 :hello{1")
+        assert not client.accepts("K1ABC-7>APRS,TCPIP*::W2XYZ    :hello{1")
+        assert client.accepts("W1AW>APRS,TCPIP*:!4700.00N/12200.00W-")
+        assert not client.accepts("W2XYZ>APRS,TCPIP*:!4700.00N/12200.00W-")
+
+        # Only matching packets are delivered
+        server.inject("K1ABC-7>APRS,TCPIP*::W2XYZ    :dropped{1")
+        server.inject("K1ABC-7>APRS,TCPIP*::N0CALL-1 :delivered{2")
+        lines = [reader.readline() for _ in range(0, 3)]
+        assert lines[-1].startswith(b"K1ABC-7>") and b"delivered" in lines[-1]
+        assert server.stats()["filtered"] == 1
+        assert server.stats()["delivered"] == 1
+    finally:
+        sock.close()
+        server.stop()
+
+
+def test_inject_at_rate():
+    server = FakeAPRSISServer().start()
+    reader, sock = _login(server, "g/SIM*")
+    try:
+        server.wait_for_clients()
+        call_signs = ["SIM0000-1", "SIM0001-2"]
+        start = time.monotonic()
+        injector = server.inject_at_rate(
+            aprs_traffic(call_signs, noise=0.5), rate=200, count=100
+        )
+        injector.join(timeout=5)
+        elapsed = time.monotonic() - start
+        assert injector.sent == 100
+        assert 0.4 < elapsed < 2.0
+
+        stats = server.stats()
+        assert stats["injected"] == 100
+        assert stats["delivered"] > 0 and stats["filtered"] > 0
+        assert stats["delivered"] + stats["filtered"] == 100
+    finally:
+        sock.close()
+        server.stop()
+
+
+def test_virtual_mesh():
+    interface = FakeMeshInterface()
+    received = list()
+
+    def on_recv(packet, interface=None):
+        received.append(packet)
+
+    pubsub.pub.subscribe(on_recv, "meshtastic.receive")
+    mesh = VirtualMesh(
+        interface, nodes=5, position_interval=0.1, message_interval=0.1
+    ).start()
+    try:
+        assert _wait_for(lambda: mesh.positions_sent >= 10 and mesh.messages_sent >= 10)
+    finally:
+        mesh.stop()
+        pubsub.pub.unsubscribe(on_recv, "meshtastic.receive")
+
+    assert mesh.registrations_sent == 5
+    texts = [p["decoded"]["text"] for p in received if "text" in p["decoded"]]
+    assert texts[0] == "!register SIM0000-1"
+    assert len(set(p["fromId"] for p in received)) == 5
+    assert all(interface.nodesByNum[p["from"]].get("lastHeard") for p in received)
+
+
+def test_soak():
+    reports = list()
+    final = SoakTest(
+        nodes=5,
+        position_interval=0.5,
+        message_interval=0.5,
+        aprs_rate=50,
+        duration=3,
+        report_interval=1,
+    ).run(on_report=reports.append)
+
+    assert len(reports) >= 3
+    assert final is reports[-1]
+    assert final["mesh"]["registrations_sent"] == 5
+    assert final["mesh_processed"] > 10
+    assert final["mesh_sent"] > 0
+    assert final["aprs_server"]["filtered"] > 0
+    assert final["aprs_server"]["received"] > 0
+    assert final["rss_mb"] > 0
+
+
+def test_startup():
+    temp_dir = tempfile.mkdtemp()
+    server = FakeAPRSISServer().start()
+    gateway = Gateway(sim_gateway_config(server, temp_dir))
+    try:
+        # Start returns once the device is known, and APRS-IS has accepted the login
+        gateway.start(FakeMeshInterface())
+        assert gateway._aprs_client.logged_in
+        assert gateway._gateway_id == "!5a5a0001"
+        assert len(server.clients()) == 1
+
+        timings = gateway.stats()["startup"]
+        assert set(timings) == {"registry", "aprs_is", "node_info", "total"}
+        assert timings["total"] >= max(timings["registry"], timings["aprs_is"])
+
+        # Opt-in features are off by default
+        assert "position_governor" not in gateway.stats()
+    finally:
+        gateway.close()
+        server.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_nearby_messages_not_acked():
+    temp_dir = tempfile.mkdtemp()
+    server = FakeAPRSISServer(filtering=False).start()
+    interface = FakeMeshInterface()
+    config = sim_gateway_config(server, temp_dir)
+    config["nearby_relay"] = {"enabled": True, "latitude": 47.6, "longitude": -122.3}
+    gateway = Gateway(config)
+    try:
+        gateway.start(interface)
+        interface.receive_text(node_id(0x5A5A1000), "!register SIM0000-1")
+        assert _wait_for(
+            lambda: gateway.tick() or gateway._registry.get_device_id("SIM0000-1")
+        )
+        assert _wait_for(lambda: gateway.tick() or gateway._nearby_center)
+
+        # The range filter also delivers messages between other nearby stations
+        server.inject("K1ABC-7>APRS,TCPIP*::K2XYZ-9  :not for us{42")
+        server.inject("K1ABC-7>APRS,TCPIP*::SIM0000-1:for us{43")
+        assert _wait_for(
+            lambda: gateway.tick()
+            or any("for us" in m["text"] for m in interface.sent())
+        )
+
+        assert _wait_for(lambda: any(":ack" in l for l in server.received()))
+        acks = [line for line in server.received() if ":ack" in line]
+        assert len(acks) == 1
+        assert acks[0].startswith("SIM0000-1>") and acks[0].endswith(":ack43")
+        assert not any("not for us" in m["text"] for m in interface.sent())
+    finally:
+        gateway.close()
+        interface.close()
+        server.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_replies_fit_in_one_packet():
+    temp_dir = tempfile.mkdtemp()
+    server = FakeAPRSISServer().start()
+    interface = FakeMeshInterface()
+    gateway = Gateway(sim_gateway_config(server, temp_dir))
+    device_id = node_id(0x5A5A1000)
+    try:
+        gateway.start(interface)
+        for text in ["?", "!register", "!register N0CALL-1", "?", "!id"]:
+            sent = len(interface.sent())
+            interface.receive_text(device_id, text)
+            assert _wait_for(lambda: gateway.tick() or len(interface.sent()) > sent)
+            replies = interface.sent()[sent:]
+            assert len(replies) == 1, replies
+            assert replies[0]["to"] == device_id
+    finally:
+        gateway.close()
+        interface.close()
+        server.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_beaconed_registration_of_heard_device():
+    temp_dir = tempfile.mkdtemp()
+    server = FakeAPRSISServer(filtering=False).start()
+    interface = FakeMeshInterface()
+    gateway = Gateway(sim_gateway_config(server, temp_dir))
+    device_id = node_id(0x5A5A1000)
+    try:
+        gateway.start(interface)
+
+        # Heard on the mesh, before it is registered
+        interface.receive_position(device_id, 47.6, -122.3)
+        assert _wait_for(lambda: gateway.tick() or device_id in gateway._heard_index)
+        assert "SIM0000-1" not in gateway._filter_manager
+
+        # Another gateway beacons its registration
+        server.inject(f"SIM0000-1>APRS,TCPIP*::MESHID-01:{device_id}{{1")
+        assert _wait_for(
+            lambda: gateway.tick() or "SIM0000-1" in gateway._filter_manager
+        )
+    finally:
+        gateway.close()
+        interface.close()
+        server.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_server_filtering()
+    test_inject_at_rate()
+    test_virtual_mesh()
+    test_soak()
+    test_startup()
+    test_nearby_messages_not_acked()
+    test_replies_fit_in_one_packet()
+    test_beaconed_registration_of_heard_device()
@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: 2024-present Adam Fourney <adam.fourney@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+import time
+import random
+import threading
+
+from aprslib.passcode import passcode
+from aprstastic._aprs_client import APRSClient
+from aprstastic._tracing import Tracer, UPLINK, DOWNLINK, _percentile
+from aprstastic.sim import FakeAPRSISServer
+
+
+def test_sampling():
+    assert Tracer(sample_rate=0).start(UPLINK, "pubsub") is None
+    assert Tracer(sample_rate=1).start(UPLINK, "pubsub") is not None
+
+    tracer = Tracer(sample_rate=0.25, rng=random.Random(0))
+    sampled = [tracer.start(UPLINK, "pubsub") for _ in range(0, 4000)]
+    assert 800 < len([t for t in sampled if t is not None]) < 1200
+
+
+def test_tracer():
+    tracer = Tracer(sample_rate=1)
+
+    # A trace is only complete when every holder has released it
+    trace = tracer.start(UPLINK, "pubsub")
+    trace.stamp("dequeue")
+    trace.hold()  # e.g., handed to a transmit thread
+
+    def _transmit():
+        time.sleep(0.01)
+        trace.stamp("socket_write")
+        trace.release()
+
+    thread = threading.Thread(target=_transmit)
+    thread.start()
+    trace.stamp("processed")
+    trace.release()
+    assert tracer.percentiles() == {}
+    thread.join()
+
+    latencies = tracer.percentiles()[UPLINK]
+    assert set(latencies.keys()) == set(["dequeue", "processed", "socket_write"])
+    assert latencies["socket_write"]["count"] == 1
+    assert latencies["socket_write"]["p50"] >= 0.01
+    assert tracer.recent()[0]["stages"][0] == ["pubsub", 0.0]
+    assert tracer.summary()["completed"] == {UPLINK: 1}
+
+    assert _percentile([], 50) is None
+    assert _percentile(list(range(1, 101)), 50) == 50
+    assert _percentile(list(range(1, 101)), 99) == 99
+    assert _percentile([1, 2, 3], 100) == 3
+
+
+def test_client_tracing():
+    server = FakeAPRSISServer().start()
+    tracer = Tracer(sample_rate=1)
+    client = APRSClient(
+        "N0CALL-10",
+        str(passcode("N0CALL-10")),
+        "g/N0CALL-10",
+        servers=[server.address],
+        tracer=tracer,
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while len(server.clients()) == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        # Downlink: socket read, and parse
+        server.inject("K1ABC-7>APZMAG,TCPIP*::N0CALL-10:hello{1")
+        packet, trace = None, None
+        while packet is None and time.monotonic() < deadline:
+            packet, trace = client.recv_traced()
+            time.sleep(0.01)
+        assert packet["message_text"] == "hello"
+        assert [s for s, t in trace.stages] == ["socket_read", "parse"]
+        trace.release()
+        assert DOWNLINK in tracer.percentiles()
+
+        # Uplink: enqueue, and socket write
+        trace = tracer.start(UPLINK, "pubsub")
+        client.send("N0CALL-10>APZMAG,TCPIP*::K1ABC-7  :ack1", trace)
+        trace.release()
+        while UPLINK not in tracer.percentiles() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert set(tracer.percentiles()[UPLINK].keys()) == set(
+            ["tx_enqueue", "socket_write"]
+        )
+    finally:
+        client.close()
+        server.stop()
+
+
+##########################
+if __name__ == "__main__":
+    import logging
+
+    logging.basicConfig(level=logging.DEBUG)
+    test_sampling()
+    test_tracer()
+    test_client_tracing()